@@ -9,8 +9,6 @@ from __future__ import annotations
 import json
 import logging
 import os
-import shutil
-import subprocess
 import tempfile
 from dataclasses import dataclass, field
 from typing import List, Optional, Protocol, Union, runtime_checkable
@@ -19,6 +17,7 @@ from pydantic import BaseModel
 
 from config import GEMINI_API_KEY, GEMINI_MODEL
 from utils import repair_latex_escapes
+import soffice_pool
 
 logger = logging.getLogger(__name__)
 
@@ -35,29 +34,13 @@ SUPPORTED_MIME_PREFIXES = ("image/",)
 SUPPORTED_MIME_EXACT = {"application/pdf", DOCX_MIME}
 
 
-def _find_soffice() -> Optional[str]:
-    """LibreOffice (soffice) binarini topish."""
-    env_path = os.getenv("SOFFICE_PATH")
-    if env_path and os.path.exists(env_path):
-        return env_path
-    for name in ("soffice", "libreoffice"):
-        found = shutil.which(name)
-        if found:
-            return found
-    mac_path = "/Applications/LibreOffice.app/Contents/MacOS/soffice"
-    if os.path.exists(mac_path):
-        return mac_path
-    return None
-
-
 def convert_docx_to_pdf(docx_bytes: bytes) -> bytes:
     """DOCX baytlarini PDF baytlariga aylantirish (LibreOffice headless orqali).
 
-    Formulalar, rasmlar va joylashuvni saqlaydi. LibreOffice topilmasa
-    ExtractionError ko'taradi.
+    Formulalar, rasmlar va joylashuvni saqlaydi. Konvertatsiya soffice_pool'dagi
+    doimiy worker'larda bajariladi. LibreOffice topilmasa ExtractionError ko'taradi.
     """
-    soffice = _find_soffice()
-    if not soffice:
+    if not soffice_pool.find_soffice():
         raise ExtractionError(
             "DOCX'ni o'qish uchun LibreOffice topilmadi. Iltimos, faylni PDF qilib yuboring."
         )
@@ -67,26 +50,16 @@ def convert_docx_to_pdf(docx_bytes: bytes) -> bytes:
         with open(in_path, "wb") as f:
             f.write(bytes(docx_bytes))
 
-        # Har konversiya uchun alohida profil — bir vaqtda bir nechta ishlasa lock bo'lmaydi
-        profile = os.path.join(tmp, "profile")
+        out_path = os.path.join(tmp, "input.pdf")
         try:
-            result = subprocess.run(
-                [
-                    soffice, "--headless", "--norestore", "--nolockcheck",
-                    f"-env:UserInstallation=file://{profile}",
-                    "--convert-to", "pdf", "--outdir", tmp, in_path,
-                ],
-                capture_output=True, timeout=120,
-            )
-        except subprocess.TimeoutExpired as exc:
+            soffice_pool.convert_to_pdf(in_path, out_path, timeout=120)
+        except soffice_pool.ConversionTimeout as exc:
             raise ExtractionError("DOCX→PDF aylantirish juda uzoq cho'zildi.") from exc
-        except Exception as exc:
-            raise ExtractionError(f"DOCX→PDF aylantirishda xatolik: {exc}") from exc
+        except soffice_pool.ConversionError as exc:
+            logger.error("DOCX→PDF muvaffaqiyatsiz: %s", exc)
+            raise ExtractionError("DOCX'ni PDF'ga aylantirib bo'lmadi. Faylni PDF qilib yuboring.") from exc
 
-        out_path = os.path.join(tmp, "input.pdf")
         if not os.path.exists(out_path):
-            err = (result.stderr or b"").decode("utf-8", "ignore")[:200]
-            logger.error("DOCX→PDF muvaffaqiyatsiz: %s", err)
             raise ExtractionError("DOCX'ni PDF'ga aylantirib bo'lmadi. Faylni PDF qilib yuboring.")
 
         with open(out_path, "rb") as f:
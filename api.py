@@ -1,40 +1,87 @@
+import asyncio
 import hashlib
 import hmac
 import json
 import logging
 import os
+import threading
 import time
 import urllib.request
 from collections import OrderedDict
-from dataclasses import asdict
-from typing import Optional
-from urllib.parse import parse_qsl, quote
+from contextlib import asynccontextmanager
+from dataclasses import asdict, dataclass
+from typing import Dict, Optional
+from urllib.parse import parse_qsl
 
 from fastapi import FastAPI, Header, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import HTMLResponse, Response
 from fastapi.templating import Jinja2Templates
+from peewee import IntegrityError
 from pydantic import BaseModel, Field
+from telegram import Bot
+from telegram.request import HTTPXRequest
 
 logger = logging.getLogger(__name__)
 
+import image_cache
+import image_variants
+import membership
 import services
+import shared_cache
+import telegram_files
 from ai_extract import ExtractionError, normalize_extracted
-from config import ADMIN_ID, BOT_TOKEN, BOT_USERNAME
-from database import Question, Test, TestSubmission, User, get_or_create_user, init_db
+from config import (
+    ADMIN_ID, BOT_TOKEN, BOT_USERNAME, IMAGE_VARIANT_WIDTHS, SHARED_CACHE_ADMIN_TTL, TELEGRAM_API_BASE,
+)
+from database import (
+    Question, Test, TestSubmission, User, flush_user_changes, get_or_create_user,
+    get_or_create_user_async, init_db, user_flush_loop, write_queue,
+)
+from utils import check_answers
 
 
 # initData imzosining maksimal yaroqlilik muddati (sekundlarda)
 INIT_DATA_MAX_AGE = 24 * 60 * 60  # 24 soat
 
-# Savol rasmlari uchun kichik LRU xotira keshi: file_id -> (content, content_type).
-# <img> tegi Authorization yubora olmaydi, shuning uchun endpoint ochiq qoladi; lekin
-# kesh qayta/takror so'rovlarda Telegram API'ga chiqishni keskin kamaytiradi (quota/amplifikatsiya himoyasi).
-_IMAGE_CACHE = OrderedDict()
-_IMAGE_CACHE_MAX = 128
+# Savol rasmlari keshi (image_cache.py: xotira + disk). <img> tegi Authorization yubora
+# olmaydi, shuning uchun endpoint ochiq qoladi; kesh takror so'rovlarda Telegram API'ga
+# chiqishni keskin kamaytiradi (quota/amplifikatsiya himoyasi).
+# URL'da joriy file_id versiyasi (`?v=`) bo'lsa javob o'zgarmas — brauzer qayta so'ramaydi.
+_IMAGE_CACHE_IMMUTABLE = "public, max-age=31536000, immutable"
+# Versiyasiz (eski sahifa) URL: savol rasmi almashtirilishi mumkin — ETag bilan tekshiriladi
+_IMAGE_CACHE_REVALIDATE = "public, max-age=3600"
+# Bir xil rasm varianti bir vaqtda bir marta yaratiladi: kesh kaliti -> Future
+_IMAGE_INFLIGHT: Dict[str, asyncio.Future] = {}
+
+# Test tuzilmasining tayyor (serializatsiya qilingan) nusxalari: test_id -> _StructurePayload.
+# Yozuv Test.structure_version bilan solishtiriladi — bot rasm almashtirsa yoki testni
+# yakunlasa versiya oshadi va keyingi so'rovda tuzilma qayta quriladi.
+_STRUCTURE_CACHE: "OrderedDict[int, _StructurePayload]" = OrderedDict()
+_STRUCTURE_CACHE_MAX = 256
+_structure_lock = threading.Lock()
+
+# Bildirishnoma va a'zolik tekshiruvi uchun Bot API klienti (birinchi topshiriqda yaratiladi)
+_bot: Optional[Bot] = None
+_bot_lock = asyncio.Lock()
+
+
+@asynccontextmanager
+async def _lifespan(_app: FastAPI):
+    flush_task = asyncio.create_task(user_flush_loop())
+    yield
+    flush_task.cancel()
+    # Navbatdagi topshiriqlar va foydalanuvchi ismlari o'zgarishlari yozib tugatiladi
+    await write_queue.submit(flush_user_changes)
+    await write_queue.close()
+    # Telegram fayllari uchun umumiy HTTP klient (keep-alive ulanishlar) yopiladi
+    await telegram_files.close()
+    if _bot is not None:
+        await _bot.shutdown()
 
 
 init_db()
-app = FastAPI(title="TestBot WebApp API")
+app = FastAPI(title="TestBot WebApp API", lifespan=_lifespan)
 
 # Setup template logic
 templates_dir = os.path.join(os.path.dirname(__file__), "webapp")
@@ -46,16 +93,23 @@ def _resolve_bot_username() -> str:
     if BOT_USERNAME:
         return BOT_USERNAME
 
+    # Bot yoki boshqa worker allaqachon aniqlagan bo'lsa — getMe shart emas
+    cached = shared_cache.get("bot", "username")
+    if cached:
+        return cached
+
     if not BOT_TOKEN:
         return ""
 
-    url = f"https://api.telegram.org/bot{BOT_TOKEN}/getMe"
+    url = f"{TELEGRAM_API_BASE}/bot{BOT_TOKEN}/getMe"
     try:
         with urllib.request.urlopen(url, timeout=8) as response:
             payload = json.loads(response.read().decode("utf-8"))
         if payload.get("ok"):
-            username = str(payload.get("result", {}).get("username", "")).strip()
-            return username.lstrip("@")
+            username = str(payload.get("result", {}).get("username", "")).strip().lstrip("@")
+            if username:
+                shared_cache.put("bot", "username", username, shared_cache.LONG_TTL)
+            return username
     except Exception:
         pass
     return ""
@@ -64,6 +118,21 @@ def _resolve_bot_username() -> str:
 RESOLVED_BOT_USERNAME = _resolve_bot_username()
 
 
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """`If-None-Match` sarlavhasi shu ETag'ga mos keladimi (W/ va ro'yxatlar bilan)."""
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*":
+            return True
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+
 def _extract_init_data(authorization: Optional[str]) -> str:
     """Authorization sarlavhasidan Telegram initData ni ajratib olish.
 
@@ -137,6 +206,23 @@ def _is_mixed_test(test: Test) -> bool:
     return bool(test.correct_answers) and test.correct_answers.startswith("[{")
 
 
+def _image_urls(test_id: int, q: Question) -> dict:
+    """Savol rasmi URL'i va `srcset` (kenglik variantlari) — `<img>` uchun.
+
+    URL'dagi `v` — file_id versiyasi: rasm almashtirilsa URL ham o'zgaradi,
+    shuning uchun server javobni o'zgarmas (immutable) deb keshlashga ruxsat beradi.
+    """
+    if not q.image_file_id:
+        return {"image_url": None, "image_srcset": None}
+    base = f"/api/test/{test_id}/image/{q.num}?v={image_cache.version_token(q.image_file_id)}"
+    if not IMAGE_VARIANT_WIDTHS:
+        return {"image_url": base, "image_srcset": None}
+    return {
+        "image_url": f"{base}&w={IMAGE_VARIANT_WIDTHS[-1]}",
+        "image_srcset": ", ".join(f"{base}&w={w} {w}w" for w in IMAGE_VARIANT_WIDTHS),
+    }
+
+
 def _build_test_structure(test: Test) -> list[dict]:
     """Test tuzilmasini xavfsiz ko'rinishda qaytarish.
 
@@ -160,6 +246,7 @@ def _build_test_structure(test: Test) -> list[dict]:
                 "text": q.text or "",
                 "options": opts,
                 "has_image": bool(q.has_image and q.image_file_id),
+                **_image_urls(test.id, q),
             })
         return structure
 
@@ -197,12 +284,16 @@ def _validate_solver_access(test: Test, user_id: Optional[int]) -> None:
     if test.creator.telegram_id == user_id:
         raise HTTPException(status_code=403, detail="O'zingiz yaratgan testni yecha olmaysiz!")
 
-    user = User.get_or_none(User.telegram_id == user_id)
-    if not user:
+    # telegram_id -> User.id o'zgarmaydi — umumiy keshdan
+    user_pk = shared_cache.cached(
+        "user", user_id, shared_cache.LONG_TTL,
+        lambda: User.select(User.id).where(User.telegram_id == user_id).scalar(),
+    )
+    if not user_pk:
         return
 
     existing = TestSubmission.select().where(
-        (TestSubmission.test == test) & (TestSubmission.user == user)
+        (TestSubmission.test == test) & (TestSubmission.user == user_pk)
     ).first()
 
     if existing:
@@ -229,13 +320,68 @@ def _safe_json_for_script(obj) -> str:
     )
 
 
-def _solve_context_from_test(test: Test) -> dict:
+@dataclass(frozen=True)
+class _StructurePayload:
+    version: int
+    total_questions: int
+    is_mixed: bool
+    api_body: bytes     # /api/test/{id} JSON javobi (tayyor baytlar)
+    script_json: str    # sahifadagi <script> ichiga joylanadigan JSON
+    etag: str
+
+
+def _structure_payload(test: Test) -> _StructurePayload:
+    """Test tuzilmasi — keshdan (versiya mos bo'lsa) yoki qayta qurib keshlab."""
+    with _structure_lock:
+        cached = _STRUCTURE_CACHE.get(test.id)
+        if cached is not None and cached.version == test.structure_version:
+            _STRUCTURE_CACHE.move_to_end(test.id)
+            return cached
+
     structure = _build_test_structure(test)
+    is_mixed = _is_mixed_test(test)
+    # FastAPI JSONResponse bilan bir xil ko'rinish (ensure_ascii=False, ixcham)
+    api_body = json.dumps(
+        {
+            "test_id": test.id,
+            "total_questions": len(structure),
+            "test_structure": structure,
+            "is_mixed": is_mixed,
+        },
+        ensure_ascii=False,
+        separators=(",", ":"),
+    ).encode("utf-8")
+    digest = hashlib.blake2b(api_body, digest_size=8).hexdigest()
+    payload = _StructurePayload(
+        version=test.structure_version,
+        total_questions=len(structure),
+        is_mixed=is_mixed,
+        api_body=api_body,
+        script_json=_safe_json_for_script(structure),
+        etag=f'"t{test.id}-v{test.structure_version}-{digest}"',
+    )
+
+    with _structure_lock:
+        _STRUCTURE_CACHE[test.id] = payload
+        _STRUCTURE_CACHE.move_to_end(test.id)
+        while len(_STRUCTURE_CACHE) > _STRUCTURE_CACHE_MAX:
+            _STRUCTURE_CACHE.popitem(last=False)
+    return payload
+
+
+def _forget_structure(test_id: int):
+    """Yakunlangan test tuzilmasi endi kerak emas — keshdan chiqarish."""
+    with _structure_lock:
+        _STRUCTURE_CACHE.pop(test_id, None)
+
+
+def _solve_context_from_test(test: Test) -> dict:
+    payload = _structure_payload(test)
     return {
         "test_id": test.id,
-        "total_questions": len(structure),
-        "test_structure": _safe_json_for_script(structure),
-        "is_mixed": _is_mixed_test(test),
+        "total_questions": payload.total_questions,
+        "test_structure": payload.script_json,
+        "is_mixed": payload.is_mixed,
         "bot_username": RESOLVED_BOT_USERNAME,
         "error": None,
     }
@@ -260,6 +406,7 @@ async def _render_solve(request: Request, test_id: Optional[int], is_rasch: bool
         )
 
     if not test.is_active:
+        _forget_structure(test.id)
         return templates.TemplateResponse(
             request=request,
             name=template_name,
@@ -322,11 +469,16 @@ async def serve_create_rich_webapp(request: Request):
 
 
 @app.get("/api/test/{test_id}")
-def get_test_for_solve(test_id: int, authorization: Optional[str] = Header(default=None)):
+def get_test_for_solve(
+    test_id: int,
+    authorization: Optional[str] = Header(default=None),
+    if_none_match: Optional[str] = Header(default=None),
+):
     """Berilgan test kodi bo'yicha yechish uchun xavfsiz metadata.
 
     Foydalanuvchi identifikatsiyasi `Authorization: tma <initData>` sarlavhasidagi
     Telegram imzosidan olinadi (ishonchsiz `user_id` query parametri emas).
+    Tuzilma tayyor baytlar ko'rinishida keshdan beriladi; ETag mos kelsa 304.
     """
     user_id = _verify_init_data(_extract_init_data(authorization))
 
@@ -336,17 +488,18 @@ def get_test_for_solve(test_id: int, authorization: Optional[str] = Header(defau
         raise HTTPException(status_code=404, detail="Test topilmadi!") from exc
 
     if not test.is_active:
+        _forget_structure(test.id)
         raise HTTPException(status_code=400, detail="Bu test yakunlangan.")
 
+    # Ruxsat har so'rovda tekshiriladi (foydalanuvchiga bog'liq) — keshlanmaydi
     _validate_solver_access(test, user_id)
 
-    structure = _build_test_structure(test)
-    return {
-        "test_id": test.id,
-        "total_questions": len(structure),
-        "test_structure": structure,
-        "is_mixed": _is_mixed_test(test),
-    }
+    payload = _structure_payload(test)
+    # private, no-cache: brauzer saqlaydi, lekin har safar ETag bilan tekshiradi
+    headers = {"ETag": payload.etag, "Cache-Control": "private, no-cache"}
+    if _etag_matches(if_none_match, payload.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=payload.api_body, media_type="application/json", headers=headers)
 
 
 class RichQuestionIn(BaseModel):
@@ -368,8 +521,11 @@ def _is_admin_uid(user_id: int) -> bool:
     """Foydalanuvchi admin ekanligini tekshirish (.env ADMIN_ID yoki User.is_admin)."""
     if user_id == ADMIN_ID:
         return True
-    user = User.get_or_none(User.telegram_id == user_id)
-    return bool(user and user.is_admin)
+
+    def load() -> bool:
+        user = User.get_or_none(User.telegram_id == user_id)
+        return bool(user and user.is_admin)
+    return shared_cache.cached("admin", user_id, SHARED_CACHE_ADMIN_TTL, load)
 
 
 def _verified_user_from_init_data(authorization: Optional[str]) -> Optional[dict]:
@@ -448,64 +604,188 @@ def create_rich_test_endpoint(
     }
 
 
+async def _original_image(file_id: str) -> image_cache.CachedImage:
+    """Asl rasm — keshdan yoki Telegram'dan (disk o'qish thread pool'da)."""
+    entry = await run_in_threadpool(image_cache.get, file_id)
+    if entry is None:
+        if not BOT_TOKEN:
+            raise HTTPException(status_code=503, detail="Server sozlanmagan.")
+        try:
+            content, ctype = await telegram_files.fetch(file_id)
+        except telegram_files.TelegramFileError as exc:
+            logger.warning("get_question_image: rasmni olishda xatolik: %s", exc)
+            raise HTTPException(status_code=502, detail="Rasmni olishda xatolik.") from exc
+        entry = await run_in_threadpool(image_cache.put, file_id, content, ctype)
+    return entry
+
+
+async def _image_variant(file_id: str, width: Optional[int], fmt: Optional[str]) -> image_cache.CachedImage:
+    """Kichraytirilgan/qayta kodlangan variant (keshlanadi; parallel so'rovlar birlashadi)."""
+    if width is None and fmt is None:
+        return await _original_image(file_id)
+
+    key = f"{file_id}|w={width or 0}|{fmt or 'jpeg'}"
+    entry = await run_in_threadpool(image_cache.get, key)
+    if entry is not None:
+        return entry
+
+    future = _IMAGE_INFLIGHT.get(key)
+    if future is None:
+        async def build():
+            original = await _original_image(file_id)
+            # Pillow CPU ishi — event loop'ni band qilmasin
+            content, ctype = await run_in_threadpool(
+                image_variants.transcode, original.content, width, fmt
+            )
+            if ctype is None:
+                content, ctype = original.content, original.content_type
+            return await run_in_threadpool(image_cache.put, key, content, ctype)
+
+        future = asyncio.ensure_future(build())
+        _IMAGE_INFLIGHT[key] = future
+        future.add_done_callback(lambda _: _IMAGE_INFLIGHT.pop(key, None))
+    return await asyncio.shield(future)
+
+
+def _question_image_file_id(test_id: int, num: int) -> Optional[str]:
+    """Faol testdagi savol rasmining file_id'si (bitta so'rov, thread pool'da)."""
+    return (Question
+            .select(Question.image_file_id)
+            .join(Test)
+            .where((Test.id == test_id) & (Test.is_active == True)  # noqa: E712
+                   & (Question.num == num))
+            .scalar())
+
+
 @app.get("/api/test/{test_id}/image/{num}")
-def get_question_image(test_id: int, num: int):
-    """Savolga biriktirilgan rasmni Telegram'dan olib stream qiladi.
+async def get_question_image(
+    test_id: int,
+    num: int,
+    v: Optional[str] = None,
+    w: Optional[int] = None,
+    accept: Optional[str] = Header(default=None),
+    if_none_match: Optional[str] = Header(default=None),
+):
+    """Savolga biriktirilgan rasmni (keshdan yoki Telegram'dan) qaytaradi.
 
     To'g'ri javob emas — savol mazmunining bir qismi, shuning uchun test_id+num
-    bo'yicha ochiq (savol matni/variantlari kabi).
+    bo'yicha ochiq (savol matni/variantlari kabi). `w` — kerakli kenglik
+    (IMAGE_VARIANT_WIDTHS ga keltiriladi), format `Accept` bo'yicha (AVIF/WebP).
+    Javobda kuchli ETag bor, `If-None-Match` mos kelsa 304 qaytadi.
     """
-    test = Test.get_or_none(Test.id == test_id)
-    if not test or not test.is_active:
+    file_id = await run_in_threadpool(_question_image_file_id, test_id, num)
+    if not file_id:
         raise HTTPException(status_code=404, detail="Rasm topilmadi.")
 
-    q = Question.get_or_none((Question.test == test_id) & (Question.num == num))
-    if not q or not q.image_file_id:
-        raise HTTPException(status_code=404, detail="Rasm topilmadi.")
-    if not BOT_TOKEN:
-        raise HTTPException(status_code=503, detail="Server sozlanmagan.")
-
-    # Keshda bo'lsa — Telegram'ga chiqmaymiz
-    cached = _IMAGE_CACHE.get(q.image_file_id)
-    if cached is not None:
-        _IMAGE_CACHE.move_to_end(q.image_file_id)
-        content, ctype = cached
-        return Response(
-            content=content,
-            media_type=ctype,
-            headers={"Cache-Control": "public, max-age=3600"},
-        )
+    cache_control = (
+        _IMAGE_CACHE_IMMUTABLE if v == image_cache.version_token(file_id)
+        else _IMAGE_CACHE_REVALIDATE
+    )
 
+    entry = await _image_variant(
+        file_id, image_variants.choose_width(w), image_variants.choose_format(accept)
+    )
+
+    # Vary: Accept — format brauzerga qarab tanlanadi, oraliq keshlar ajratishi kerak
+    headers = {"ETag": entry.etag, "Cache-Control": cache_control, "Vary": "Accept"}
+    if _etag_matches(if_none_match, entry.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=entry.content, media_type=entry.content_type, headers=headers)
+
+
+async def _get_bot() -> Bot:
+    global _bot
+    async with _bot_lock:
+        if _bot is None:
+            # PTB default'i bitta ulanish — parallel topshiriqlar bildirishnomalari navbatda qoladi
+            bot = Bot(
+                BOT_TOKEN,
+                base_url=f"{TELEGRAM_API_BASE}/bot",
+                request=HTTPXRequest(connection_pool_size=16),
+            )
+            await bot.initialize()
+            _bot = bot
+    return _bot
+
+
+class SubmitAnswersRequest(BaseModel):
+    # Oddiy test: "abcd..." satri; aralash test: [{type, answer}, ...] JSON satri
+    answers: str = Field(default="", max_length=20000)
+
+
+def _prepare_submission(test_id: int, user: dict, answers: str) -> tuple:
+    """Topshiriqni yozishdan oldingi tekshiruv va baholash (thread pool'da).
+
+    Bot'dagi `webapp_receive_data` bilan bir xil qoidalar. Takroriy topshiriqni
+    bu yerdagi tekshiruv o'tkazib yuborsa ham, unique indeks uni yozishda bloklaydi.
+    """
     try:
-        meta_url = (
-            f"https://api.telegram.org/bot{BOT_TOKEN}/getFile"
-            f"?file_id={quote(q.image_file_id)}"
-        )
-        with urllib.request.urlopen(meta_url, timeout=10) as resp:
-            payload = json.loads(resp.read().decode("utf-8"))
-        if not payload.get("ok"):
-            raise ValueError("getFile ok=false")
-        file_path = payload["result"]["file_path"]
-
-        file_url = f"https://api.telegram.org/file/bot{BOT_TOKEN}/{file_path}"
-        with urllib.request.urlopen(file_url, timeout=15) as resp:
-            content = resp.read()
-            ctype = resp.headers.get("Content-Type", "image/jpeg")
+        test = Test.get_by_id(test_id)
+    except Test.DoesNotExist as exc:
+        raise HTTPException(status_code=404, detail="Test topilmadi!") from exc
+
+    if not test.is_active:
+        raise HTTPException(status_code=400, detail="Bu test yakunlangan.")
+
+    _validate_solver_access(test, user["id"])
+
+    safe_answers = answers.strip()
+    if not _is_mixed_test(test):
+        safe_answers = safe_answers.lower()
+    correct_count, total, results = check_answers(test.correct_answers, safe_answers, test.id)
+    return test, safe_answers, correct_count, total, results
+
+
+@app.post("/api/test/{test_id}/submit")
+async def submit_test_endpoint(
+    test_id: int,
+    payload: SubmitAnswersRequest,
+    authorization: Optional[str] = Header(default=None),
+):
+    """WebApp javoblarini to'g'ridan-to'g'ri qabul qilish (sendData → bot o'rniga).
+
+    Baholash `check_answers` bilan shu yerda; yozuv `write_queue` orqali —
+    bir vaqtda kelgan topshiriqlar bitta tranzaksiyada yoziladi (group commit).
+    Bildirishnomalar outbox'ga yoziladi — ularni bot jarayoni yuboradi.
+    Kanal a'zoligi talab qilinsa 403 `membership_required` — sahifa bu holda
+    eski yo'lga (sendData) o'tadi va bot qo'shilish tugmalarini ko'rsatadi.
+    """
+    user = _verified_user_from_init_data(authorization)
+    if not user:
+        raise HTTPException(status_code=401, detail="Avtorizatsiya talab qilinadi.")
+
+    try:
+        all_joined, _ = await membership.check_user_membership(await _get_bot(), user["id"])
     except Exception as exc:
-        logger.exception("get_question_image: rasmni olishda xatolik")
-        raise HTTPException(status_code=502, detail="Rasmni olishda xatolik.") from exc
-
-    # Keshga qo'yamiz (LRU: eng eski yozuvni chiqaramiz)
-    _IMAGE_CACHE[q.image_file_id] = (content, ctype)
-    _IMAGE_CACHE.move_to_end(q.image_file_id)
-    if len(_IMAGE_CACHE) > _IMAGE_CACHE_MAX:
-        _IMAGE_CACHE.popitem(last=False)
-
-    return Response(
-        content=content,
-        media_type=ctype,
-        headers={"Cache-Control": "public, max-age=3600"},
+        logger.exception("submit: a'zolikni tekshirib bo'lmadi")
+        raise HTTPException(status_code=503, detail="Vaqtincha band, qayta urining.") from exc
+    if not all_joined:
+        raise HTTPException(status_code=403, detail="membership_required")
+
+    test, answers, correct_count, total, results = await run_in_threadpool(
+        _prepare_submission, test_id, user, payload.answers
     )
+    # Yangi foydalanuvchi INSERT'i ham yozuv navbati orqali
+    db_user = await get_or_create_user_async(
+        telegram_id=user["id"],
+        username=user.get("username"),
+        full_name=user.get("full_name") or "",
+    )
+
+    # Topshiriq bilan birga tasdiq va egasi/kuzatuvchilarga xabarlar outbox'ga
+    # (bitta tranzaksiyada) — ularni bot jarayoni yuboradi
+    try:
+        await write_queue.submit(
+            services.record_submission_with_notices, test, db_user, answers, correct_count,
+            total, results, confirm_chat_id=user["id"],
+        )
+    except IntegrityError as exc:
+        # Unique indeks: parallel ikkinchi topshiriq
+        raise HTTPException(status_code=409, detail="Siz bu testni allaqachon ishlagansiz!") from exc
+    except Exception as exc:
+        logger.exception("submit: DB xatolik (test_id=%s)", test_id)
+        raise HTTPException(status_code=503, detail="Vaqtincha band, qayta urining.") from exc
+    return {"ok": True, "test_id": test.id}
 
 
 @app.get("/api/ping")
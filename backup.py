@@ -5,7 +5,8 @@ import sqlite3
 import tempfile
 from datetime import datetime
 
-from config import DATABASE_PATH
+from database import raw_connection
+import shared_cache
 
 logger = logging.getLogger(__name__)
 
@@ -22,7 +23,7 @@ def create_backup_file() -> tuple[str, int]:
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     backup_path = os.path.join(tempfile.gettempdir(), f"test_bot_backup_{timestamp}.db")
 
-    src = sqlite3.connect(DATABASE_PATH)
+    src = raw_connection()
     try:
         dst = sqlite3.connect(backup_path)
         try:
@@ -81,7 +82,7 @@ def restore_backup_file(downloaded_path: str) -> dict:
     try:
         src = sqlite3.connect(downloaded_path)
         try:
-            dst = sqlite3.connect(DATABASE_PATH)
+            dst = raw_connection()
             try:
                 with dst:
                     src.backup(dst)
@@ -93,9 +94,12 @@ def restore_backup_file(downloaded_path: str) -> dict:
         result["error"] = f"Bazani tiklashda xatolik: {e}"
         return result
 
+    # Umumiy keshdagi User.id, admin bayroqlari va a'zolik natijalari eski bazaniki
+    shared_cache.clear()
+
     # 4) Tiklangan baza tarkibini o'qish (jadval — yozuvlar soni)
     try:
-        conn = sqlite3.connect(DATABASE_PATH)
+        conn = raw_connection()
         try:
             tables = {}
             rows = conn.execute(
@@ -4,17 +4,25 @@ Test javoblarini tekshirish va statistika ko'rsatish
 """
 import asyncio
 import logging
-from telegram import BotCommand
-from telegram.ext import Application
+from telegram import BotCommand, Update
+from telegram.ext import Application, BaseUpdateProcessor
 
-from config import BOT_TOKEN, ADMIN_ID, BACKUP_INTERVAL_HOURS
-from database import init_db
+from config import (
+    BOT_TOKEN, ADMIN_ID, BACKUP_INTERVAL_HOURS, SQLITE_OPTIMIZE_INTERVAL_MIN, UPDATE_CONCURRENCY,
+)
+from database import flush_user_changes, init_db, optimize_db, user_flush_loop, write_queue
 from backup import send_backup
+import jobs
+import broadcast
+import fanout
+import outbox
+import shared_cache
+import soffice_pool
 
 # Handlerlarni import qilish
 from handlers import start, test_create, test_solve, test_manage, admin, inline, test_ai_create
 from membership import check_membership_callback
-from telegram.ext import CallbackQueryHandler, CommandHandler, MessageHandler, filters
+from telegram.ext import CallbackQueryHandler, CommandHandler, MessageHandler, TypeHandler, filters
 from keyboards import main_menu_keyboard
 
 # Logging sozlash
@@ -67,6 +75,83 @@ async def backup_scheduler(application):
             logger.exception("Avtomatik zaxira yuborishda xatolik")
 
 
+async def optimize_scheduler():
+    """Vaqti-vaqti bilan `PRAGMA optimize` (yozuv navbati orqali — yozuvlar bilan to'qnashmaydi).
+
+    Shu bilan birga umumiy keshdagi (shared_cache) muddati o'tgan yozuvlar tozalanadi.
+    """
+    if SQLITE_OPTIMIZE_INTERVAL_MIN <= 0:
+        return
+
+    while True:
+        try:
+            await asyncio.sleep(SQLITE_OPTIMIZE_INTERVAL_MIN * 60)
+            await write_queue.submit(optimize_db)
+            await asyncio.to_thread(shared_cache.purge_expired)
+        except asyncio.CancelledError:
+            break
+        except Exception:
+            logger.exception("PRAGMA optimize bajarilmadi")
+
+
+class PerUserUpdateProcessor(BaseUpdateProcessor):
+    """Turli foydalanuvchilar update'larini parallel, bittasinikini ketma-ket ishlash.
+
+    PTB default'ida update'lar bittadan ishlanadi — bir admin PDF eksport qilib
+    turganda boshqa hech kimga javob bormaydi. `concurrent_updates(True)` esa
+    bitta foydalanuvchining ketma-ket bosishlarini ham parallel qiladi va
+    ConversationHandler holatlari poygaga tushadi. Shu sababli update'lar
+    foydalanuvchi (u bo'lmasa chat) bo'yicha qulf bilan ishlanadi.
+    """
+
+    def __init__(self, max_concurrent_updates: int):
+        super().__init__(max_concurrent_updates)
+        # kalit -> (qulf, shu qulfni kutayotgan/ushlab turgan update'lar soni)
+        self._locks: dict = {}
+
+    @staticmethod
+    def _key(update):
+        user = getattr(update, "effective_user", None)
+        if user is not None:
+            return "u", user.id
+        chat = getattr(update, "effective_chat", None)
+        if chat is not None:
+            return "c", chat.id
+        return None
+
+    async def process_update(self, update, coroutine):
+        # Base'dagi process_update avval umumiy slotni (semafor) oladi, keyin
+        # do_process_update'ni chaqiradi — bitta foydalanuvchining qulf kutayotgan
+        # update'lari ham slot ushlab turib, boshqalarni to'sib qo'yardi. Shu
+        # sababli tartib teskari: avval foydalanuvchi qulfi, keyin slot.
+        key = self._key(update)
+        if key is None:
+            async with self._semaphore:
+                await self.do_process_update(update, coroutine)
+            return
+        entry = self._locks.get(key)
+        if entry is None:
+            entry = self._locks[key] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                async with self._semaphore:
+                    await self.do_process_update(update, coroutine)
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._locks[key]
+
+    async def do_process_update(self, update, coroutine):
+        await coroutine
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+
 async def main():
     """Botni ishga tushirish"""
     # Token tekshirish
@@ -80,12 +165,21 @@ async def main():
     init_db()
 
     # Application yaratish
-    application = Application.builder().token(BOT_TOKEN).build()
+    application = (
+        Application.builder()
+        .token(BOT_TOKEN)
+        .concurrent_updates(PerUserUpdateProcessor(UPDATE_CONCURRENCY))
+        .build()
+    )
 
     # (Global WebApp handler moved to the bottom so that conversation handlers can intercept it first)
 
 
     # Handlerlarni qo'shish
+    # Har update oldidan admin bayrog'i keshga olinadi (thread'da) — handlerlardagi
+    # sinxron is_admin / main_menu_keyboard event loop'da SQLite kutmaydi
+    application.add_handler(TypeHandler(Update, admin.warm_admin_flag), group=-1)
+
     # Start va help
     for handler in start.get_handlers():
         application.add_handler(handler)
@@ -143,11 +237,28 @@ async def main():
     await application.bot.set_my_commands(BOT_COMMANDS)
     logger.info("✅ Bot buyruqlari o'rnatildi")
 
+    # API (WebApp redirectlari) bot username'ni getMe'siz oladi
+    await asyncio.to_thread(
+        shared_cache.put, "bot", "username", application.bot.username, shared_cache.LONG_TTL
+    )
+
     await application.start()
     await application.updater.start_polling(drop_pending_updates=True)
 
     # Avtomatik zaxira jadvalini fon vazifasi sifatida ishga tushirish
     backup_task = asyncio.create_task(backup_scheduler(application))
+    optimize_task = asyncio.create_task(optimize_scheduler())
+    # Foydalanuvchi ismi/username o'zgarishlari yozuv navbati orqali yoziladi
+    user_flush_task = asyncio.create_task(user_flush_loop())
+    # Natija bildirishnomalari outbox'dan tezlik cheklovi bilan yuboriladi
+    outbox_task = asyncio.create_task(outbox.Dispatcher(application.bot).run())
+    # Restartgacha tugamay qolgan yakuniy natijalar yuborilishi davom etadi
+    resumed = fanout.resume(application.bot)
+    if resumed:
+        logger.info("📤 %s ta natijalar yuborilishi davom ettirildi", resumed)
+    resumed = broadcast.resume(application.bot)
+    if resumed:
+        logger.info("📣 %s ta broadcast davom ettirildi", resumed)
 
     # Run until stopped
     try:
@@ -157,9 +268,20 @@ async def main():
         pass
     finally:
         backup_task.cancel()
+        optimize_task.cancel()
+        user_flush_task.cancel()
+        outbox_task.cancel()
+        await asyncio.gather(outbox_task, return_exceptions=True)
+        await fanout.shutdown()
+        await broadcast.shutdown()
         await application.updater.stop()
         await application.stop()
         await application.shutdown()
+        await write_queue.submit(flush_user_changes)
+        await write_queue.submit(optimize_db)
+        await write_queue.close()
+        jobs.shutdown()
+        soffice_pool.shutdown()
 
 
 if __name__ == "__main__":
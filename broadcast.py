@@ -0,0 +1,397 @@
+"""Admin xabarini hamma foydalanuvchilarga yuborish (broadcast).
+
+Oldin hamma `User` ro'yxatga o'qilib, `copy_message` ketma-ket va har biridan
+keyin 0.05s uxlab yuborilardi (~15–20 xabar/s), bot to'xtasa yuborish
+yo'qolardi. Endi:
+
+- foydalanuvchilar id bo'yicha BROADCAST_PAGE tadan o'qiladi (keyset — OFFSET
+  yo'q), botni bloklaganlar (`users.is_blocked`) umuman olinmaydi;
+- sahifa BROADCAST_WORKERS ta yuboruvchiga navbat orqali tarqatiladi;
+- tezlik moslashuvchan: BROADCAST_RATE_PER_SEC dan boshlanadi, `RetryAfter`
+  kelsa hamma to'xtaydi va tezlik ikki barobar kamayadi, xatosiz yuborishlardan
+  keyin asta tiklanadi. Outbox bilan umumiy chegara (OUTBOX_RATE_PER_SEC) ham
+  hisobga olinadi, lekin past ustuvorlikda: natija bildirishnomalari yoki
+  yakuniy natijalar token kutayotgan bo'lsa keyingi token ularga beriladi,
+  bo'lmasa broadcast to'liq tezlikda ketadi (umumiy RetryAfter pauzasi hammaga);
+- har sahifa natijasi `broadcast_deliveries` ga yoziladi, `cursor` suriladi;
+  Forbidden olgan foydalanuvchilar `is_blocked` deb belgilanadi. Restartdan
+  keyin `resume()` davom ettiradi — yetkazilganlar qayta yuborilmaydi;
+- admin'ning tasdiq xabari jarayon bilan yangilanib boradi; yuborish xatolik
+  bilan to'xtasa `failed` deb belgilanadi va xabarda «Qayta urinish» tugmasi
+  chiqadi — `retry()` cursor'dan davom ettiradi.
+"""
+import asyncio
+import logging
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from telegram.error import BadRequest, Forbidden, RetryAfter, TelegramError
+
+from config import (
+    BROADCAST_MAX_ATTEMPTS, BROADCAST_PAGE, BROADCAST_RATE_PER_SEC, BROADCAST_WORKERS,
+)
+from database import Broadcast, BroadcastDelivery, User, forget_user, write_queue
+from keyboards import broadcast_retry_keyboard
+import outbox
+
+logger = logging.getLogger(__name__)
+
+# Admin xabari bundan tez-tez yangilanmaydi (soniya)
+_PROGRESS_INTERVAL = 5.0
+# Shuncha soniya RetryAfter'siz ishlansa tezlik 1 xabar/s ga oshiriladi
+_RECOVER_AFTER = 10.0
+
+_tasks: Dict[int, asyncio.Task] = {}
+_rates: Dict[int, "_AdaptiveRate"] = {}
+
+# (status, xato matni, urinishlar)
+Outcome = Tuple[str, Optional[str], int]
+
+
+class _AdaptiveRate:
+    """RetryAfter bo'yicha o'zgaruvchan tezlik (AIMD): xatoda yarmi, keyin +1."""
+
+    def __init__(self, max_rate: float):
+        self.max_rate = max_rate
+        self.bucket = outbox.TokenBucket(max_rate)
+        self.retry_after = 0
+        self._calm_since = time.monotonic()
+        self._cooldown_until = 0.0
+
+    @property
+    def rate(self) -> float:
+        return self.bucket.rate
+
+    async def acquire(self):
+        await self.bucket.acquire()
+        # Umumiy chegaradan past ustuvorlikda — outbox/fanout kutayotgan bo'lsa ular oldin
+        await outbox.rate_limiter().acquire(background=True)
+
+    def success(self):
+        now = time.monotonic()
+        if self.rate < self.max_rate and now - self._calm_since >= _RECOVER_AFTER:
+            self.bucket.set_rate(min(self.max_rate, self.rate + 1))
+            self._calm_since = now
+
+    def throttled(self, seconds: float):
+        self.retry_after += 1
+        now = time.monotonic()
+        # Bir vaqtda bir nechta yuboruvchi RetryAfter olsa tezlik bir marta kamayadi
+        if now >= self._cooldown_until:
+            self.bucket.set_rate(max(1.0, self.rate / 2))
+            logger.warning("Broadcast: RetryAfter %.0fs — tezlik %.1f xabar/s", seconds, self.rate)
+        self._cooldown_until = now + seconds
+        self._calm_since = now + seconds
+        self.bucket.pause(seconds)
+        outbox.rate_limiter().pause(seconds)
+
+
+# ─────────────────────────── DB amallari ───────────────────────────
+
+def _create(from_chat_id: int, message_id: int, admin_chat_id: int,
+            status_message_id: Optional[int]) -> Broadcast:
+    last_user_id = User.select(User.id).order_by(User.id.desc()).scalar() or 0
+    total = (User.select()
+             .where((User.is_blocked == False) & (User.id <= last_user_id))  # noqa: E712
+             .count())
+    return Broadcast.create(
+        from_chat_id=from_chat_id, message_id=message_id, admin_chat_id=admin_chat_id,
+        status_message_id=status_message_id, last_user_id=last_user_id, total=total,
+    )
+
+
+def _next_page(broadcast: Broadcast, cursor: int) -> List[Tuple[int, int]]:
+    """Keyingi sahifa: [(User.id, telegram_id)]."""
+    return list(
+        User.select(User.id, User.telegram_id)
+        .where((User.id > cursor)
+               & (User.id <= broadcast.last_user_id)
+               & (User.is_blocked == False))  # noqa: E712
+        .order_by(User.id)
+        .limit(BROADCAST_PAGE)
+        .tuples()
+    )
+
+
+def _already_delivered(broadcast_id: int, user_ids: List[int]) -> set:
+    """Yarim qolgan sahifada natijasi yozilganlar (restartdan keyin qayta yuborilmaydi)."""
+    return {
+        row[0] for row in
+        BroadcastDelivery.select(BroadcastDelivery.user)
+        .where((BroadcastDelivery.broadcast == broadcast_id)
+               & (BroadcastDelivery.user.in_(user_ids)))
+        .tuples()
+    }
+
+
+def _record_page(broadcast_id: int, cursor: int, outcomes: Dict[int, Outcome]):
+    """Sahifa natijalari, bloklaganlar va cursor — bitta tranzaksiyada (write_queue)."""
+    now = datetime.now()
+    rows = [(broadcast_id, user_id, status, error, attempts, now)
+            for user_id, (status, error, attempts) in outcomes.items()]
+    fields = [BroadcastDelivery.broadcast, BroadcastDelivery.user, BroadcastDelivery.status,
+              BroadcastDelivery.error, BroadcastDelivery.attempts, BroadcastDelivery.created_at]
+    for i in range(0, len(rows), 500):
+        BroadcastDelivery.insert_many(rows[i:i + 500], fields=fields).on_conflict_ignore().execute()
+
+    blocked = [user_id for user_id, (status, _, _) in outcomes.items() if status == "blocked"]
+    if blocked:
+        User.update(is_blocked=True).where(User.id.in_(blocked)).execute()
+
+    counts = {"sent": 0, "blocked": 0, "failed": 0}
+    for status, _, _ in outcomes.values():
+        counts[status] += 1
+    (Broadcast
+     .update(cursor=cursor,
+             sent=Broadcast.sent + counts["sent"],
+             blocked=Broadcast.blocked + counts["blocked"],
+             failed=Broadcast.failed + counts["failed"])
+     .where(Broadcast.id == broadcast_id)
+     .execute())
+
+
+def _finish(broadcast_id: int):
+    (Broadcast
+     .update(status="done", finished_at=datetime.now())
+     .where(Broadcast.id == broadcast_id)
+     .execute())
+
+
+def _fail(broadcast_id: int):
+    (Broadcast
+     .update(status="failed", finished_at=datetime.now())
+     .where(Broadcast.id == broadcast_id)
+     .execute())
+
+
+def _reopen(broadcast_id: int) -> bool:
+    """To'xtagan broadcast'ni qayta `running` qilish (faqat `failed` bo'lsa)."""
+    return bool(Broadcast
+                .update(status="running", finished_at=None)
+                .where((Broadcast.id == broadcast_id) & (Broadcast.status == "failed"))
+                .execute())
+
+
+# ─────────────────────────── yuborish ───────────────────────────
+
+async def _deliver(bot, broadcast: Broadcast, chat_id: int, rate: _AdaptiveRate) -> Outcome:
+    attempt = 0
+    while True:
+        await rate.acquire()
+        attempt += 1
+        try:
+            await bot.copy_message(
+                chat_id=chat_id,
+                from_chat_id=broadcast.from_chat_id,
+                message_id=broadcast.message_id,
+            )
+            rate.success()
+            return "sent", None, attempt
+        except RetryAfter as exc:
+            # Urinish hisoblanmaydi — Telegram faqat kutishni so'radi
+            attempt -= 1
+            rate.throttled(outbox.retry_after_seconds(exc))
+        except Forbidden as exc:
+            return "blocked", str(exc)[:200], attempt
+        except BadRequest as exc:
+            return "failed", str(exc)[:200], attempt
+        except TelegramError as exc:
+            if attempt >= BROADCAST_MAX_ATTEMPTS:
+                logger.warning("Broadcast #%s: %s urinishdan keyin yetmadi (chat=%s): %s",
+                               broadcast.id, attempt, chat_id, exc)
+                return "failed", str(exc)[:200], attempt
+            await asyncio.sleep(2 ** attempt)
+
+
+async def _worker(bot, broadcast: Broadcast, queue: asyncio.Queue, rate: _AdaptiveRate,
+                  outcomes: Dict[int, Outcome]):
+    while True:
+        user_id, chat_id = await queue.get()
+        try:
+            outcomes[user_id] = await _deliver(bot, broadcast, chat_id, rate)
+        except Exception as exc:
+            logger.exception("Broadcast #%s: kutilmagan xatolik (chat=%s)", broadcast.id, chat_id)
+            outcomes[user_id] = ("failed", str(exc)[:200], 1)
+        finally:
+            queue.task_done()
+
+
+def _progress_text(broadcast: Broadcast, done: bool, rate: Optional[float] = None) -> str:
+    if done:
+        return (
+            f"✅ <b>Xabar yuborildi!</b>\n\n"
+            f"📤 Yuborildi: {broadcast.sent} ta\n"
+            f"🚫 Botni bloklagan: {broadcast.blocked} ta\n"
+            f"❌ Yetib bormadi: {broadcast.failed} ta"
+        )
+    processed = broadcast.sent + broadcast.blocked + broadcast.failed
+    text = f"📤 Xabar yuborilmoqda (orqa fonda)... {processed}/{broadcast.total}"
+    if rate is not None:
+        text += f"\n⚡ {rate:.0f} xabar/s"
+    return text
+
+
+async def _report(bot, broadcast: Broadcast, done: bool, rate: Optional[float] = None):
+    if not broadcast.status_message_id:
+        return
+    try:
+        await bot.edit_message_text(
+            chat_id=broadcast.admin_chat_id,
+            message_id=broadcast.status_message_id,
+            text=_progress_text(broadcast, done, rate),
+            parse_mode="HTML",
+        )
+    except TelegramError as exc:
+        logger.debug("Broadcast: jarayon xabari yangilanmadi: %s", exc)
+
+
+async def _report_failure(bot, broadcast_id: int):
+    """Broadcast to'xtaganini adminga bildirish (jarayon xabari o'rniga yoki yangi xabar)."""
+    broadcast = Broadcast.get_by_id(broadcast_id)
+    processed = broadcast.sent + broadcast.blocked + broadcast.failed
+    text = (
+        "⚠️ <b>Xabar yuborish xatolik bilan to'xtadi</b>\n\n"
+        f"📤 Ishlandi: {processed}/{broadcast.total}\n\n"
+        "Qayta urinilsa yuborish to'xtagan joyidan davom etadi."
+    )
+    markup = broadcast_retry_keyboard(broadcast.id)
+    try:
+        if broadcast.status_message_id:
+            await bot.edit_message_text(
+                chat_id=broadcast.admin_chat_id, message_id=broadcast.status_message_id,
+                text=text, parse_mode="HTML", reply_markup=markup,
+            )
+        else:
+            await bot.send_message(
+                chat_id=broadcast.admin_chat_id, text=text, parse_mode="HTML", reply_markup=markup,
+            )
+    except TelegramError as exc:
+        logger.info("Broadcast: xatolik haqida xabar yuborilmadi (chat=%s): %s",
+                    broadcast.admin_chat_id, exc)
+
+
+async def _run(bot, broadcast_id: int):
+    broadcast = Broadcast.get_by_id(broadcast_id)
+    rate = _rates[broadcast_id] = _AdaptiveRate(BROADCAST_RATE_PER_SEC)
+    queue: asyncio.Queue = asyncio.Queue()
+    outcomes: Dict[int, Outcome] = {}
+    workers = [
+        asyncio.create_task(_worker(bot, broadcast, queue, rate, outcomes))
+        for _ in range(BROADCAST_WORKERS)
+    ]
+    if broadcast.cursor:
+        logger.info("Broadcast #%s davom etmoqda: cursor=%s", broadcast.id, broadcast.cursor)
+    cursor = broadcast.cursor
+    reported_at = time.monotonic()
+    try:
+        while True:
+            page = _next_page(broadcast, cursor)
+            if not page:
+                break
+            done = _already_delivered(broadcast.id, [user_id for user_id, _ in page])
+            for item in page:
+                if item[0] not in done:
+                    queue.put_nowait(item)
+            await queue.join()
+
+            page_outcomes = dict(outcomes)
+            outcomes.clear()
+            cursor = page[-1][0]
+            await write_queue.submit(_record_page, broadcast.id, cursor, page_outcomes)
+            chat_ids = dict(page)
+            for user_id, (status, _, _) in page_outcomes.items():
+                if status == "blocked":
+                    forget_user(chat_ids[user_id])  # keshdagi nusxa ham yangilansin
+
+            if time.monotonic() - reported_at >= _PROGRESS_INTERVAL:
+                reported_at = time.monotonic()
+                broadcast = Broadcast.get_by_id(broadcast.id)
+                await _report(bot, broadcast, done=False, rate=rate.rate)
+    except asyncio.CancelledError:
+        # Yarim sahifadagi yetkazilganlar yoziladi (cursor surilmaydi) — qayta yuborilmaydi
+        if outcomes:
+            await write_queue.submit(_record_page, broadcast.id, cursor, dict(outcomes))
+        raise
+    finally:
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+
+    await write_queue.submit(_finish, broadcast.id)
+    broadcast = Broadcast.get_by_id(broadcast.id)
+    logger.info("Broadcast #%s tugadi: yuborildi=%s, bloklagan=%s, yetmadi=%s, RetryAfter=%s",
+                broadcast.id, broadcast.sent, broadcast.blocked, broadcast.failed, rate.retry_after)
+    await _report(bot, broadcast, done=True)
+
+
+def _spawn(bot, broadcast_id: int):
+    async def runner():
+        try:
+            await _run(bot, broadcast_id)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Broadcast #%s xatolik bilan to'xtadi", broadcast_id)
+            # `running` bo'lib qolsa faqat restartda davom etardi — `failed` va adminga tugma
+            try:
+                await write_queue.submit(_fail, broadcast_id)
+                await _report_failure(bot, broadcast_id)
+            except Exception:
+                logger.exception("Broadcast #%s: xatolik holatini saqlab bo'lmadi", broadcast_id)
+        finally:
+            _tasks.pop(broadcast_id, None)
+            _rates.pop(broadcast_id, None)
+
+    _tasks[broadcast_id] = asyncio.create_task(runner())
+
+
+# ─────────────────────────── umumiy API ───────────────────────────
+
+async def start(bot, from_chat_id: int, message_id: int, admin_chat_id: int,
+                status_message_id: Optional[int] = None) -> Broadcast:
+    """Broadcast'ni yaratib fon vazifasi sifatida boshlash (handler darrov qaytadi)."""
+    broadcast = await write_queue.submit(
+        _create, from_chat_id, message_id, admin_chat_id, status_message_id
+    )
+    _spawn(bot, broadcast.id)
+    return broadcast
+
+
+async def retry(bot, broadcast_id: int) -> bool:
+    """Xatolik bilan to'xtagan broadcast'ni cursor'dan qayta boshlash.
+
+    Returns:
+        True — qayta ishga tushdi; False — u `failed` emas (ketmoqda/tugagan)
+    """
+    if broadcast_id in _tasks or not await write_queue.submit(_reopen, broadcast_id):
+        return False
+    logger.info("Broadcast #%s qayta ishga tushirildi", broadcast_id)
+    _spawn(bot, broadcast_id)
+    return True
+
+
+def resume(bot) -> int:
+    """Tugallanmay qolgan broadcast'larni davom ettirish (bot ishga tushganda)."""
+    pending = [b.id for b in Broadcast.select(Broadcast.id).where(Broadcast.status == "running")]
+    for broadcast_id in pending:
+        if broadcast_id not in _tasks:
+            _spawn(bot, broadcast_id)
+    return len(pending)
+
+
+def snapshot() -> Dict[str, float]:
+    """Ketayotgan broadcast'lar va ularning joriy tezligi (admin /jobs uchun)."""
+    return {
+        "running": len(_tasks),
+        "rate": sum(rate.rate for rate in _rates.values()),
+        "retry_after": sum(rate.retry_after for rate in _rates.values()),
+    }
+
+
+async def shutdown():
+    """Vazifalarni to'xtatish — cursor'dan keyingisi keyingi ishga tushishda yuboriladi."""
+    tasks = list(_tasks.values())
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
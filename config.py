@@ -32,3 +32,155 @@ GEMINI_API_KEY = os.getenv("GEMINI_API_KEY", "").strip()
 # Bepul, vision'li Flash modeli. Kerak bo'lsa .env orqali boshqasiga almashtiriladi.
 # Eslatma: ba'zi kalitlarda 2.0 modellarda bepul tier yopiq (limit:0); 2.5 ochiq.
 GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.5-flash").strip()
+
+
+def _choice_env(name: str, default: str, allowed: set) -> str:
+    """Ruxsat etilgan qiymatlardan biri bo'lishi shart bo'lgan sozlama.
+
+    Noto'g'ri qiymat jimgina default'ga tushib qolmasligi uchun ishga
+    tushishdayoq aniq xabar bilan to'xtatiladi.
+    """
+    value = os.getenv(name, default).strip().lower() or default
+    if value not in allowed:
+        raise ValueError(
+            f"{name}={value!r} noto'g'ri; ruxsat etilgan qiymatlar: {', '.join(sorted(allowed))}"
+        )
+    return value
+
+
+# Rash modeli dvigateli: 'jmle' (NumPy, tez — default), 'cmle' (shartli ML —
+# qisqa testlarda siljishsiz qiyinliklar) yoki 'jmle_py' (sof Python etalon)
+RASCH_ENGINE = _choice_env("RASCH_ENGINE", "jmle", {"jmle", "jmle_py", "cmle"})
+# 1 bo'lsa har hisoblashda NumPy JMLE natijasi etalon bilan solishtiriladi (farq log'ga yoziladi)
+RASCH_VERIFY = os.getenv("RASCH_VERIFY", "0").strip().lower() in {"1", "true", "yes"}
+
+
+def _int_env(name: str, default: int) -> int:
+    """Butun sonli sozlama (noto'g'ri qiymatda default)."""
+    try:
+        return int(os.getenv(name, str(default)))
+    except ValueError:
+        return default
+
+
+# Og'ir ishlar executori (jobs.py): statistika/Rash/eksport event loop'dan tashqarida.
+# Thread pool — DB va LibreOffice kabi I/O kutadigan ishlar uchun.
+JOB_THREAD_WORKERS = max(1, _int_env("JOB_THREAD_WORKERS", 4))
+# Process pool — Rash va matplotlib/openpyxl (CPU). 0 = hammasi thread pool'da.
+JOB_PROCESS_WORKERS = max(0, _int_env("JOB_PROCESS_WORKERS", 2))
+# Bir vaqtda navbatda turishi mumkin bo'lgan ishlar soni (oshsa "band" javobi)
+JOB_QUEUE_LIMIT = max(1, _int_env("JOB_QUEUE_LIMIT", 32))
+# Bot bir vaqtda shuncha update'ni ishlaydi (turli foydalanuvchilar parallel,
+# bitta foydalanuvchiniki — ketma-ket). 1 = hammasi ketma-ket (PTB default'i).
+UPDATE_CONCURRENCY = max(1, _int_env("UPDATE_CONCURRENCY", 64))
+
+# Yakunlangan testlar natijalari keshi (result_cache.py): statistika, Rash,
+# Excel/PDF/grafik fayllari va Telegram file_id'lari diskda saqlanadi.
+RESULT_CACHE_DIR = os.getenv("RESULT_CACHE_DIR", "result_cache").strip() or "result_cache"
+# Kesh hajmi chegarasi (MB); oshsa eng kam ishlatilganlari o'chiriladi. 0 = kesh o'chirilgan.
+RESULT_CACHE_MAX_MB = max(0, _int_env("RESULT_CACHE_MAX_MB", 200))
+
+# LibreOffice konvertatsiya pool'i (soffice_pool.py): doimiy headless worker'lar soni.
+# python3-uno kerak; bo'lmasa yoki 0 bo'lsa har fayl uchun alohida soffice ishga tushadi.
+SOFFICE_POOL_SIZE = max(0, _int_env("SOFFICE_POOL_SIZE", 2))
+
+# Telegram Bot API manzili (lokal Bot API server yoki yuklama testi uchun almashtiriladi)
+TELEGRAM_API_BASE = (
+    os.getenv("TELEGRAM_API_BASE", "").strip().rstrip("/") or "https://api.telegram.org"
+)
+# getFile natijasi (file_path) keshlanadigan vaqt, soniya. Telegram havolani kamida 1 soat saqlaydi.
+TELEGRAM_FILE_PATH_TTL = max(0, _int_env("TELEGRAM_FILE_PATH_TTL", 3000))
+
+# Savol rasmlari keshi (image_cache.py): xotira qatlami hajmi (har bir API worker'ida), MB
+IMAGE_CACHE_MEMORY_MB = max(1, _int_env("IMAGE_CACHE_MEMORY_MB", 32))
+# Disk qatlami — worker'lar o'rtasida umumiy va restartdan keyin ham saqlanadi
+IMAGE_CACHE_DIR = os.getenv("IMAGE_CACHE_DIR", "image_cache").strip() or "image_cache"
+# Disk qatlami hajmi chegarasi, MB (0 = disk qatlami o'chirilgan)
+IMAGE_CACHE_DISK_MB = max(0, _int_env("IMAGE_CACHE_DISK_MB", 500))
+
+
+def _int_list_env(name: str, default: str) -> tuple:
+    """Vergul bilan ajratilgan musbat butun sonlar (o'sish tartibida)."""
+    values = set()
+    for part in os.getenv(name, default).split(","):
+        part = part.strip()
+        if part.isdigit() and int(part) > 0:
+            values.add(int(part))
+    return tuple(sorted(values))
+
+
+# Savol rasmlarining kichraytirilgan variantlari kengliklari, px (bo'sh = faqat asl o'lcham)
+IMAGE_VARIANT_WIDTHS = _int_list_env("IMAGE_VARIANT_WIDTHS", "480,960")
+
+# Yozuvlarni guruhlab yozish (database.WriteQueue): bitta tranzaksiyadagi ishlar chegarasi
+WRITE_BATCH_MAX = max(1, _int_env("WRITE_BATCH_MAX", 64))
+# Batch yig'ish oynasi, ms. 0 = kutmasdan: oldingi batch yozilayotganda navbatga
+# kelganlar keyingi batch'ga tushadi (odatda yetarli)
+WRITE_BATCH_WINDOW_MS = max(0, _int_env("WRITE_BATCH_WINDOW_MS", 0))
+
+# Foydalanuvchilar identity keshi (database.get_or_create_user): yozuvlar soni va
+# yashash muddati, soniya (boshqa jarayondagi admin o'zgarishlari shu vaqtda ko'rinadi)
+USER_CACHE_SIZE = max(0, _int_env("USER_CACHE_SIZE", 10000))
+USER_CACHE_TTL = max(0, _int_env("USER_CACHE_TTL", 300))
+# Ism/username o'zgarishlari bitta INSERT ... ON CONFLICT bilan yoziladi: shuncha
+# o'zgarish yig'ilganda yoki oxirgi yozuvdan shuncha soniya o'tganda
+USER_FLUSH_BATCH = max(1, _int_env("USER_FLUSH_BATCH", 200))
+USER_FLUSH_INTERVAL = max(0, _int_env("USER_FLUSH_INTERVAL", 30))
+
+# SQLite unumdorlik profili — har ulanishga (peewee va backup.py dagi sqlite3) qo'llanadi.
+# Tanlash uchun o'z serverda: python scripts/bench_sqlite.py
+# synchronous: WAL'da 'normal' — commit'da fsync yo'q (checkpoint'da bor); elektr uzilsa
+# oxirgi tranzaksiyalar yo'qolishi mumkin, baza buzilmaydi. 'full' — har commit'da fsync.
+# Qiymat PRAGMA'ga to'g'ridan-to'g'ri qo'yiladi — shuning uchun ro'yxat bilan tekshiriladi
+SQLITE_SYNCHRONOUS = _choice_env(
+    "SQLITE_SYNCHRONOUS", "normal", {"off", "normal", "full", "extra", "0", "1", "2", "3"}
+)
+# Sahifalar keshi har ulanish uchun, KB
+SQLITE_CACHE_SIZE_KB = max(0, _int_env("SQLITE_CACHE_SIZE_KB", 16384))
+# Memory-mapped o'qish hajmi, MB (0 = o'chirilgan)
+SQLITE_MMAP_SIZE_MB = max(0, _int_env("SQLITE_MMAP_SIZE_MB", 128))
+# Vaqtinchalik jadval/indekslar: 'memory', 'file' yoki 'default'
+SQLITE_TEMP_STORE = _choice_env("SQLITE_TEMP_STORE", "memory", {"default", "file", "memory", "0", "1", "2"})
+# WAL shuncha sahifaga yetganda avtomatik checkpoint (0 = o'chirilgan)
+SQLITE_WAL_AUTOCHECKPOINT = max(0, _int_env("SQLITE_WAL_AUTOCHECKPOINT", 1000))
+# Bot `PRAGMA optimize` ni necha daqiqada bir bajaradi (0 = o'chirilgan)
+SQLITE_OPTIMIZE_INTERVAL_MIN = max(0, _int_env("SQLITE_OPTIMIZE_INTERVAL_MIN", 60))
+
+# Bildirishnomalar outbox'i (outbox.py): Telegram'ga umumiy tezlik (xabar/s),
+# bitta chatga xabarlar orasidagi minimal oraliq (ms) va xatoda urinishlar soni
+OUTBOX_RATE_PER_SEC = max(1, _int_env("OUTBOX_RATE_PER_SEC", 30))
+OUTBOX_CHAT_INTERVAL_MS = max(0, _int_env("OUTBOX_CHAT_INTERVAL_MS", 1000))
+OUTBOX_MAX_ATTEMPTS = max(1, _int_env("OUTBOX_MAX_ATTEMPTS", 5))
+# Bitta test natijalari bir chatga shu oynada (s) ko'p kelsa — bitta xulosa xabar
+OUTBOX_COALESCE_SECONDS = max(0, _int_env("OUTBOX_COALESCE_SECONDS", 60))
+# Boshqa jarayon (API) yozgan xabarlarni tekshirish oralig'i, ms
+OUTBOX_POLL_MS = max(100, _int_env("OUTBOX_POLL_MS", 1000))
+
+# Test yakunlanganda natijalarni ishtirokchilarga yuborish (fanout.py): bir vaqtdagi
+# yuborishlar va bir bo'lakdagi topshiriqlar (har bo'lakdan keyin joy saqlanadi)
+FANOUT_CONCURRENCY = max(1, _int_env("FANOUT_CONCURRENCY", 8))
+FANOUT_CHUNK = max(1, _int_env("FANOUT_CHUNK", 100))
+
+# Admin broadcast'i (broadcast.py): yuqori tezlik chegarasi (RetryAfter'da avtomatik
+# pasayadi, keyin asta tiklanadi), parallel yuboruvchilar, sahifa hajmi va urinishlar.
+# Umumiy OUTBOX_RATE_PER_SEC'dan oshmaydi va undan past ustuvorlikda oladi — kutayotgan
+# bildirishnomalar va yakuniy natijalar oldin yuboriladi (outbox.TokenBucket).
+# 28 xabar/s da 200 ming foydalanuvchi ~2 soatda yetib boradi.
+BROADCAST_RATE_PER_SEC = max(1, min(_int_env("BROADCAST_RATE_PER_SEC", 28), OUTBOX_RATE_PER_SEC))
+BROADCAST_WORKERS = max(1, _int_env("BROADCAST_WORKERS", 16))
+BROADCAST_PAGE = max(1, _int_env("BROADCAST_PAGE", 500))
+BROADCAST_MAX_ATTEMPTS = max(1, _int_env("BROADCAST_MAX_ATTEMPTS", 3))
+
+# Kanal a'zoligi (membership.py): tasdiqlangan/rad etilgan natija keshi muddati (s),
+# kesh hajmi (foydalanuvchi), kanallar ro'yxati keshi (s) va bir vaqtdagi
+# get_chat_member so'rovlari chegarasi
+MEMBERSHIP_CACHE_TTL = max(0, _int_env("MEMBERSHIP_CACHE_TTL", 180))
+MEMBERSHIP_NEGATIVE_TTL = max(0, _int_env("MEMBERSHIP_NEGATIVE_TTL", 10))
+MEMBERSHIP_CACHE_SIZE = max(0, _int_env("MEMBERSHIP_CACHE_SIZE", 50000))
+CHANNEL_CACHE_TTL = max(0, _int_env("CHANNEL_CACHE_TTL", 60))
+MEMBERSHIP_CONCURRENCY = max(1, _int_env("MEMBERSHIP_CONCURRENCY", 20))
+
+# Bot va API jarayonlari uchun umumiy kesh (shared_cache.py): SQLite yon fayli
+# (bo'sh — o'chiq) va admin bayrog'i muddati (s)
+SHARED_CACHE_PATH = os.getenv("SHARED_CACHE_PATH", "shared_cache.db").strip()
+SHARED_CACHE_ADMIN_TTL = max(0, _int_env("SHARED_CACHE_ADMIN_TTL", 300))
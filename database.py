@@ -1,19 +1,66 @@
 """Database modellari - Peewee ORM"""
+import asyncio
+import functools
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from datetime import datetime
+from typing import Callable, Dict, Optional
+
 from peewee import (
-    SqliteDatabase, Model,
-    IntegerField, BigIntegerField, CharField, TextField,
+    EXCLUDED, SqliteDatabase, Model,
+    IntegerField, BigIntegerField, CharField, TextField, BlobField,
     BooleanField, DateTimeField, ForeignKeyField, CompositeKey
 )
-from config import DATABASE_PATH
+from config import (
+    DATABASE_PATH, WRITE_BATCH_MAX, WRITE_BATCH_WINDOW_MS,
+    USER_CACHE_SIZE, USER_CACHE_TTL, USER_FLUSH_BATCH, USER_FLUSH_INTERVAL,
+    SQLITE_SYNCHRONOUS, SQLITE_CACHE_SIZE_KB, SQLITE_MMAP_SIZE_MB, SQLITE_TEMP_STORE,
+    SQLITE_WAL_AUTOCHECKPOINT,
+)
 
-# Database yaratish
-# WAL rejimi: bot va FastAPI bir vaqtda yozayotganda "database is locked" ni kamaytiradi.
+logger = logging.getLogger(__name__)
+
+# Har ulanishga qo'llanadigan PRAGMA'lar (config'dagi SQLite profili).
 # busy_timeout: lock band bo'lsa darhol xato bermay, 5 sekundgacha kutadi.
-db = SqliteDatabase(DATABASE_PATH, pragmas={
-    "journal_mode": "wal",
+CONNECTION_PRAGMAS = {
     "busy_timeout": 5000,
-})
+    "synchronous": SQLITE_SYNCHRONOUS,
+    "cache_size": -SQLITE_CACHE_SIZE_KB,  # manfiy — KB'da
+    "mmap_size": SQLITE_MMAP_SIZE_MB * 1024 * 1024,
+    "temp_store": SQLITE_TEMP_STORE,
+    "wal_autocheckpoint": SQLITE_WAL_AUTOCHECKPOINT,
+}
+
+# Database yaratish
+# WAL rejimi: bot va FastAPI bir vaqtda yozayotganda "database is locked" ni kamaytiradi.
+db = SqliteDatabase(DATABASE_PATH, pragmas={"journal_mode": "wal", **CONNECTION_PRAGMAS})
+
+
+def raw_connection(path: str = DATABASE_PATH) -> sqlite3.Connection:
+    """Peewee'siz sqlite3 ulanishi (backup.py) — xuddi shu PRAGMA profili bilan."""
+    conn = sqlite3.connect(path)
+    for name, value in CONNECTION_PRAGMAS.items():
+        # Qiymatlar config.py'da tekshirilgan (ro'yxat yoki butun son)
+        try:
+            conn.execute(f"PRAGMA {name} = {value}")
+        except sqlite3.Error as e:
+            conn.close()
+            raise sqlite3.OperationalError(f"PRAGMA {name} = {value!r} qo'llanmadi: {e}") from e
+    return conn
+
+
+def optimize_db():
+    """`PRAGMA optimize` — so'rovlar rejalashtiruvchisi statistikasini yangilash.
+
+    SQLite faqat kerakli jadvallar uchun ANALYZE qiladi, shuning uchun vaqti-vaqti
+    bilan chaqirish arzon (bot SQLITE_OPTIMIZE_INTERVAL_MIN da bir).
+    """
+    db.execute_sql("PRAGMA optimize")
 
 
 class BaseModel(Model):
@@ -28,6 +75,9 @@ class User(BaseModel):
     username = CharField(null=True)
     full_name = CharField()
     is_admin = BooleanField(default=False)
+    # Botni bloklagan (broadcast'da Forbidden) — keyingi broadcast'lar o'tkazib yuboradi.
+    # Foydalanuvchi botga yana yozsa get_or_create_user bayroqni olib tashlaydi.
+    is_blocked = BooleanField(default=False)
     created_at = DateTimeField(default=datetime.now)
 
     class Meta:
@@ -45,26 +95,39 @@ class Test(BaseModel):
     source = CharField(default="legacy")
     created_at = DateTimeField(default=datetime.now)
     ended_at = DateTimeField(null=True)
+    # WebApp'ga beriladigan tuzilma (savollar/rasmlar) versiyasi: savol rasmi
+    # almashtirilganda yoki test yakunlanganda oshiriladi (services.bump_structure_version)
+    # — API'dagi tayyor JSON keshi shu orqali eskiradi.
+    structure_version = IntegerField(default=1)
+    # correct_answers'dan hisoblangan sonlar (save() da yangilanadi) — ro'yxatlar
+    # yuzlab testni JSON'ni o'qimasdan ko'rsatadi. open2 bitta savol, ikkita item.
+    question_count = IntegerField(null=True)
+    item_count = IntegerField(null=True)
 
     class Meta:
         table_name = "tests"
 
+    def save(self, *args, **kwargs):
+        if "correct_answers" in self._dirty or self.question_count is None:
+            self.question_count, self.item_count = _answer_counts(self.correct_answers)
+        return super().save(*args, **kwargs)
+
     @property
     def total_questions(self):
         """Savollar soni (oddiy string yoki JSON massiv).
 
-        Baholash (utils.check_answers) bilan mos bo'lishi shart: buzilgan JSON'da
-        xom satr uzunligi emas, 0 qaytaramiz; legacy satrda bo'sh joy sanalmaydi.
+        Baholash (utils.check_answers) bilan mos: buzilgan JSON'da 0, legacy
+        satrda bo'sh joy sanalmaydi. Odatda saqlangan ustundan o'qiladi.
         """
-        raw = self.correct_answers or ""
-        if raw.startswith("[{"):
-            import json
-            try:
-                data = json.loads(raw)
-                return len(data) if isinstance(data, list) else 0
-            except (ValueError, TypeError):
-                return 0
-        return len(raw.strip())
+        if self.question_count is not None:
+            return self.question_count
+        return _answer_counts(self.correct_answers)[0]
+
+
+def _answer_counts(correct: Optional[str]) -> tuple:
+    # utils database'ni import qiladi — aylanma importdan qochish uchun shu yerda
+    from utils import answer_counts
+    return answer_counts(correct or "")
 
 
 class TestSubmission(BaseModel):
@@ -74,6 +137,10 @@ class TestSubmission(BaseModel):
     answers = TextField()
     correct_count = IntegerField()
     total_count = IntegerField()
+    # Expanded itemlar bo'yicha to'g'ri/noto'g'ri bitmap (i-item = i-bit,
+    # little-endian; utils.pack_results). Statistika va Rash matritsasi javob
+    # satrini qayta tahlil qilmasdan shundan o'qiydi.
+    result_bits = BlobField(null=True)
     submitted_at = DateTimeField(default=datetime.now)
 
     class Meta:
@@ -131,6 +198,118 @@ class Question(BaseModel):
         table_name = "questions"
 
 
+class QuestionStat(BaseModel):
+    """Test bo'yicha har bir expanded item uchun to'g'ri javoblar hisoblagichi.
+
+    Topshiriq yozilgan tranzaksiyaning o'zida yangilanadi
+    (services.record_submission), shuning uchun statistika barcha topshiriqlarni
+    qayta ko'rib chiqmasdan O(items) da olinadi. Mos kelmay qolsa —
+    scripts/rebuild_question_stats.py.
+    """
+    test = ForeignKeyField(Test, backref="question_stats")
+    item = IntegerField()                   # expanded item indeksi (0..item_count-1)
+    correct_count = IntegerField(default=0)
+
+    class Meta:
+        table_name = "question_stats"
+        primary_key = CompositeKey("test", "item")
+
+
+class OutboxMessage(BaseModel):
+    """Yuborilishi kutilayotgan bot xabari (outbox.py dispatcher'i yuboradi).
+
+    Handlerlar va API xabarni to'g'ridan-to'g'ri yubormaydi — shu jadvalga
+    yozadi. Bir xil `group_key` li xabarlar (masalan, bitta testning yangi
+    natijalari) bir chatga qisqa vaqtda ko'p kelsa bitta xulosa bo'lib ketadi;
+    `payload` — xulosa uchun ma'lumot (JSON). Yuborilgan qator o'chiriladi.
+    """
+    chat_id = BigIntegerField()
+    text = TextField()
+    group_key = CharField(null=True)
+    payload = TextField(null=True)
+    attempts = IntegerField(default=0)
+    available_at = DateTimeField(default=datetime.now)  # shu vaqtdan oldin yuborilmaydi
+    created_at = DateTimeField(default=datetime.now)
+
+    class Meta:
+        table_name = "outbox_messages"
+
+
+class FanoutJob(BaseModel):
+    """Ko'p qabul qiluvchiga yuborish ishi (fanout.py) — restartdan keyin davom etadi.
+
+    `cursor` — xabari yuborilgan oxirgi TestSubmission.id; topshiriqlar id
+    tartibida bo'laklab yuboriladi va har bo'lakdan keyin cursor saqlanadi.
+    """
+    test = ForeignKeyField(Test, backref="fanout_jobs")
+    kind = CharField(default="final_results")
+    status = CharField(default="running")       # running / done / failed
+    admin_chat_id = BigIntegerField(null=True)  # jarayon haqida xabar oladigan chat
+    progress_message_id = IntegerField(null=True)
+    cursor = IntegerField(default=0)
+    total = IntegerField(default=0)
+    sent = IntegerField(default=0)
+    failed = IntegerField(default=0)
+    created_at = DateTimeField(default=datetime.now)
+    finished_at = DateTimeField(null=True)
+
+    class Meta:
+        table_name = "fanout_jobs"
+
+
+class Broadcast(BaseModel):
+    """Admin xabarini hamma foydalanuvchilarga yuborish (broadcast.py).
+
+    Foydalanuvchilar id tartibida sahifalab o'tiladi; `cursor` — to'liq
+    ishlangan sahifaning oxirgi User.id si. Restartdan keyin shu joydan davom
+    etadi, yarim qolgan sahifadagi yetkazilganlar BroadcastDelivery bo'yicha
+    o'tkazib yuboriladi.
+    """
+    from_chat_id = BigIntegerField()
+    message_id = IntegerField()
+    admin_chat_id = BigIntegerField()
+    status_message_id = IntegerField(null=True)  # jarayon ko'rsatiladigan xabar
+    status = CharField(default="running")        # running / done / failed
+    cursor = IntegerField(default=0)
+    last_user_id = IntegerField(default=0)       # boshlanganda eng katta User.id — keyingilar kirmaydi
+    total = IntegerField(default=0)
+    sent = IntegerField(default=0)
+    blocked = IntegerField(default=0)
+    failed = IntegerField(default=0)
+    created_at = DateTimeField(default=datetime.now)
+    finished_at = DateTimeField(null=True)
+
+    class Meta:
+        table_name = "broadcasts"
+
+
+class BroadcastDelivery(BaseModel):
+    """Broadcast'ning bitta foydalanuvchiga yetkazilish natijasi."""
+    broadcast = ForeignKeyField(Broadcast, backref="deliveries", on_delete="CASCADE")
+    user = ForeignKeyField(User, backref="broadcast_deliveries", on_delete="CASCADE")
+    status = CharField()                # sent / blocked / failed
+    error = CharField(null=True)
+    attempts = IntegerField(default=1)
+    created_at = DateTimeField(default=datetime.now)
+
+    class Meta:
+        table_name = "broadcast_deliveries"
+        indexes = ((("broadcast", "user"), True),)
+
+
+# ─────────────────────────── migratsiyalar ───────────────────────────
+#
+# Sxema versiyasi `schema_version` jadvalida saqlanadi. Har migratsiya bir marta,
+# tartib bilan va o'z tranzaksiyasida bajariladi; muvaffaqiyatli bo'lsagina
+# versiya oshiriladi. Yangi o'zgarish — ro'yxat oxiriga yangi funksiya (eski
+# migratsiyalar o'zgartirilmaydi). Versiya jadvali paydo bo'lishidan oldingi
+# bazalarda ham migratsiyalar xavfsiz: ustun/indeks borligi tekshiriladi.
+
+
+def _columns(table: str) -> list:
+    return [row[1] for row in db.execute_sql(f"PRAGMA table_info({table})").fetchall()]
+
+
 def _migrate_unique_submissions():
     """Bir foydalanuvchi bir testni faqat bir marta topshira olishini kafolatlash.
 
@@ -149,54 +328,528 @@ def _migrate_unique_submissions():
 
 
 def _migrate_add_test_source():
-    """Mavjud `tests` jadvaliga `source` ustunini xavfsiz qo'shish.
+    """Mavjud `tests` jadvaliga `source` ustunini qo'shish.
 
     SQLite'da `ADD COLUMN IF NOT EXISTS` yo'q, shuning uchun avval ustun borligini
     PRAGMA orqali tekshiramiz. create_tables eski jadvalga ustun qo'shmaydi.
     """
-    try:
-        cols = [row[1] for row in db.execute_sql("PRAGMA table_info(tests)").fetchall()]
-        if "source" not in cols:
-            db.execute_sql("ALTER TABLE tests ADD COLUMN source VARCHAR(20) DEFAULT 'legacy'")
-    except Exception:
-        pass
+    if "source" not in _columns("tests"):
+        db.execute_sql("ALTER TABLE tests ADD COLUMN source VARCHAR(20) DEFAULT 'legacy'")
+
+
+def _migrate_add_structure_version():
+    """`tests.structure_version` ustunini qo'shish (API tuzilma keshi versiyasi)."""
+    if "structure_version" not in _columns("tests"):
+        db.execute_sql("ALTER TABLE tests ADD COLUMN structure_version INTEGER NOT NULL DEFAULT 1")
 
 
 def _migrate_questions_unique_index():
     """Bir test ichida savol raqami takrorlanmasligini kafolatlash."""
-    try:
+    db.execute_sql(
+        "CREATE UNIQUE INDEX IF NOT EXISTS uniq_question_test_num "
+        "ON questions (test_id, num)"
+    )
+
+
+def _migrate_add_result_bits():
+    """`test_submissions.result_bits` ustunini qo'shish va eski yozuvlarni to'ldirish.
+
+    Bitmap'i yo'q yozuvlar (ustun qo'shilishidan oldingi topshiriqlar) bir marta
+    baholanib yoziladi.
+    """
+    if "result_bits" not in _columns("test_submissions"):
+        db.execute_sql("ALTER TABLE test_submissions ADD COLUMN result_bits BLOB")
+
+    rows = db.execute_sql(
+        "SELECT s.id, s.test_id, s.answers, t.correct_answers "
+        "FROM test_submissions s JOIN tests t ON t.id = s.test_id "
+        "WHERE s.result_bits IS NULL"
+    ).fetchall()
+    if not rows:
+        return
+
+    # utils database'ni import qiladi — aylanma importdan qochish uchun shu yerda
+    from utils import check_answers, pack_results
+    for sub_id, test_id, answers, correct in rows:
+        _, _, results = check_answers(correct, answers, test_id)
         db.execute_sql(
-            "CREATE UNIQUE INDEX IF NOT EXISTS uniq_question_test_num "
-            "ON questions (test_id, num)"
+            "UPDATE test_submissions SET result_bits = ? WHERE id = ?",
+            (pack_results(results), sub_id),
         )
-    except Exception:
-        pass
+    print(f"✅ {len(rows)} ta topshiriq uchun natija bitmap'i to'ldirildi")
+
+
+def _migrate_hot_path_indexes():
+    """Tez-tez bajariladigan so'rovlar uchun indekslar.
+
+    - foydalanuvchi topshiriqlari vaqt bo'yicha (/mystats);
+    - muallif testlari va faol testlar yaratilgan vaqt bo'yicha (/mytests, admin);
+    - testning rasmli savollari (WebApp tuzilmasi);
+    - testni kuzatayotgan adminlar (har topshiriqdagi xabarnoma).
+    Tekshiruv: scripts/check_query_plans.py
+    """
+    for statement in (
+        "CREATE INDEX IF NOT EXISTS idx_submissions_user_submitted "
+        "ON test_submissions (user_id, submitted_at)",
+        "CREATE INDEX IF NOT EXISTS idx_tests_creator_created ON tests (creator_id, created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_tests_active_created ON tests (is_active, created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_questions_test_image ON questions (test_id, has_image)",
+        "CREATE INDEX IF NOT EXISTS idx_watches_test ON admin_test_watches (test_id)",
+    ):
+        db.execute_sql(statement)
+
+
+def _migrate_add_question_counts():
+    """`tests.question_count` va `tests.item_count` ustunlarini qo'shish va to'ldirish."""
+    cols = _columns("tests")
+    for column in ("question_count", "item_count"):
+        if column not in cols:
+            db.execute_sql(f"ALTER TABLE tests ADD COLUMN {column} INTEGER")
+
+    rows = db.execute_sql(
+        "SELECT id, correct_answers FROM tests WHERE question_count IS NULL OR item_count IS NULL"
+    ).fetchall()
+    for test_id, correct in rows:
+        db.execute_sql(
+            "UPDATE tests SET question_count = ?, item_count = ? WHERE id = ?",
+            (*_answer_counts(correct), test_id),
+        )
+    if rows:
+        print(f"✅ {len(rows)} ta test uchun savollar soni to'ldirildi")
+
+
+def _migrate_outbox_index():
+    """Outbox'dan navbatdagi xabarlarni vaqt bo'yicha olish uchun indeks."""
+    db.execute_sql(
+        "CREATE INDEX IF NOT EXISTS idx_outbox_available ON outbox_messages (available_at)"
+    )
+
+
+def _migrate_add_user_blocked():
+    """`users.is_blocked` ustunini qo'shish (broadcast botni bloklaganlarni o'tkazadi)."""
+    if "is_blocked" not in _columns("users"):
+        db.execute_sql("ALTER TABLE users ADD COLUMN is_blocked INTEGER NOT NULL DEFAULT 0")
+
+
+# (versiya, migratsiya) — faqat oxiriga qo'shiladi
+def _migrate_build_question_stats():
+    """`question_stats` hisoblagichlarini mavjud topshiriqlardan to'ldirish.
+
+    Avval faqat jadval yangi yaratilgan ishga tushishda, xatosi yutilgan holda
+    bajarilardi — bir marta yiqilsa hisoblagichlar hech qachon to'lmasdi. Endi
+    oddiy migratsiya: qayta qurish idempotent, xato bo'lsa ishga tushish to'xtaydi.
+    """
+    from services import rebuild_question_stats
+
+    rebuilt = rebuild_question_stats()
+    if rebuilt:
+        logger.info("%s ta test uchun savol statistikasi hisoblandi", rebuilt)
+
+
+MIGRATIONS = [
+    (1, _migrate_unique_submissions),
+    (2, _migrate_add_test_source),
+    (3, _migrate_add_structure_version),
+    (4, _migrate_questions_unique_index),
+    (5, _migrate_add_result_bits),
+    (6, _migrate_hot_path_indexes),
+    (7, _migrate_add_question_counts),
+    (8, _migrate_outbox_index),
+    (9, _migrate_add_user_blocked),
+    (10, _migrate_build_question_stats),
+]
+
+
+def schema_version() -> int:
+    """Bazaga qo'llangan oxirgi migratsiya versiyasi (0 — hali hech biri)."""
+    db.execute_sql("CREATE TABLE IF NOT EXISTS schema_version (version INTEGER NOT NULL)")
+    row = db.execute_sql("SELECT MAX(version) FROM schema_version").fetchone()
+    return row[0] or 0
+
+
+def _apply_migrations():
+    """Qo'llanmagan migratsiyalarni tartib bilan bajarish.
+
+    Biri xato bersa uning tranzaksiyasi bekor qilinadi (versiya oshmaydi) va
+    xato yuqoriga uzatiladi — eski sxema bilan ishga tushmaslik uchun. Tuzatib
+    qayta ishga tushirilganda shu migratsiyadan davom etiladi.
+    """
+    current = schema_version()
+    for version, migration in MIGRATIONS:
+        if version <= current:
+            continue
+        try:
+            with db.atomic():
+                migration()
+                db.execute_sql("INSERT INTO schema_version (version) VALUES (?)", (version,))
+        except Exception:
+            logger.exception("Migratsiya %s (%s) bajarilmadi", version, migration.__name__)
+            raise
+        logger.info("Migratsiya %s qo'llandi: %s", version, migration.__name__)
 
 
 def init_db():
     """Databaseni ishga tushirish"""
     db.connect()
-    db.create_tables([User, Test, TestSubmission, Channel, AdminTestWatch, Question])
-    _migrate_unique_submissions()
-    _migrate_add_test_source()
-    _migrate_questions_unique_index()
+    db.create_tables([
+        User, Test, TestSubmission, Channel, AdminTestWatch, Question, QuestionStat, OutboxMessage,
+        FanoutJob, Broadcast, BroadcastDelivery,
+    ])
+    _apply_migrations()
     print("✅ Database tayyor!")
 
 
-def get_or_create_user(telegram_id: int, username: str = None, full_name: str = ""):
-    """Foydalanuvchini olish yoki yaratish"""
-    user, created = User.get_or_create(
-        telegram_id=telegram_id,
-        defaults={
-            "username": username,
-            "full_name": full_name
+@dataclass
+class WriteQueueStats:
+    """Yozuvchi navbat ko'rsatkichlari (admin /jobs uchun)."""
+    jobs: int = 0
+    errors: int = 0           # ish o'zi xato bergan (masalan, IntegrityError)
+    batches: int = 0
+    failed_batches: int = 0   # COMMIT muvaffaqiyatsiz — batchdagi hamma ish xato
+    max_batch: int = 0
+    total_wait: float = 0.0   # navbatga tushgandan batch boshlanguncha
+    max_wait: float = 0.0
+    total_commit: float = 0.0
+    max_commit: float = 0.0
+
+
+class WriteQueue:
+    """Yozuvlarni bitta tranzaksiyaga yig'ib yozuvchi navbat (group commit).
+
+    SQLite'da bir vaqtda bitta yozuvchi bo'ladi va har autocommit alohida
+    WAL fsync qiladi. Ko'p o'quvchi bir vaqtda topshirganda har yozuvni alohida
+    tranzaksiya qilish o'rniga, oldingi batch yozilayotgan paytda navbatga
+    kelgan ishlar (ixtiyoriy ravishda yana WRITE_BATCH_WINDOW_MS kutib) bitta
+    `db.atomic()` ichida — ko'pi bilan WRITE_BATCH_MAX ta — bajariladi.
+
+    Har ish o'z savepoint'ida — biri IntegrityError (masalan, takroriy
+    topshiriq) bersa faqat o'sha ish bekor bo'ladi, xato esa aynan uning
+    chaqiruvchisiga qaytadi. Yozish alohida bitta thread'da — event loop
+    bloklanmaydi. Navbatda kutish va commit vaqtlari `snapshot()` da.
+
+    Yig'ish faqat bir vaqtda bir nechta yozuv navbatda bo'lganda ishlaydi: botda
+    bu update'lar parallel ishlanishiga bog'liq (bot.PerUserUpdateProcessor,
+    UPDATE_CONCURRENCY=1 da har yozuv alohida batch). Bot va API jarayonlarining
+    navbatlari alohida — ular o'rtasida yig'ish yo'q.
+    """
+
+    # Navbatda bundan uzoq kutgan batch log'ga yoziladi (lock raqobati belgisi)
+    SLOW_WAIT = 1.0
+
+    def __init__(self, max_batch: int = WRITE_BATCH_MAX, window_ms: int = WRITE_BATCH_WINDOW_MS):
+        self.max_batch = max(1, max_batch)
+        self.window = max(0, window_ms) / 1000
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._closed = False
+        self.stats = WriteQueueStats()
+
+    def _ensure_started(self):
+        if self._task is None or self._task.done():
+            self._queue = asyncio.Queue()
+            self._executor = self._executor or ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix="db-writer"
+            )
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def submit(self, fn: Callable, *args, **kwargs):
+        """`fn(*args, **kwargs)` ni navbatdagi tranzaksiyada bajarib natijasini qaytarish.
+
+        Raises:
+            fn ko'targan istisno (masalan, peewee.IntegrityError);
+            RuntimeError — navbat `close()` qilingan bo'lsa
+        """
+        if self._closed:
+            raise RuntimeError("WRITE QUEUE yopilgan — yozuv qabul qilinmaydi")
+        self._ensure_started()
+        future = asyncio.get_running_loop().create_future()
+        job = functools.partial(fn, *args, **kwargs)
+        self._queue.put_nowait((job, future, time.perf_counter()))
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            item = await self._queue.get()
+            if item is None:  # close() belgisi
+                break
+            batch = [item]
+            if self.window:
+                # Qisqa kutish — shu orada kelgan ishlar ham shu tranzaksiyaga qo'shiladi
+                await asyncio.sleep(self.window)
+            while len(batch) < self.max_batch and not self._queue.empty():
+                item = self._queue.get_nowait()
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            started = time.perf_counter()
+            wait = started - min(queued_at for _, _, queued_at in batch)
+            try:
+                outcomes, committed = await loop.run_in_executor(self._executor, self._commit, batch)
+            except Exception as exc:  # executor yopilgan va h.k.
+                outcomes, committed = [(False, exc)] * len(batch), False
+            self._record(batch, outcomes, committed, wait, time.perf_counter() - started)
+
+            for (_, future, _), (ok, value) in zip(batch, outcomes):
+                if future.done():
+                    continue
+                if ok:
+                    future.set_result(value)
+                else:
+                    future.set_exception(value)
+
+        # close() belgisidan keyin tushib qolganlar — hech kim o'qimaydi, kutayotganlar osilib
+        # qolmasligi uchun xato bilan yakunlanadi
+        while not self._queue.empty():
+            item = self._queue.get_nowait()
+            if item is not None and not item[1].done():
+                item[1].set_exception(RuntimeError("WRITE QUEUE yopilgan — yozuv bajarilmadi"))
+
+    def _record(self, batch: list, outcomes: list, committed: bool, wait: float, commit: float):
+        stats = self.stats
+        stats.jobs += len(batch)
+        stats.errors += sum(1 for ok, _ in outcomes if not ok)
+        stats.batches += 1
+        if not committed:
+            stats.failed_batches += 1
+        stats.max_batch = max(stats.max_batch, len(batch))
+        stats.total_wait += wait
+        stats.max_wait = max(stats.max_wait, wait)
+        stats.total_commit += commit
+        stats.max_commit = max(stats.max_commit, commit)
+        if wait > self.SLOW_WAIT:
+            logger.warning(
+                "WRITE QUEUE: batch %.2fs kutdi (%s ta ish, commit %.3fs)", wait, len(batch), commit
+            )
+
+    @staticmethod
+    def _commit(batch: list) -> tuple:
+        """Writer thread'ida: butun batch bitta tranzaksiyada, har ish savepoint'da.
+
+        Returns:
+            ([(ok, natija yoki istisno), ...], commit bo'ldimi)
+        """
+        outcomes = []
+        try:
+            with db.atomic():
+                for job, _, _ in batch:
+                    try:
+                        with db.atomic():
+                            outcomes.append((True, job()))
+                    except Exception as exc:
+                        outcomes.append((False, exc))
+        except Exception as exc:
+            # COMMIT o'zi muvaffaqiyatsiz (masalan, lock) — hech biri yozilmagan
+            logger.exception("WRITE QUEUE: batch commit xatosi (%s ta ish)", len(batch))
+            return [(False, exc)] * len(batch), False
+        return outcomes, True
+
+    def snapshot(self) -> Dict:
+        """Navbat uzunligi va yig'ma ko'rsatkichlar."""
+        return {
+            "pending": self._queue.qsize() if self._queue is not None else 0,
+            "max_batch_size": self.max_batch,
+            "stats": WriteQueueStats(**vars(self.stats)),
         }
-    )
-    # Agar mavjud bo'lsa, ma'lumotlarni yangilash
-    if not created:
-        if username:
-            user.username = username
-        if full_name:
-            user.full_name = full_name
-        user.save()
+
+    async def close(self):
+        """Navbatdagi ishlarni yozib tugatib, writer'ni to'xtatish.
+
+        Shundan keyin `submit()` RuntimeError beradi (jarayon to'xtamoqda).
+        """
+        self._closed = True
+        if self._task is not None and not self._task.done():
+            self._queue.put_nowait(None)
+            await self._task
+        self._task = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+
+# Jarayon bo'yicha yagona yozuvchi navbat: bot handlerlari va API'dagi issiq yozuvlar
+# (topshiriq, test yaratish/yakunlash, rasm biriktirish) shu orqali yoziladi
+write_queue = WriteQueue()
+
+
+# ─────────────────────────── foydalanuvchilar keshi ───────────────────────────
+#
+# get_or_create_user deyarli har buyruqda chaqiriladi. Avval u har safar SELECT
+# va (ism bo'sh bo'lmasa) UPDATE qilardi — har o'zaro ta'sirga bitta yozuv
+# tranzaksiyasi. Endi jarayon ichidagi identity kesh (telegram_id → qator)
+# bilan solishtiriladi: kesh topilsa SELECT ham yo'q, ism/username haqiqatan
+# o'zgargandagina yozuv navbatga qo'yiladi va yig'ilganlari bitta
+# INSERT ... ON CONFLICT DO UPDATE bilan yoziladi (flush_user_changes —
+# user_flush_loop fon vazifasi uni yozuv navbati orqali chaqiradi).
+
+_USER_FIELDS = ("id", "telegram_id", "username", "full_name", "is_admin", "is_blocked", "created_at")
+
+_user_cache: "OrderedDict[int, tuple]" = OrderedDict()  # telegram_id -> (qator, muddati)
+_user_pending: Dict[int, tuple] = {}  # telegram_id -> (username, full_name)
+_user_lock = threading.Lock()
+_user_last_flush = time.monotonic()
+
+
+def _user_from_row(row: dict) -> "User":
+    user = User(**row)
+    user._dirty.clear()  # bazadagi holat — save() chaqirilmasa hech narsa yozilmaydi
     return user
+
+
+def _remember_user(row: dict):
+    if USER_CACHE_SIZE <= 0:
+        return
+    with _user_lock:
+        _user_cache[row["telegram_id"]] = (row, time.monotonic() + USER_CACHE_TTL)
+        _user_cache.move_to_end(row["telegram_id"])
+        while len(_user_cache) > USER_CACHE_SIZE:
+            _user_cache.popitem(last=False)
+
+
+def _cached_user_row(telegram_id: int) -> Optional[dict]:
+    with _user_lock:
+        entry = _user_cache.get(telegram_id)
+        if entry is None:
+            return None
+        row, expires_at = entry
+        if time.monotonic() >= expires_at:
+            del _user_cache[telegram_id]
+            return None
+        _user_cache.move_to_end(telegram_id)
+        return row
+
+
+def forget_user(telegram_id: int):
+    """Keshdagi foydalanuvchini o'chirish (admin huquqi o'zgarganda va h.k.)."""
+    with _user_lock:
+        _user_cache.pop(telegram_id, None)
+
+
+def flush_user_changes() -> int:
+    """Yig'ilgan ism/username o'zgarishlarini bitta upsert bilan yozish.
+
+    Returns:
+        Yozilgan foydalanuvchilar soni
+    """
+    global _user_last_flush
+    with _user_lock:
+        pending = dict(_user_pending)
+        _user_pending.clear()
+        _user_last_flush = time.monotonic()
+    if not pending:
+        return 0
+
+    now = datetime.now()
+    rows = [
+        (telegram_id, username, full_name, False, now)
+        for telegram_id, (username, full_name) in pending.items()
+    ]
+    try:
+        with db.atomic():
+            for i in range(0, len(rows), 500):  # SQLite o'zgaruvchilar chegarasi
+                (User
+                 .insert_many(rows[i:i + 500],
+                              fields=[User.telegram_id, User.username, User.full_name,
+                                      User.is_blocked, User.created_at])
+                 .on_conflict(
+                     conflict_target=[User.telegram_id],
+                     update={User.username: EXCLUDED.username, User.full_name: EXCLUDED.full_name,
+                             User.is_blocked: False},
+                 )
+                 .execute())
+    except Exception:
+        logger.exception("USER CACHE: %s ta o'zgarishni yozib bo'lmadi", len(pending))
+        with _user_lock:
+            for telegram_id, change in pending.items():
+                _user_pending.setdefault(telegram_id, change)
+        return 0
+    return len(pending)
+
+
+def _select_user_row(telegram_id: int) -> Optional[dict]:
+    return (User
+            .select(*[getattr(User, f) for f in _USER_FIELDS])
+            .where(User.telegram_id == telegram_id)
+            .dicts()
+            .first())
+
+
+def _insert_user(telegram_id: int, username: Optional[str], full_name: str) -> dict:
+    """Yangi foydalanuvchini yozish va qatorini qaytarish (yozuv navbatida chaqiriladi)."""
+    # Poyga holatida ikkinchi INSERT xato bermaydi — mavjud qator yangilanadi
+    (User
+     .insert(telegram_id=telegram_id, username=username, full_name=full_name or "",
+             is_blocked=False, created_at=datetime.now())
+     .on_conflict(
+         conflict_target=[User.telegram_id],
+         update={User.username: EXCLUDED.username, User.full_name: EXCLUDED.full_name},
+     )
+     .execute())
+    return _select_user_row(telegram_id)
+
+
+def _user_seen(row: dict, telegram_id: int, username: Optional[str], full_name: str) -> "User":
+    """Kelgan ism/username'ni keshdagi qator bilan solishtirish, o'zgarsa navbatga qo'yish."""
+    new_username = username or row["username"]
+    new_full_name = full_name or row["full_name"]
+    # Botni bloklagan deb belgilangan foydalanuvchi yana yozdi — bayroq ham shu upsert'da tushadi
+    if (new_username, new_full_name) != (row["username"], row["full_name"]) or row["is_blocked"]:
+        row = dict(row, username=new_username, full_name=new_full_name, is_blocked=False)
+        with _user_lock:
+            _user_pending[telegram_id] = (new_username, new_full_name)
+    _remember_user(row)
+    return _user_from_row(row)
+
+
+def get_or_create_user(telegram_id: int, username: str = None, full_name: str = ""):
+    """Foydalanuvchini olish yoki yaratish (sinxron kod uchun — thread pool'dagi endpoint'lar).
+
+    Keshdagi foydalanuvchi uchun bazaga murojaat qilinmaydi. Bo'sh bo'lmagan
+    username/full_name oldingisidan farq qilsagina o'zgarish navbatga qo'yiladi —
+    uni `user_flush_loop` yozadi. Event loop'da `get_or_create_user_async` ishlatiladi.
+    """
+    row = _cached_user_row(telegram_id)
+    if row is None:
+        row = _select_user_row(telegram_id) or _insert_user(telegram_id, username, full_name)
+    return _user_seen(row, telegram_id, username, full_name)
+
+
+async def get_or_create_user_async(telegram_id: int, username: str = None, full_name: str = ""):
+    """`get_or_create_user`ning event loop varianti: yangi foydalanuvchi INSERT'i yozuv navbatida."""
+    row = _cached_user_row(telegram_id)
+    if row is None:
+        row = _select_user_row(telegram_id)
+        if row is None:
+            row = await write_queue.submit(_insert_user, telegram_id, username, full_name)
+    return _user_seen(row, telegram_id, username, full_name)
+
+
+def user_changes_due() -> bool:
+    """Yig'ilgan o'zgarishlarni yozish vaqti keldimi (soni yoki oxirgi yozuvdan o'tgan vaqt)."""
+    with _user_lock:
+        return bool(_user_pending) and (
+            len(_user_pending) >= USER_FLUSH_BATCH
+            or time.monotonic() - _user_last_flush >= USER_FLUSH_INTERVAL
+        )
+
+
+async def user_flush_loop(tick: float = 1.0):
+    """Ism/username o'zgarishlarini vaqti-vaqti bilan yozuv navbati orqali yozish.
+
+    Bot ham, API ham buni fon vazifasi sifatida ishga tushiradi — o'zgarishlar
+    (is_blocked bayrog'ining tushishi ham) xotirada USER_FLUSH_INTERVAL'dan
+    ortiq turib qolmaydi va upsert event loop'ni to'xtatmaydi.
+    """
+    while True:
+        try:
+            await asyncio.sleep(tick)
+            if user_changes_due():
+                await write_queue.submit(flush_user_changes)
+        except asyncio.CancelledError:
+            break
+        except Exception:
+            logger.exception("USER CACHE: o'zgarishlarni yozishda xatolik")
@@ -1,14 +1,13 @@
 """Test natijalarini fayllarga eksport qilish"""
 import os
 import re
-import shutil
-import subprocess
 import tempfile
 from functools import lru_cache
 from html import escape
 from pathlib import Path
 from typing import Dict
 from database import Test
+import soffice_pool
 
 # XML/HTML da ruxsat etilmagan control belgilar (tab/newline'dan tashqari)
 _CONTROL_RE = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f\x7f]")
@@ -193,12 +192,12 @@ def export_to_excel(stats: Dict, test: Test) -> str:
     # Savol statistikasi sahifasi
     if stats.get('question_stats'):
         ws2 = wb.create_sheet("Savollar tahlili")
-        ws2.merge_cells('A1:D1')
+        ws2.merge_cells('A1:E1')
         ws2['A1'] = "📋 Savollar tahlili"
         ws2['A1'].font = title_font
         ws2['A1'].alignment = Alignment(horizontal='center')
 
-        q_headers = ["Savol #", "To'g'ri javoblar", "Foiz (%)", "Qiyinligi"]
+        q_headers = ["Savol #", "To'g'ri javoblar", "Foiz (%)", "Qiyinligi", "Logit ± SE"]
         for col, header in enumerate(q_headers, 1):
             cell = ws2.cell(row=3, column=col, value=header)
             cell.font = header_font
@@ -208,6 +207,7 @@ def export_to_excel(stats: Dict, test: Test) -> str:
 
         rasch_data = stats.get('rasch', {})
         difficulties = rasch_data.get('question_difficulties', [])
+        std_errors = rasch_data.get('question_se', [])
 
         for i, qs in enumerate(stats['question_stats']):
             r = 4 + i
@@ -228,16 +228,21 @@ def export_to_excel(stats: Dict, test: Test) -> str:
                 else:
                     label = "Juda qiyin"
                 ws2.cell(row=r, column=4, value=label).border = thin_border
+                se = std_errors[i] if i < len(std_errors) else None
+                logit = f"{diff:+.2f} ± {se:.2f}" if se is not None else f"{diff:+.2f}"
+                ws2.cell(row=r, column=5, value=logit).border = thin_border
             else:
                 ws2.cell(row=r, column=4, value="-").border = thin_border
+                ws2.cell(row=r, column=5, value="-").border = thin_border
 
-            for c in range(1, 5):
+            for c in range(1, 6):
                 ws2.cell(row=r, column=c).alignment = Alignment(horizontal='center')
 
         ws2.column_dimensions['A'].width = 10
         ws2.column_dimensions['B'].width = 18
         ws2.column_dimensions['C'].width = 12
         ws2.column_dimensions['D'].width = 15
+        ws2.column_dimensions['E'].width = 16
 
     # Faylni saqlash
     filepath = os.path.join(tempfile.gettempdir(), f"test_{test.id}.xlsx")
@@ -504,49 +509,21 @@ def _build_results_html(stats: Dict, test: Test, name_fn) -> str:
     return html
 
 
-def _find_soffice() -> str:
-    """LibreOffice (soffice) binarini topish."""
-    env_path = os.getenv("SOFFICE_PATH")
-    if env_path and os.path.exists(env_path):
-        return env_path
-    for name in ("soffice", "libreoffice"):
-        found = shutil.which(name)
-        if found:
-            return found
-    mac_path = "/Applications/LibreOffice.app/Contents/MacOS/soffice"
-    return mac_path if os.path.exists(mac_path) else None
-
-
 def _html_to_pdf_via_libreoffice(html: str, out_path: str) -> bool:
     """HTML'ni LibreOffice orqali PDF'ga aylantirish (rangli emoji, CJK — asl holicha).
 
+    Konvertatsiya soffice_pool'dagi doimiy worker'larda bajariladi.
     Muvaffaqiyatli bo'lsa True qaytaradi. LibreOffice topilmasa/xato bo'lsa False.
     """
-    soffice = _find_soffice()
-    if not soffice:
-        return False
     with tempfile.TemporaryDirectory() as tmp:
         in_html = os.path.join(tmp, "results.html")
         with open(in_html, "w", encoding="utf-8") as f:
             f.write(html)
-        # Har konversiya uchun alohida profil — bir vaqtdagi ishlovlarda lock bo'lmaydi
-        profile = os.path.join(tmp, "profile")
         try:
-            subprocess.run(
-                [
-                    soffice, "--headless", "--norestore", "--nolockcheck",
-                    f"-env:UserInstallation=file://{profile}",
-                    "--convert-to", "pdf", "--outdir", tmp, in_html,
-                ],
-                capture_output=True, timeout=90,
-            )
-        except Exception:
-            return False
-        produced = os.path.join(tmp, "results.pdf")
-        if not os.path.exists(produced):
+            soffice_pool.convert_to_pdf(in_html, out_path, timeout=90)
+        except soffice_pool.ConversionError:
             return False
-        shutil.copy(produced, out_path)
-        return True
+        return os.path.exists(out_path)
 
 
 def export_to_pdf(stats: Dict, test: Test) -> str:
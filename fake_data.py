@@ -10,6 +10,7 @@ import os
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 from database import *
+from services import record_submission
 
 init_db()
 
@@ -80,25 +81,22 @@ for i, (name, tid) in enumerate(fake_users):
 
     acc = accuracy_levels[i]
     answers = []
+    results = []
     correct_count = 0
 
     for j, c in enumerate(correct):
         if random.random() < acc:
             answers.append(c)
+            results.append(True)
             correct_count += 1
         else:
+            results.append(False)
             wrong = [x for x in options if x != c]
             answers.append(random.choice(wrong))
 
     answer_str = ''.join(answers)
 
-    TestSubmission.create(
-        test=test,
-        user=user,
-        answers=answer_str,
-        correct_count=correct_count,
-        total_count=total_q
-    )
+    record_submission(test, user, answer_str, correct_count, total_q, results)
 
     pct = round(correct_count / total_q * 100, 1)
     print(f"  ✅ {name}: {correct_count}/{total_q} ({pct}%)")
@@ -0,0 +1,402 @@
+"""Test yakunlanganda yakuniy natijalarni barcha ishtirokchilarga yuborish.
+
+Oldin handler har bir ishtirokchiga ketma-ket `send_message` qilar va har
+topshiriq uchun javoblarni qayta tahlil qilardi — katta testda test egasining
+tugmasi daqiqalab "osilib" qolar, bot qayta ishga tushsa yuborish yarim yo'lda
+yo'qolardi. Endi:
+
+- ish `fanout_jobs` jadvaliga yoziladi va fon vazifasida bajariladi;
+- topshiriqlar id tartibida FANOUT_CHUNK tadan o'qiladi, har bo'lak xabarlari
+  bitta o'tishda tayyorlanadi (natija bitmap'lari matritsasidan xato itemlar
+  olinadi, faqat ularning javoblari ko'rsatish uchun o'qiladi). O'qish va
+  tayyorlash thread'da — event loop'da faqat yuborish;
+- xabarlar FANOUT_CONCURRENCY tagacha parallel, outbox bilan umumiy token
+  bucket orqali yuboriladi; `RetryAfter` hammani to'xtatadi, vaqtinchalik xato
+  OUTBOX_MAX_ATTEMPTS gacha qayta urinadi, yopiq chat o'tkazib yuboriladi;
+- har bo'lakdan keyin `cursor` (oxirgi topshiriq id) saqlanadi — restartdan
+  keyin `resume()` shu joydan davom ettiradi. Bo'lak o'rtasida to'xtasa shu
+  bo'lak qayta yuboriladi (kamida bir marta yetkazish);
+- yakunlagan adminga bitta xabar yuboriladi va jarayon davomida yangilanadi;
+- ish xato bilan to'xtasa `failed` deb belgilanadi, admin xabarida sabab va
+  «Qayta urinish» tugmasi chiqadi — `retry()` yoki shu test uchun qayta
+  `start_final_results()` ishni cursor'dan davom ettiradi.
+"""
+import asyncio
+import logging
+import time
+from datetime import datetime
+from html import escape
+from typing import Dict, List, Optional, Tuple
+
+from telegram.error import BadRequest, Forbidden, RetryAfter, TelegramError
+
+from config import FANOUT_CHUNK, FANOUT_CONCURRENCY, OUTBOX_MAX_ATTEMPTS
+from database import FanoutJob, Test, TestSubmission, write_queue
+from keyboards import fanout_retry_keyboard
+from utils import answer_items_display, get_answer_key, result_matrix
+import jobs
+import outbox
+import repository
+
+logger = logging.getLogger(__name__)
+
+# Admin xabari bundan tez-tez yangilanmaydi (soniya)
+_PROGRESS_INTERVAL = 3.0
+
+_ALL_CORRECT = "🎯 <b>Barcha javoblaringiz to'g'ri!</b>"
+
+_tasks: Dict[int, asyncio.Task] = {}
+
+
+# ─────────────────────────── xabar matni ───────────────────────────
+
+def _shorten_value(value: str, limit: int = 90) -> str:
+    text = str(value or "").replace("\n", " ").replace("\r", " ").strip()
+    if not text:
+        return "—"
+    if len(text) <= limit:
+        return text
+    return f"{text[:limit - 3]}..."
+
+
+def _wrong_block(items: List[Tuple[str, str, str]], max_chars: int = 2200) -> str:
+    lines = ["❌ <b>Xato javoblar:</b>"]
+    length = len(lines[0])
+    shown = 0
+    for label, submitted, correct in items:
+        line = (
+            f"{label}. "
+            f"Siz: <code>{escape(_shorten_value(submitted))}</code> | "
+            f"To'g'ri: <code>{escape(_shorten_value(correct))}</code>"
+        )
+        if length + 1 + len(line) > max_chars:
+            break
+        lines.append(line)
+        length += 1 + len(line)
+        shown += 1
+
+    remaining = len(items) - shown
+    if remaining > 0:
+        lines.append(f"... va yana {remaining} ta savolda xato bor.")
+    return "\n".join(lines)
+
+
+def _result_line(test: Test, submission: TestSubmission, rasch: Dict[int, float]) -> str:
+    if test.scoring_mode == "rasch":
+        from export import get_grade
+
+        score = rasch.get(submission.user.telegram_id, float(submission.percentage))
+        rounded_score = round(score, 1)
+        return (
+            f"📐 <b>Natijangiz:</b> {rounded_score} ball\n"
+            f"🏅 <b>Daraja:</b> {get_grade(rounded_score)}"
+        )
+    return (
+        f"✅ <b>Natijangiz:</b> "
+        f"{submission.correct_count}/{submission.total_count} ({submission.percentage}%)"
+    )
+
+
+def render_final_results(test: Test, key, submissions: List[TestSubmission],
+                         rasch: Dict[int, float]) -> List[Tuple[int, str]]:
+    """Bir bo'lak topshiriqlar uchun (chat_id, matn) ro'yxati.
+
+    To'g'ri/xato — bitta matritsadan; javob satri faqat xatosi bor
+    topshiriqlar uchun, faqat xato itemlar ko'rsatilishi uchun o'qiladi.
+    """
+    import numpy as np
+
+    matrix = result_matrix(key, submissions)
+    all_correct = matrix.all(axis=1)
+    messages = []
+    for row, submission in enumerate(submissions):
+        if all_correct[row]:
+            wrong_block = _ALL_CORRECT
+        else:
+            wrong = np.flatnonzero(matrix[row] == 0).tolist()
+            wrong_block = _wrong_block(answer_items_display(key, submission.answers, wrong))
+        text = (
+            "📢 <b>Test yakunlandi!</b>\n\n"
+            f"📝 Test: <code>{test.id}</code>\n"
+            f"{_result_line(test, submission, rasch)}\n\n"
+            f"{wrong_block}"
+        )
+        messages.append((submission.user.telegram_id, text))
+    return messages
+
+
+async def _rasch_by_user(test: Test) -> Dict[int, float]:
+    if test.scoring_mode != "rasch":
+        return {}
+    scores: Dict[int, float] = {}
+    rasch_data = await jobs.rasch_scores(test.id)
+    for row in rasch_data.get("user_scores", []):
+        user_id = row.get("user_id")
+        if user_id is None:
+            continue
+        try:
+            scores[int(user_id)] = float(row.get("rasch_normalized", 0))
+        except (TypeError, ValueError):
+            continue
+    return scores
+
+
+# ─────────────────────────── DB amallari (write_queue'da) ───────────────────────────
+
+def _create_job(test: Test, admin_chat_id: Optional[int], total: int) -> FanoutJob:
+    return FanoutJob.create(test=test, admin_chat_id=admin_chat_id, total=total)
+
+
+def _set_progress_message(job_id: int, message_id: int):
+    FanoutJob.update(progress_message_id=message_id).where(FanoutJob.id == job_id).execute()
+
+
+def _advance(job_id: int, cursor: int, sent: int, failed: int):
+    (FanoutJob
+     .update(cursor=cursor, sent=FanoutJob.sent + sent, failed=FanoutJob.failed + failed)
+     .where(FanoutJob.id == job_id)
+     .execute())
+
+
+def _finish(job_id: int):
+    (FanoutJob
+     .update(status="done", finished_at=datetime.now())
+     .where(FanoutJob.id == job_id)
+     .execute())
+
+
+def _fail(job_id: int):
+    (FanoutJob
+     .update(status="failed", finished_at=datetime.now())
+     .where(FanoutJob.id == job_id)
+     .execute())
+
+
+def _reopen(job_id: int) -> bool:
+    """To'xtagan ishni qayta `running` qilish (faqat `failed` bo'lsa)."""
+    return bool(FanoutJob
+                .update(status="running", finished_at=None)
+                .where((FanoutJob.id == job_id) & (FanoutJob.status == "failed"))
+                .execute())
+
+
+# ─────────────────────────── yuborish ───────────────────────────
+
+async def _send(bot, chat_id: int, text: str, limit: asyncio.Semaphore) -> bool:
+    """Bitta xabar; yetkazilsa True. Qayta urinishlar shu yerda."""
+    bucket = outbox.rate_limiter()
+    attempt = 0
+    async with limit:
+        while True:
+            await bucket.acquire()
+            try:
+                await bot.send_message(chat_id=chat_id, text=text, parse_mode="HTML")
+                return True
+            except RetryAfter as exc:
+                seconds = outbox.retry_after_seconds(exc)
+                logger.warning("Fanout: RetryAfter %.0fs (chat=%s)", seconds, chat_id)
+                bucket.pause(seconds)
+            except (Forbidden, BadRequest) as exc:
+                logger.info("Fanout: yuborilmadi (chat=%s): %s", chat_id, exc)
+                return False
+            except TelegramError as exc:
+                attempt += 1
+                if attempt >= OUTBOX_MAX_ATTEMPTS:
+                    logger.warning("Fanout: %s urinishdan keyin tashlandi (chat=%s): %s",
+                                   attempt, chat_id, exc)
+                    return False
+                logger.warning("Fanout: qayta urinish %s (chat=%s): %s", attempt, chat_id, exc)
+                await asyncio.sleep(2 ** attempt)
+
+
+def _progress_text(job: FanoutJob, test_id: int, sent: int, failed: int, done: bool) -> str:
+    title = "✅ <b>Natijalar yuborildi</b>" if done else "📤 <b>Natijalar yuborilmoqda...</b>"
+    text = (
+        f"{title}\n\n"
+        f"📝 Test: <code>{test_id}</code>\n"
+        f"👥 Yuborildi: {sent}/{job.total}"
+    )
+    if failed:
+        text += f"\n⚠️ Yetkazilmadi: {failed}"
+    return text
+
+
+async def _report_failure(bot, job_id: int):
+    """Ish to'xtaganini adminga bildirish (jarayon xabari o'rniga yoki yangi xabar)."""
+    job = FanoutJob.get_by_id(job_id)
+    if not job.admin_chat_id:
+        return
+    text = (
+        "⚠️ <b>Natijalarni yuborish xatolik bilan to'xtadi</b>\n\n"
+        f"📝 Test: <code>{job.test_id}</code>\n"
+        f"👥 Yuborildi: {job.sent}/{job.total}\n\n"
+        "Qayta urinilsa yuborish to'xtagan joyidan davom etadi."
+    )
+    markup = fanout_retry_keyboard(job.id)
+    try:
+        if job.progress_message_id:
+            await bot.edit_message_text(
+                chat_id=job.admin_chat_id, message_id=job.progress_message_id,
+                text=text, parse_mode="HTML", reply_markup=markup,
+            )
+        else:
+            await bot.send_message(
+                chat_id=job.admin_chat_id, text=text, parse_mode="HTML", reply_markup=markup,
+            )
+    except TelegramError as exc:
+        logger.info("Fanout: xatolik haqida xabar yuborilmadi (chat=%s): %s", job.admin_chat_id, exc)
+
+
+async def _report(bot, job: FanoutJob, test_id: int, sent: int, failed: int, done: bool):
+    if not (job.admin_chat_id and job.progress_message_id):
+        return
+    try:
+        await bot.edit_message_text(
+            chat_id=job.admin_chat_id,
+            message_id=job.progress_message_id,
+            text=_progress_text(job, test_id, sent, failed, done),
+            parse_mode="HTML",
+        )
+    except TelegramError as exc:
+        logger.debug("Fanout: jarayon xabari yangilanmadi: %s", exc)
+
+
+def _load(job_id: int) -> tuple:
+    job = FanoutJob.get_by_id(job_id)
+    test = Test.get_by_id(job.test_id)
+    return job, test, get_answer_key(test.correct_answers, test.id)
+
+
+def _next_chunk(test: Test, key, cursor: int, rasch: Dict[int, float]):
+    """Keyingi bo'lak: (oxirgi topshiriq id, [(chat_id, matn)]) yoki None.
+
+    O'qish va matnlarni tayyorlash thread'da — event loop'da faqat yuborish qoladi.
+    """
+    chunk = repository.test_submissions_after(test, cursor, FANOUT_CHUNK)
+    if not chunk:
+        return None
+    return chunk[-1].id, render_final_results(test, key, chunk, rasch)
+
+
+async def _run(bot, job_id: int):
+    job, test, key = await asyncio.to_thread(_load, job_id)
+    rasch = await _rasch_by_user(test)
+    limit = asyncio.Semaphore(FANOUT_CONCURRENCY)
+
+    cursor, sent, failed = job.cursor, job.sent, job.failed
+    reported_at = time.monotonic()
+    if cursor:
+        logger.info("Fanout #%s davom etmoqda: test=%s, cursor=%s", job.id, test.id, cursor)
+    while True:
+        chunk = await asyncio.to_thread(_next_chunk, test, key, cursor, rasch)
+        if chunk is None:
+            break
+        cursor, messages = chunk
+        delivered = await asyncio.gather(*(
+            _send(bot, chat_id, text, limit) for chat_id, text in messages
+        ))
+        ok = sum(delivered)
+        sent += ok
+        failed += len(delivered) - ok
+        await write_queue.submit(_advance, job.id, cursor, ok, len(delivered) - ok)
+
+        if time.monotonic() - reported_at >= _PROGRESS_INTERVAL:
+            reported_at = time.monotonic()
+            await _report(bot, job, test.id, sent, failed, done=False)
+
+    await write_queue.submit(_finish, job.id)
+    logger.info("Fanout #%s tugadi: test=%s, yuborildi=%s, yetkazilmadi=%s",
+                job.id, test.id, sent, failed)
+    await _report(bot, job, test.id, sent, failed, done=True)
+
+
+def _spawn(bot, job_id: int):
+    async def runner():
+        try:
+            await _run(bot, job_id)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Fanout #%s xatolik bilan to'xtadi", job_id)
+            # `running` bo'lib qolsa resume() uni har restartda qayta ishga tushiradi,
+            # start_final_results esa yangisini ochmaydi — shuning uchun `failed`
+            try:
+                await write_queue.submit(_fail, job_id)
+                await _report_failure(bot, job_id)
+            except Exception:
+                logger.exception("Fanout #%s: xatolik holatini saqlab bo'lmadi", job_id)
+        finally:
+            _tasks.pop(job_id, None)
+
+    _tasks[job_id] = asyncio.create_task(runner())
+
+
+# ─────────────────────────── umumiy API ───────────────────────────
+
+async def start_final_results(bot, test: Test, admin_chat_id: Optional[int] = None):
+    """Yakuniy natijalarni yuborishni fon vazifasi sifatida boshlash.
+
+    Shu test uchun yuborish allaqachon ketayotgan bo'lsa yangisi ochilmaydi;
+    xatolik bilan to'xtagani bo'lsa o'sha ish cursor'dan davom ettiriladi
+    (yuborilganlarga qayta yuborilmaydi).
+    """
+    previous = (FanoutJob.select(FanoutJob.id, FanoutJob.status)
+                .where((FanoutJob.test == test) & (FanoutJob.status.in_(("running", "failed"))))
+                .order_by(FanoutJob.id.desc())
+                .first())
+    if previous is not None:
+        if previous.status == "failed":
+            await retry(bot, previous.id)
+        return
+    total = TestSubmission.select().where(TestSubmission.test == test).count()
+    if not total:
+        return
+
+    job = await write_queue.submit(_create_job, test, admin_chat_id, total)
+    if admin_chat_id:
+        try:
+            message = await bot.send_message(
+                chat_id=admin_chat_id,
+                text=_progress_text(job, test.id, 0, 0, done=False),
+                parse_mode="HTML",
+            )
+            job.progress_message_id = message.message_id
+            await write_queue.submit(_set_progress_message, job.id, message.message_id)
+        except TelegramError as exc:
+            logger.info("Fanout: jarayon xabari yuborilmadi (chat=%s): %s", admin_chat_id, exc)
+    _spawn(bot, job.id)
+
+
+async def retry(bot, job_id: int) -> bool:
+    """Xatolik bilan to'xtagan ishni cursor'dan qayta boshlash.
+
+    Returns:
+        True — ish qayta ishga tushdi; False — u `failed` emas (ketmoqda/tugagan)
+    """
+    if job_id in _tasks or not await write_queue.submit(_reopen, job_id):
+        return False
+    logger.info("Fanout #%s qayta ishga tushirildi", job_id)
+    _spawn(bot, job_id)
+    return True
+
+
+def resume(bot) -> int:
+    """Tugallanmay qolgan ishlarni davom ettirish (bot ishga tushganda)."""
+    pending = [job.id for job in FanoutJob.select(FanoutJob.id).where(FanoutJob.status == "running")]
+    for job_id in pending:
+        if job_id not in _tasks:
+            _spawn(bot, job_id)
+    return len(pending)
+
+
+def snapshot() -> Dict[str, int]:
+    """Hozir ketayotgan yuborishlar soni (admin /jobs uchun)."""
+    return {"running": len(_tasks)}
+
+
+async def shutdown():
+    """Vazifalarni to'xtatish — cursor'dan keyingisi keyingi ishga tushishda yuboriladi."""
+    tasks = list(_tasks.values())
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
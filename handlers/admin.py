@@ -11,10 +11,19 @@ from telegram.ext import (
 )
 from telegram.error import TelegramError
 
-from database import User, Test, TestSubmission, Channel, AdminTestWatch, init_db
-from config import ADMIN_ID
+from database import User, Test, TestSubmission, Channel, AdminTestWatch, init_db, write_queue, forget_user
+from config import ADMIN_ID, SHARED_CACHE_ADMIN_TTL
 from backup import send_backup, restore_backup_file
-from utils import get_question_stats, format_stats, format_stats_simple, format_answer_key
+from utils import format_stats, format_stats_simple, format_answer_key
+import broadcast
+import jobs
+import fanout
+import membership
+import outbox
+import repository
+import result_cache
+import services
+import shared_cache
 
 # Conversation states
 WAITING_CHANNEL_ID = 0
@@ -26,24 +35,51 @@ WAITING_RESTORE_FILE = 5       # zaxirani tiklash — .db faylni kutish
 WAITING_RESTORE_CONFIRM = 6    # zaxirani tiklash — tasdiqlash
 
 
+def _load_admin_flag(user_id: int) -> bool:
+    user = User.get_or_none(User.telegram_id == user_id)
+    return bool(user and user.is_admin)
+
+
 def is_admin(user_id: int) -> bool:
-    """Foydalanuvchi admin ekanligini tekshirish"""
+    """Foydalanuvchi admin ekanligini tekshirish (sinxron — main_menu_keyboard va h.k.).
+
+    Odatda `warm_admin_flag` oldindan to'ldirgan xotiradagi nusxadan javob beradi.
+    """
     # .env dan asosiy admin
     if user_id == ADMIN_ID:
         return True
-    # Database'dan qo'shimcha adminlar
-    try:
-        user = User.get(User.telegram_id == user_id)
-        return user.is_admin
-    except User.DoesNotExist:
-        return False
+    entry = shared_cache.peek_entry("admin", user_id)
+    if entry is not None:
+        return entry[0]
+    # Database'dan qo'shimcha adminlar (bot va API uchun umumiy keshda)
+    return shared_cache.cached("admin", user_id, SHARED_CACHE_ADMIN_TTL,
+                               lambda: _load_admin_flag(user_id))
+
+
+async def is_admin_async(user_id: int) -> bool:
+    """`is_admin` event loop uchun: keshdan yoki fayl/baza — thread'da."""
+    if user_id == ADMIN_ID:
+        return True
+    return await shared_cache.cached_async("admin", user_id, SHARED_CACHE_ADMIN_TTL,
+                                           lambda: _load_admin_flag(user_id))
+
+
+async def warm_admin_flag(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Har update oldidan (group -1) admin bayrog'ini thread'da keshga olish.
+
+    Shundan keyin handlerlardagi sinxron `is_admin` (masalan, main_menu_keyboard)
+    xotiradan javob beradi — event loop'da SQLite kutilmaydi.
+    """
+    user = update.effective_user if isinstance(update, Update) else None
+    if user is not None:
+        await is_admin_async(user.id)
 
 
 def admin_only(func):
     """Admin tekshirish decorator"""
     async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE):
         user_id = update.effective_user.id
-        if not is_admin(user_id):
+        if not await is_admin_async(user_id):
             if update.callback_query:
                 await update.callback_query.answer("❌ Bu faqat admin uchun!", show_alert=True)
             else:
@@ -143,6 +179,59 @@ async def admin_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.message.reply_html(_admin_panel_text(), reply_markup=admin_keyboard())
 
 
+@admin_only
+async def jobs_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/jobs — og'ir ishlar executori holati: navbat va ish turlari bo'yicha vaqtlar."""
+    snap = jobs.snapshot()
+    lines = [
+        "⚙️ <b>Fon ishlari</b>",
+        "",
+        f"⏳ Navbatda/bajarilmoqda: {snap['pending']} / {snap['running']} "
+        f"(chegara: {snap['queue_limit']})",
+        f"🧵 Thread: {snap['thread_workers']} · 🧮 Process: {snap['process_workers']}",
+    ]
+    cache_files, cache_bytes = result_cache.usage()
+    lines.append(f"🗄 Natijalar keshi: {cache_files} ta fayl, {cache_bytes / 1024 / 1024:.1f} MB")
+    wq = write_queue.snapshot()
+    ws = wq["stats"]
+    if ws.batches:
+        lines.append(
+            f"✍️ Yozuv navbati: {wq['pending']} kutmoqda · {ws.jobs} ish / {ws.batches} batch "
+            f"(o'rtacha {ws.jobs / ws.batches:.1f}, maks {ws.max_batch}/{wq['max_batch_size']})"
+        )
+        lines.append(
+            f"   kutish {ws.total_wait / ws.batches * 1000:.1f} / {ws.max_wait * 1000:.1f} ms · "
+            f"commit {ws.total_commit / ws.batches * 1000:.1f} / {ws.max_commit * 1000:.1f} ms · "
+            f"xato {ws.errors} · yiqilgan batch {ws.failed_batches}"
+        )
+    else:
+        lines.append(f"✍️ Yozuv navbati: {wq['pending']} kutmoqda, hali batch yo'q")
+    ob = outbox.snapshot()
+    lines.append(
+        f"📨 Outbox: {ob['pending']} kutmoqda · yuborildi {ob['sent']} "
+        f"(+{ob['coalesced']} xulosada) · qayta {ob['retried']} · tashlandi {ob['dropped']} · "
+        f"RetryAfter {ob['retry_after']}"
+    )
+    lines.append(f"📤 Yakuniy natijalar yuborilmoqda: {fanout.snapshot()['running']} ta test")
+    bc = broadcast.snapshot()
+    if bc["running"]:
+        lines.append(
+            f"📣 Broadcast: {bc['running']} ta · {bc['rate']:.0f} xabar/s · RetryAfter {bc['retry_after']}"
+        )
+    if snap["kinds"]:
+        lines += ["", "<b>Tur · soni · o'rtacha / maks · kutish · xato · dedup</b>"]
+        for kind, s in sorted(snap["kinds"].items()):
+            avg_run = s.total_run / s.count if s.count else 0.0
+            avg_wait = s.total_wait / s.count if s.count else 0.0
+            lines.append(
+                f"• <code>{escape(kind)}</code>: {s.count} · {avg_run:.2f}s / {s.max_run:.2f}s · "
+                f"{avg_wait:.2f}s · {s.errors} · {s.deduped}"
+            )
+    else:
+        lines += ["", "Hali fon ishi bajarilmagan."]
+    await update.message.reply_html("\n".join(lines))
+
+
 @admin_only
 async def admin_back_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Admin panelga qaytish"""
@@ -237,6 +326,7 @@ async def receive_channel_id(update: Update, context: ContextTypes.DEFAULT_TYPE)
                 existing.title = chat.title
                 existing.username = chat.username
                 existing.save()
+                membership.invalidate_channels()
 
                 await update.message.reply_html(
                     f"✅ <b>Kanal qayta faollashtirildi!</b>\n\n"
@@ -252,6 +342,7 @@ async def receive_channel_id(update: Update, context: ContextTypes.DEFAULT_TYPE)
             title=chat.title,
             is_active=True
         )
+        membership.invalidate_channels()
 
         await update.message.reply_html(
             f"✅ <b>Kanal qo'shildi!</b>\n\n"
@@ -327,6 +418,7 @@ async def delete_channel_callback(update: Update, context: ContextTypes.DEFAULT_
         channel = Channel.get_by_id(channel_id)
         channel.is_active = False
         channel.save()
+        membership.invalidate_channels()
 
         await query.answer(f"✅ {channel.title} o'chirildi!", show_alert=True)
     except (ValueError, Channel.DoesNotExist):
@@ -395,7 +487,7 @@ async def admin_active_tests_callback(update: Update, context: ContextTypes.DEFA
         await query.answer("❌ Admin topilmadi!", show_alert=True)
         return
 
-    active_tests = list(Test.select().where(Test.is_active == True).order_by(Test.created_at.desc()))
+    active_tests = repository.active_tests_with_creator()
 
     if not active_tests:
         await query.message.edit_text(
@@ -518,7 +610,6 @@ async def admin_end_test_callback(update: Update, context: ContextTypes.DEFAULT_
 @admin_only
 async def admin_confirm_end_test_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Test tugatishni tasdiqlash"""
-    from datetime import datetime
     query = update.callback_query
 
     test_id_str = query.data.replace("admin_confirm_end_", "")
@@ -529,9 +620,7 @@ async def admin_confirm_end_test_callback(update: Update, context: ContextTypes.
         await query.answer("❌ Test topilmadi!", show_alert=True)
         return
 
-    test.is_active = False
-    test.ended_at = datetime.now()
-    test.save()
+    await write_queue.submit(services.end_test, test)
 
     # Kuzatuvchilarni ham o'chirish (test tugadi)
     AdminTestWatch.delete().where(AdminTestWatch.test == test).execute()
@@ -539,8 +628,7 @@ async def admin_confirm_end_test_callback(update: Update, context: ContextTypes.
     await query.answer(f"✅ #{test_id} test tugatildi!", show_alert=True)
 
     # Ishtirokchilarga yakuniy natijalarni yuborish (creator yakunlagandagi kabi)
-    from handlers.test_manage import _notify_participants_final_results
-    await _notify_participants_final_results(context, test)
+    await fanout.start_final_results(context.bot, test, update.effective_user.id)
 
     # Test egasiga xabar (admin tugatgani haqida)
     if test.creator.telegram_id != update.effective_user.id:
@@ -856,50 +944,6 @@ async def broadcast_receive_message(update: Update, context: ContextTypes.DEFAUL
     return WAITING_BROADCAST_CONFIRM
 
 
-async def _run_broadcast(bot, from_chat_id: int, message_id: int, status_message):
-    """Xabarni barcha foydalanuvchilarga ORQA FONDA yuboradi.
-
-    Bu korutina alohida vazifa (task) sifatida ishga tushiriladi — shuning uchun
-    yuborish minutlab cho'zilsa ham botning asosiy update oqimini bloklamaydi,
-    bot boshqa foydalanuvchilarga javob berishda davom etadi. Jarayon davomida
-    `status_message` (tasdiq xabari) progress bilan yangilanadi.
-    """
-    users = list(User.select())
-    total = len(users)
-
-    sent = 0
-    failed = 0
-    for user in users:
-        try:
-            await bot.copy_message(
-                chat_id=user.telegram_id,
-                from_chat_id=from_chat_id,
-                message_id=message_id,
-            )
-            sent += 1
-        except Exception:
-            failed += 1
-
-        # Telegram flood limitiga (~30 msg/sek) tushmaslik uchun
-        await asyncio.sleep(0.05)
-
-        if (sent + failed) % 25 == 0:
-            try:
-                await status_message.edit_text(f"📤 Xabar yuborilmoqda... {sent + failed}/{total}")
-            except Exception:
-                pass
-
-    try:
-        await status_message.edit_text(
-            f"✅ <b>Xabar yuborildi!</b>\n\n"
-            f"📤 Yuborildi: {sent} ta\n"
-            f"❌ Yetib bormadi: {failed} ta",
-            parse_mode="HTML",
-        )
-    except Exception:
-        pass
-
-
 @admin_only
 async def broadcast_confirm_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Tasdiq — yuborishni orqa fon vazifasi sifatida boshlash (botni bloklamaydi)."""
@@ -915,21 +959,35 @@ async def broadcast_confirm_callback(update: Update, context: ContextTypes.DEFAU
         await query.message.edit_text("❌ Sessiya muddati tugadi. Qaytadan boshlang.")
         return ConversationHandler.END
 
-    total = User.select().count()
+    total = User.select().where(User.is_blocked == False).count()  # noqa: E712
     try:
         await query.message.edit_text(f"📤 Xabar yuborish boshlandi (orqa fonda)... 0/{total}")
     except Exception:
         pass
 
-    # Yuborish sikli alohida task'da ishlaydi: handler darrov tugaydi, bot
-    # boshqa so'rovlarga javob berishda davom etadi. Task application tomonidan
-    # kuzatiladi (yo'qolib ketmaydi, to'xtaganda kutiladi).
-    context.application.create_task(
-        _run_broadcast(context.bot, from_chat_id, message_id, query.message)
+    # Yuborish broadcast.py fon vazifasida: handler darrov tugaydi, jarayon
+    # bazada saqlanadi va bot qayta ishga tushsa davom etadi.
+    await broadcast.start(
+        context.bot, from_chat_id, message_id,
+        admin_chat_id=query.message.chat_id,
+        status_message_id=query.message.message_id,
     )
     return ConversationHandler.END
 
 
+@admin_only
+async def broadcast_retry_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Xatolik bilan to'xtagan broadcast'ni saqlangan joyidan davom ettirish"""
+    query = update.callback_query
+    broadcast_id = int(query.data.replace("broadcast_retry_", ""))
+
+    if await broadcast.retry(context.bot, broadcast_id):
+        await query.answer("🔁 Yuborish davom ettirilmoqda")
+        await query.message.edit_text("📤 Xabar yuborilmoqda (orqa fonda)...")
+    else:
+        await query.answer("ℹ️ Bu yuborish allaqachon davom etmoqda yoki tugagan.", show_alert=True)
+
+
 async def broadcast_cancel_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Tasdiq bosqichida bekor qilish (tugma) — darrov admin panelga qaytadi."""
     query = update.callback_query
@@ -1031,6 +1089,8 @@ async def receive_admin_id(update: Update, context: ContextTypes.DEFAULT_TYPE):
         # Admin qilish
         user.is_admin = True
         user.save()
+        forget_user(user.telegram_id)
+        await asyncio.to_thread(shared_cache.delete, "admin", user.telegram_id)
 
         await update.message.reply_html(
             f"✅ <b>Admin qo'shildi!</b>\n\n"
@@ -1119,6 +1179,8 @@ async def delete_admin_callback(update: Update, context: ContextTypes.DEFAULT_TY
         admin = User.get_by_id(admin_db_id)
         admin.is_admin = False
         admin.save()
+        forget_user(admin.telegram_id)
+        await asyncio.to_thread(shared_cache.delete, "admin", admin.telegram_id)
 
         await query.answer(f"✅ {admin.full_name or 'Admin'} o'chirildi!", show_alert=True)
 
@@ -1206,7 +1268,7 @@ async def _send_test_result(message, code: str) -> bool:
     )
 
     # To'g'ri javoblar kaliti — admin qidiruvida har doim ko'rsatiladi
-    answer_key = format_answer_key(test.correct_answers)
+    answer_key = format_answer_key(test.correct_answers, test_id=test.id)
     answer_block = f"\n\n🔑 <b>To'g'ri javoblar:</b>\n{answer_key}" if answer_key else ""
 
     if test.is_active:
@@ -1227,7 +1289,7 @@ async def _send_test_result(message, code: str) -> bool:
         ])
     else:
         # Yakunlangan test — to'liq statistika
-        stats = get_question_stats(test)
+        stats = await jobs.question_stats(test.id, include_submissions=False)
         if test.scoring_mode == 'rasch':
             text = format_stats(stats, test)
         else:
@@ -1403,6 +1465,7 @@ def get_handlers():
             admin_command,
         ),
         CommandHandler("whois", whois_command, filters=filters.ChatType.PRIVATE),
+        CommandHandler("jobs", jobs_command, filters=filters.ChatType.PRIVATE),
         add_channel_conv,
         add_admin_conv,
         broadcast_conv,
@@ -1422,5 +1485,6 @@ def get_handlers():
         CallbackQueryHandler(admin_watch_toggle_callback, pattern=r"^watch_test_"),
         CallbackQueryHandler(admin_end_test_callback, pattern=r"^admin_end_"),
         CallbackQueryHandler(admin_confirm_end_test_callback, pattern=r"^admin_confirm_end_"),
+        CallbackQueryHandler(broadcast_retry_callback, pattern=r"^broadcast_retry_\d+$"),
     ]
 
@@ -3,7 +3,7 @@ from html import escape
 from telegram import Update
 from telegram.ext import ContextTypes, CommandHandler, MessageHandler, filters
 
-from database import get_or_create_user
+from database import forget_user, get_or_create_user_async, write_queue
 from config import ADMIN_ID
 from keyboards import main_menu_keyboard
 from membership import membership_required
@@ -38,16 +38,17 @@ async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
 
     # Foydalanuvchini databasega saqlash
-    db_user = get_or_create_user(
+    db_user = await get_or_create_user_async(
         telegram_id=user.id,
         username=user.username,
         full_name=user.full_name or user.first_name
     )
 
     # Admin tekshirish
-    if user.id == ADMIN_ID:
+    if user.id == ADMIN_ID and not db_user.is_admin:
         db_user.is_admin = True
-        db_user.save()
+        await write_queue.submit(db_user.save)
+        forget_user(user.id)
 
     # Agar botga test kodi bilan kirishsa (Deep link: t.me/bot?start=123)
     if context.args and context.args[0].isdigit():
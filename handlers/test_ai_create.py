@@ -28,7 +28,7 @@ from telegram.ext import (
 )
 
 from config import ADMIN_ID, WEBAPP_URL, WEBAPP_VERSION
-from database import get_or_create_user, Test, Question
+from database import get_or_create_user_async, write_queue, Test
 from keyboards import main_menu_keyboard, test_created_keyboard
 from membership import membership_required
 from ai_extract import get_default_extractor, ExtractionError, DOCX_MIME
@@ -105,8 +105,8 @@ def _ai_keyboard() -> ReplyKeyboardMarkup:
 async def file_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """'📸 Fayldan test' — fayl kutish holatini boshlash."""
     # Hozircha bu funksiya faqat adminlar uchun
-    from handlers.admin import is_admin
-    if not is_admin(update.effective_user.id):
+    from handlers.admin import is_admin_async
+    if not await is_admin_async(update.effective_user.id):
         await update.message.reply_text(
             "🔒 Bu funksiya hozircha faqat adminlar uchun.",
             reply_markup=main_menu_keyboard(update.effective_user.id),
@@ -340,14 +340,14 @@ async def _finalize_creation(context: ContextTypes.DEFAULT_TYPE, chat_id: int, u
     for q in questions:
         q["has_image"] = bool(q.get("image_file_id"))
 
-    db_user = get_or_create_user(
+    db_user = await get_or_create_user_async(
         telegram_id=user.id,
         username=user.username,
         full_name=user.full_name or user.first_name,
     )
     try:
-        test = services.create_rich_test(
-            db_user, questions, scoring_mode="simple", source="file"
+        test = await write_queue.submit(
+            services.create_rich_test, db_user, questions, scoring_mode="simple", source="file"
         )
     except Exception as e:
         logger.exception("AI CREATE: test yaratishda xatolik")
@@ -919,11 +919,7 @@ async def image_receive_photo(update: Update, context: ContextTypes.DEFAULT_TYPE
         return
 
     file_id = update.message.photo[-1].file_id
-    q = Question.get_or_none((Question.test == test) & (Question.num == num))
-    if q:
-        q.image_file_id = file_id
-        q.has_image = True
-        q.save()
+    await write_queue.submit(services.set_question_image, test, num, file_id)
 
     context.user_data.pop("img_num", None)
 
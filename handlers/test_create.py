@@ -8,7 +8,7 @@ from telegram.ext import (
     MessageHandler, ConversationHandler, CallbackQueryHandler, filters
 )
 
-from database import get_or_create_user, Test
+from database import get_or_create_user_async, write_queue, Test
 from config import ADMIN_ID, WEBAPP_URL, WEBAPP_VERSION
 from keyboards import test_created_keyboard, main_menu_keyboard
 from membership import membership_required
@@ -164,7 +164,7 @@ async def receive_answers(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return WAITING_ANSWERS
 
     user = update.effective_user
-    db_user = get_or_create_user(
+    db_user = await get_or_create_user_async(
         telegram_id=user.id,
         username=user.username,
         full_name=user.full_name or user.first_name
@@ -175,7 +175,8 @@ async def receive_answers(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     # Testni saqlash
     try:
-        test = Test.create(
+        test = await write_queue.submit(
+            Test.create,
             correct_answers=answers,
             creator=db_user,
             is_active=True,
@@ -310,13 +311,14 @@ async def webapp_create_handler(update: Update, context: ContextTypes.DEFAULT_TY
             questions_count = len(answers_str)
 
         user = update.effective_user
-        db_user = get_or_create_user(
+        db_user = await get_or_create_user_async(
             telegram_id=user.id,
             username=user.username,
             full_name=user.full_name or user.first_name
         )
 
-        test = Test.create(
+        test = await write_queue.submit(
+            Test.create,
             correct_answers=answers_str,
             creator=db_user,
             is_active=True,
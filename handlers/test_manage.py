@@ -1,18 +1,16 @@
 """Test boshqarish handlerlari"""
-from datetime import datetime
 from html import escape
 from telegram import Update
 from telegram.ext import ContextTypes, CommandHandler, CallbackQueryHandler, filters
-
-from database import get_or_create_user, Test, TestSubmission
-from utils import (
-    get_question_stats,
-    format_stats,
-    format_stats_simple,
-    calculate_rasch_scores,
-    get_answer_review,
-)
-from export import export_to_excel, export_to_pdf, export_chart, get_grade
+from telegram.error import TelegramError
+
+from database import get_or_create_user_async, write_queue, FanoutJob, Test, TestSubmission
+from utils import format_stats, format_stats_simple
+import fanout
+import jobs
+import repository
+import result_cache
+import services
 from config import ADMIN_ID
 from keyboards import (
     main_menu_keyboard, my_tests_keyboard, test_detail_keyboard,
@@ -21,100 +19,6 @@ from keyboards import (
 from membership import membership_required
 
 
-def _shorten_value(value: str, limit: int = 90) -> str:
-    text = str(value or "").replace("\n", " ").replace("\r", " ").strip()
-    if not text:
-        return "—"
-    if len(text) <= limit:
-        return text
-    return f"{text[:limit - 3]}..."
-
-
-def _build_incorrect_answers_text(test: Test, submitted_answers: str, max_chars: int = 2200) -> str:
-    review = get_answer_review(test.correct_answers, submitted_answers)
-    wrong_answers = [item for item in review if not item.get("is_correct")]
-
-    if not wrong_answers:
-        return "🎯 <b>Barcha javoblaringiz to'g'ri!</b>"
-
-    lines = ["❌ <b>Xato javoblar:</b>"]
-    shown = 0
-
-    for item in wrong_answers:
-        submitted = escape(_shorten_value(item.get("submitted_display", "")))
-        correct = escape(_shorten_value(item.get("correct_display", "")))
-        line = (
-            f"{item.get('index')}. "
-            f"Siz: <code>{submitted}</code> | "
-            f"To'g'ri: <code>{correct}</code>"
-        )
-
-        projected = "\n".join(lines + [line])
-        if len(projected) > max_chars:
-            break
-
-        lines.append(line)
-        shown += 1
-
-    remaining = len(wrong_answers) - shown
-    if remaining > 0:
-        lines.append(f"... va yana {remaining} ta savolda xato bor.")
-
-    return "\n".join(lines)
-
-
-async def _notify_participants_final_results(context: ContextTypes.DEFAULT_TYPE, test: Test):
-    submissions = list(TestSubmission.select().where(TestSubmission.test == test))
-    if not submissions:
-        return
-
-    rasch_scores_by_user: dict[int, float] = {}
-    if test.scoring_mode == "rasch":
-        rasch_data = calculate_rasch_scores(test, submissions)
-        for row in rasch_data.get("user_scores", []):
-            user_id = row.get("user_id")
-            if user_id is None:
-                continue
-            try:
-                rasch_scores_by_user[int(user_id)] = float(row.get("rasch_normalized", 0))
-            except (TypeError, ValueError):
-                continue
-
-    for submission in submissions:
-        user_id = submission.user.telegram_id
-
-        if test.scoring_mode == "rasch":
-            score = rasch_scores_by_user.get(user_id, float(submission.percentage))
-            rounded_score = round(score, 1)
-            grade = get_grade(rounded_score)
-            result_line = (
-                f"📐 <b>Natijangiz:</b> {rounded_score} ball\n"
-                f"🏅 <b>Daraja:</b> {grade}"
-            )
-        else:
-            result_line = (
-                f"✅ <b>Natijangiz:</b> "
-                f"{submission.correct_count}/{submission.total_count} ({submission.percentage}%)"
-            )
-
-        wrong_block = _build_incorrect_answers_text(test, submission.answers)
-        text = (
-            "📢 <b>Test yakunlandi!</b>\n\n"
-            f"📝 Test: <code>{test.id}</code>\n"
-            f"{result_line}\n\n"
-            f"{wrong_block}"
-        )
-
-        try:
-            await context.bot.send_message(
-                chat_id=user_id,
-                text=text,
-                parse_mode="HTML"
-            )
-        except Exception:
-            continue
-
-
 @membership_required
 async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Test statistikasini ko'rsatish (command)"""
@@ -178,7 +82,7 @@ async def show_stats(message, context, code: str, user_id: int, edit: bool = Fal
         keyboard = test_active_stats_keyboard(code)
     else:
         # Test yakunlangan - to'liq statistikani ko'rsatish
-        stats = get_question_stats(test)
+        stats = await jobs.question_stats(test.id, include_submissions=False)
         if test.scoring_mode == 'rasch':
             text = format_stats(stats, test)
         else:
@@ -305,12 +209,10 @@ async def confirm_end_callback(update: Update, context: ContextTypes.DEFAULT_TYP
             return
 
     # Testni yakunlash
-    test.is_active = False
-    test.ended_at = datetime.now()
-    test.save()
+    await write_queue.submit(services.end_test, test)
 
     # Yakuniy statistikani olish
-    stats = get_question_stats(test)
+    stats = await jobs.question_stats(test.id, include_submissions=False)
     text = f"🔚 <b>Test yakunlandi!</b>\n\n"
 
     # Saqlangan baholash turini ishlatish
@@ -321,8 +223,8 @@ async def confirm_end_callback(update: Update, context: ContextTypes.DEFAULT_TYP
 
     await query.message.edit_text(text, parse_mode="HTML", reply_markup=back_to_test_keyboard(code))
 
-    # Ishtirokchilarga yakuniy natijalarni yuborish
-    await _notify_participants_final_results(context, test)
+    # Ishtirokchilarga yakuniy natijalar — fon vazifasida, jarayon yakunlovchiga ko'rsatiladi
+    await fanout.start_final_results(context.bot, test, user.id)
 
     # Adminga xabar yuborish
     if ADMIN_ID and user.id != ADMIN_ID:
@@ -339,12 +241,37 @@ async def confirm_end_callback(update: Update, context: ContextTypes.DEFAULT_TYP
             pass
 
 
+async def fanout_retry_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """To'xtab qolgan yakuniy natijalar yuborilishini qayta boshlash"""
+    query = update.callback_query
+    user = update.effective_user
+
+    try:
+        job = FanoutJob.get_by_id(int(query.data.replace("fanout_retry_", "")))
+    except (ValueError, FanoutJob.DoesNotExist):
+        await query.answer("❌ Topilmadi!", show_alert=True)
+        return
+
+    if job.admin_chat_id != user.id and user.id != ADMIN_ID:
+        await query.answer("❌ Ruxsat yo'q!", show_alert=True)
+        return
+
+    if await fanout.retry(context.bot, job.id):
+        await query.answer("🔁 Yuborish davom ettirilmoqda")
+        await query.message.edit_text(
+            f"📤 <b>Natijalar yuborilmoqda...</b>\n\n📝 Test: <code>{job.test_id}</code>",
+            parse_mode="HTML",
+        )
+    else:
+        await query.answer("ℹ️ Bu yuborish allaqachon davom etmoqda yoki tugagan.", show_alert=True)
+
+
 @membership_required
 async def mytests_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Foydalanuvchining testlari"""
     user = update.effective_user
 
-    db_user = get_or_create_user(
+    db_user = await get_or_create_user_async(
         telegram_id=user.id,
         username=user.username,
         full_name=user.full_name or user.first_name
@@ -373,7 +300,7 @@ async def mytests_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await query.answer()
 
     user = update.effective_user
-    db_user = get_or_create_user(
+    db_user = await get_or_create_user_async(
         telegram_id=user.id,
         username=user.username,
         full_name=user.full_name or user.first_name
@@ -433,13 +360,13 @@ async def mystats_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Foydalanuvchining shaxsiy statistikasi"""
     user = update.effective_user
 
-    db_user = get_or_create_user(
+    db_user = await get_or_create_user_async(
         telegram_id=user.id,
         username=user.username,
         full_name=user.full_name or user.first_name
     )
 
-    submissions = list(TestSubmission.select().where(TestSubmission.user == db_user))
+    submissions = repository.user_submissions(db_user)
 
     if not submissions:
         await update.message.reply_text(
@@ -476,12 +403,12 @@ async def mystats_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     if ended_subs:
         text += "<b>So'nggi natijalar:</b>\n"
-        for sub in sorted(ended_subs, key=lambda s: s.submitted_at, reverse=True)[:5]:
+        for sub in ended_subs[:5]:
             text += f"  • <code>{sub.test.id}</code>: {sub.correct_count}/{sub.total_count} ({sub.percentage}%)\n"
 
     if active_subs:
         text += "\n<b>Kutilmoqda (test yakunlanmagan):</b>\n"
-        for sub in sorted(active_subs, key=lambda s: s.submitted_at, reverse=True)[:5]:
+        for sub in active_subs[:5]:
             text += f"  • <code>{sub.test.id}</code>: ⏳ natija test yakunlangach e'lon qilinadi\n"
 
     await update.message.reply_html(text, reply_markup=main_menu_keyboard(update.effective_user.id))
@@ -511,50 +438,55 @@ async def export_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await query.message.reply_text("❌ Siz bu testning natijalarini yuklab ololmaysiz!")
         return
 
-    # Statistikani olish
-    stats = get_question_stats(test)
-    if stats['total_submissions'] == 0:
+    if not TestSubmission.select().where(TestSubmission.test == test).exists():
         await query.message.reply_text("📭 Hali hech kim test yechmagan.")
         return
 
-    import os
-    filepath = None
+    # Yakunlangan test fayli avval yuborilgan bo'lsa — file_id bilan qayta yuklamasdan
+    file_id = result_cache.get_file_id(test, fmt)
+    if file_id:
+        try:
+            await _send_export(query.message, fmt, code, file_id)
+            return
+        except TelegramError:
+            result_cache.forget_file_id(test, fmt)
+
+    # Statistika va fayl jobs executorida tayyorlanadi (event loop bo'sh qoladi)
     try:
-        if fmt == 'excel':
-            filepath = export_to_excel(stats, test)
-            with open(filepath, 'rb') as f:
-                await query.message.reply_document(
-                    document=f,
-                    filename=f"test_{code}.xlsx",
-                    caption=f"📊 Test {code} natijalari (Excel)"
-                )
-        elif fmt == 'pdf':
-            filepath = export_to_pdf(stats, test)
-            with open(filepath, 'rb') as f:
-                await query.message.reply_document(
-                    document=f,
-                    filename=f"test_{code}.pdf",
-                    caption=f"📊 Test {code} natijalari (PDF)"
-                )
-        elif fmt == 'chart':
-            filepath = export_chart(stats, test)
-            if not filepath:
-                await query.message.reply_text("📭 Grafik uchun savol ma'lumoti yetarli emas.")
-                return
-            with open(filepath, 'rb') as f:
-                await query.message.reply_photo(
-                    photo=f,
-                    caption=f"📊 Test {code} — Tahlil grafigi"
-                )
+        data = await jobs.export_file(test.id, fmt)
+        if fmt == 'chart' and not data:
+            await query.message.reply_text("📭 Grafik uchun savol ma'lumoti yetarli emas.")
+            return
+        sent = await _send_export(query.message, fmt, code, data)
+        if sent is not None:
+            media = sent.photo[-1] if sent.photo else sent.document
+            result_cache.set_file_id(test, fmt, media.file_id if media else None)
+    except jobs.JobQueueFull:
+        await query.message.reply_text("⏳ Server hozir band. Birozdan keyin qayta urinib ko'ring.")
     except Exception as e:
         await query.message.reply_text(f"❌ Fayl yaratishda xatolik: {str(e)}")
-    finally:
-        # Vaqtinchalik faylni o'chirish
-        if filepath and os.path.exists(filepath):
-            try:
-                os.remove(filepath)
-            except OSError:
-                pass
+
+
+async def _send_export(message, fmt: str, code: str, payload):
+    """Eksport faylini yuborish; payload — fayl baytlari yoki Telegram file_id."""
+    if fmt == 'excel':
+        return await message.reply_document(
+            document=payload,
+            filename=f"test_{code}.xlsx",
+            caption=f"📊 Test {code} natijalari (Excel)"
+        )
+    if fmt == 'pdf':
+        return await message.reply_document(
+            document=payload,
+            filename=f"test_{code}.pdf",
+            caption=f"📊 Test {code} natijalari (PDF)"
+        )
+    if fmt == 'chart':
+        return await message.reply_photo(
+            photo=payload,
+            caption=f"📊 Test {code} — Tahlil grafigi"
+        )
+    return None
 
 
 def get_handlers():
@@ -568,6 +500,7 @@ def get_handlers():
         CallbackQueryHandler(stats_callback, pattern=r"^stats_"),
         CallbackQueryHandler(end_callback, pattern=r"^end_(?!confirm)"),
         CallbackQueryHandler(confirm_end_callback, pattern=r"^confirm_end_"),
+        CallbackQueryHandler(fanout_retry_callback, pattern=r"^fanout_retry_\d+$"),
         CallbackQueryHandler(export_callback, pattern=r"^export_(excel|pdf|chart)_"),
         CallbackQueryHandler(mytests_callback, pattern=r"^mytests$"),
         CallbackQueryHandler(test_detail_callback, pattern=r"^test_"),
@@ -10,8 +10,10 @@ from telegram.ext import (
 
 from peewee import IntegrityError
 
-from database import get_or_create_user, Test, TestSubmission, AdminTestWatch, Question
+from database import get_or_create_user_async, write_queue, Test, TestSubmission, Question
 from utils import check_answers, parse_simple_answers, latex_to_text
+import outbox
+import services
 from config import ADMIN_ID
 from keyboards import main_menu_keyboard
 from membership import membership_required
@@ -31,37 +33,16 @@ CHAT_SOLVING = 2
 CHAT_SOLVE_BTN = "💬 Chatda yechish"
 
 
-async def _notify_result(context, test, db_user, correct_count, total, percentage):
-    """Test egasiga va kuzatuvchi adminlarga yangi natija haqida xabar."""
-    if test.creator.telegram_id != db_user.telegram_id:
-        try:
-            await context.bot.send_message(
-                chat_id=test.creator.telegram_id,
-                text=f"📢 <b>Yangi natija!</b>\n\n"
-                     f"📝 Test: <code>{test.id}</code>\n"
-                     f"👤 Foydalanuvchi: {escape(db_user.full_name or db_user.username or '')}\n"
-                     f"✅ Natija: {correct_count}/{total} ({percentage}%)",
-                parse_mode="HTML",
-            )
-        except Exception:
-            pass
+async def _record_submission(test, db_user, answers, correct_count, total, results):
+    """Topshiriqni va egasi/kuzatuvchilarga xabarlarni bitta yozuv ishida saqlash.
 
-    skip_ids = {db_user.telegram_id, test.creator.telegram_id}
-    for watch in AdminTestWatch.select().where(AdminTestWatch.test == test):
-        try:
-            watcher_tg_id = watch.admin.telegram_id
-            if watcher_tg_id in skip_ids:
-                continue
-            await context.bot.send_message(
-                chat_id=watcher_tg_id,
-                text=f"🔔 <b>Kuzatuv: Yangi natija!</b>\n\n"
-                     f"📝 Test: <code>{test.id}</code>\n"
-                     f"👤 Foydalanuvchi: {escape(db_user.full_name or db_user.username or '')}\n"
-                     f"✅ Natija: {correct_count}/{total} ({percentage}%)",
-                parse_mode="HTML",
-            )
-        except Exception:
-            pass
+    Xabarlar outbox'dan fonda yuboriladi. Takroriy topshiriqda IntegrityError.
+    """
+    submission = await write_queue.submit(
+        services.record_submission_with_notices, test, db_user, answers, correct_count, total, results
+    )
+    outbox.wake()
+    return submission
 
 
 @membership_required
@@ -121,7 +102,7 @@ async def process_test_code(update: Update, context: ContextTypes.DEFAULT_TYPE,
         return ConversationHandler.END
 
     user = update.effective_user
-    db_user = get_or_create_user(
+    db_user = await get_or_create_user_async(
         telegram_id=user.id,
         username=user.username,
         full_name=user.full_name or user.first_name
@@ -258,17 +239,11 @@ async def receive_user_answers(update: Update, context: ContextTypes.DEFAULT_TYP
         return WAITING_USER_ANSWERS
 
     # Javoblarni tekshirish
-    correct_count, total, results = check_answers(test.correct_answers, answers)
+    correct_count, total, results = check_answers(test.correct_answers, answers, test.id)
 
     # Natijani saqlash (unique indeks poyga holatidagi takroriy topshirishni bloklaydi)
     try:
-        submission = TestSubmission.create(
-            test=test,
-            user=db_user,
-            answers=answers,
-            correct_count=correct_count,
-            total_count=total
-        )
+        await _record_submission(test, db_user, answers, correct_count, total, results)
     except IntegrityError:
         await update.message.reply_text(
             "⚠️ Siz bu testni allaqachon ishlagansiz!",
@@ -285,8 +260,6 @@ async def receive_user_answers(update: Update, context: ContextTypes.DEFAULT_TYP
         reply_markup=main_menu_keyboard(update.effective_user.id)
     )
 
-    await _notify_result(context, test, db_user, correct_count, total, submission.percentage)
-
     # Context tozalash
     context.user_data.pop('current_test', None)
     context.user_data.pop('db_user', None)
@@ -474,13 +447,10 @@ async def _submit_chat(update: Update, context: ContextTypes.DEFAULT_TYPE):
          for i in range(len(qlist))],
         ensure_ascii=False,
     )
-    correct_count, total, _ = check_answers(test.correct_answers, submitted)
+    correct_count, total, results = check_answers(test.correct_answers, submitted, test.id)
 
     try:
-        submission = TestSubmission.create(
-            test=test, user=db_user, answers=submitted,
-            correct_count=correct_count, total_count=total,
-        )
+        await _record_submission(test, db_user, submitted, correct_count, total, results)
     except IntegrityError:
         _clear_chat_solving(context)
         await context.bot.send_message(chat_id, "⚠️ Siz bu testni allaqachon ishlagansiz!",
@@ -493,7 +463,6 @@ async def _submit_chat(update: Update, context: ContextTypes.DEFAULT_TYPE):
         parse_mode="HTML",
         reply_markup=main_menu_keyboard(update.effective_user.id),
     )
-    await _notify_result(context, test, db_user, correct_count, total, submission.percentage)
     _clear_chat_solving(context)
     return ConversationHandler.END
 
@@ -549,7 +518,7 @@ async def webapp_receive_data(update: Update, context: ContextTypes.DEFAULT_TYPE
         
         # User auth details
         telegram_id = update.effective_user.id
-        db_user = get_or_create_user(
+        db_user = await get_or_create_user_async(
             telegram_id=telegram_id,
             username=update.effective_user.username,
             full_name=update.effective_user.full_name
@@ -587,17 +556,11 @@ async def webapp_receive_data(update: Update, context: ContextTypes.DEFAULT_TYPE
         if not is_mixed:
             safe_answers = safe_answers.lower()
 
-        correct_count, total, _ = check_answers(test.correct_answers, safe_answers)
+        correct_count, total, results = check_answers(test.correct_answers, safe_answers, test.id)
 
         # Unique indeks poyga holatidagi takroriy topshirishni bazaviy darajada bloklaydi
         try:
-            submission = TestSubmission.create(
-                test=test,
-                user=db_user,
-                answers=safe_answers,
-                correct_count=correct_count,
-                total_count=total
-            )
+            await _record_submission(test, db_user, safe_answers, correct_count, total, results)
         except IntegrityError:
             await update.message.reply_text(
                 "⚠️ Siz bu testni allaqachon ishlagansiz!",
@@ -612,39 +575,6 @@ async def webapp_receive_data(update: Update, context: ContextTypes.DEFAULT_TYPE
             reply_markup=main_menu_keyboard(update.effective_user.id)
         )
 
-        # Test egasiga xabar yuborish
-        if test.creator.telegram_id != db_user.telegram_id:
-            try:
-                creator = test.creator
-                await context.bot.send_message(
-                    chat_id=creator.telegram_id,
-                    text=f"📢 <b>Yangi natija!</b>\n\n"
-                     f"📝 Test: <code>{test.id}</code>\n"
-                     f"👤 Foydalanuvchi: {escape(db_user.full_name or db_user.username or '')}\n"
-                     f"✅ Natija: {correct_count}/{total} ({submission.percentage}%)",
-                    parse_mode="HTML"
-                )
-            except Exception:
-                pass
-
-        # Kuzatayotgan adminlarga bildirishnoma
-        skip_ids = {db_user.telegram_id, test.creator.telegram_id}
-        for watch in AdminTestWatch.select().where(AdminTestWatch.test == test):
-            try:
-                watcher_tg_id = watch.admin.telegram_id
-                if watcher_tg_id in skip_ids:
-                    continue
-                await context.bot.send_message(
-                    chat_id=watcher_tg_id,
-                    text=f"🔔 <b>Kuzatuv: Yangi natija!</b>\n\n"
-                         f"📝 Test: <code>{test.id}</code>\n"
-                         f"👤 Foydalanuvchi: {escape(db_user.full_name or db_user.username or '')}\n"
-                         f"✅ Natija: {correct_count}/{total} ({submission.percentage}%)",
-                    parse_mode="HTML"
-                )
-            except Exception:
-                pass
-
     except json.JSONDecodeError:
         logger.exception("WEBAPP DATA: JSONDecodeError")
         return ConversationHandler.END
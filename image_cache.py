@@ -0,0 +1,252 @@
+"""Savol rasmlari keshi — xotira (bayt bo'yicha cheklangan) + disk (umumiy).
+
+Telegram file_id o'zgarmas: bir file_id doim bir xil baytlarni beradi. Shu
+sababli rasm bir marta yuklanadi va ikki qatlamda saqlanadi:
+
+- xotira — IMAGE_CACHE_MEMORY_MB bilan cheklangan LRU (yozuvlar soni emas,
+  umumiy hajm hisoblanadi — bir nechta katta rasm worker xotirasini yeb
+  qo'ymaydi);
+- disk — IMAGE_CACHE_DIR ichida kontent-adresli: baytlar sha256 nomli faylda,
+  kalit (file_id) esa shu xeshga ishora qiladi. Restartdan keyin ham saqlanadi
+  va bir nechta uvicorn worker'lari o'rtasida bo'lishiladi (yozish atomik).
+  Hajm IMAGE_CACHE_DISK_MB dan oshsa eng uzoq o'qilmagan fayllar o'chiriladi.
+  Papka har yozuvda emas, chegaraning ~1/20 qismi yozilganda bir ko'riladi;
+  bloblari o'chirilgan kalit fayllari ham shunda tozalanadi.
+
+Har yozuvning ETag'i — kontent xeshi (kuchli ETag), shuning uchun API
+`If-None-Match` bo'yicha 304 qaytara oladi.
+"""
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+
+from config import IMAGE_CACHE_DIR, IMAGE_CACHE_DISK_MB, IMAGE_CACHE_MEMORY_MB
+
+logger = logging.getLogger(__name__)
+
+_MEMORY_LIMIT = IMAGE_CACHE_MEMORY_MB * 1024 * 1024
+_DISK_LIMIT = IMAGE_CACHE_DISK_MB * 1024 * 1024
+_BLOBS_DIR = os.path.join(IMAGE_CACHE_DIR, "blobs")
+_KEYS_DIR = os.path.join(IMAGE_CACHE_DIR, "keys")
+# Shuncha bayt yozilgach disk hajmi qayta hisoblanadi (har put'da skan qilinmaydi)
+_EVICT_EVERY = max(_DISK_LIMIT // 20, 1024 * 1024)
+
+
+@dataclass(frozen=True)
+class CachedImage:
+    content: bytes
+    content_type: str
+    etag: str
+
+
+_memory: "OrderedDict[str, CachedImage]" = OrderedDict()
+_memory_bytes = 0
+_lock = threading.Lock()
+# Oxirgi disk tekshiruvidan beri yozilgan baytlar (None — jarayonda hali tekshirilmagan)
+_disk_written: Optional[int] = None
+
+
+def version_token(file_id: str) -> str:
+    """file_id'dan qisqa versiya belgisi (rasm URL'idagi `?v=` uchun)."""
+    return hashlib.blake2b(file_id.encode("utf-8"), digest_size=6).hexdigest()
+
+
+def _etag(digest: str) -> str:
+    return f'"{digest[:32]}"'
+
+
+# ─────────────────────────── xotira qatlami ───────────────────────────
+
+def _memory_get(key: str) -> Optional[CachedImage]:
+    with _lock:
+        entry = _memory.get(key)
+        if entry is not None:
+            _memory.move_to_end(key)
+        return entry
+
+
+def _memory_put(key: str, entry: CachedImage):
+    global _memory_bytes
+    size = len(entry.content)
+    # Juda katta rasm xotirani egallab olmasin — faqat diskda qoladi
+    if size > _MEMORY_LIMIT // 4:
+        return
+    with _lock:
+        old = _memory.pop(key, None)
+        if old is not None:
+            _memory_bytes -= len(old.content)
+        _memory[key] = entry
+        _memory_bytes += size
+        while _memory_bytes > _MEMORY_LIMIT and _memory:
+            _, evicted = _memory.popitem(last=False)
+            _memory_bytes -= len(evicted.content)
+
+
+# ─────────────────────────── disk qatlami ───────────────────────────
+
+def _key_path(key: str) -> str:
+    name = hashlib.blake2b(key.encode("utf-8"), digest_size=16).hexdigest()
+    return os.path.join(_KEYS_DIR, name)
+
+
+def _blob_path(digest: str) -> str:
+    return os.path.join(_BLOBS_DIR, digest[:2], digest)
+
+
+def _atomic_write(path: str, data: bytes):
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+def _disk_get(key: str) -> Optional[CachedImage]:
+    if _DISK_LIMIT <= 0:
+        return None
+    try:
+        with open(_key_path(key), "r", encoding="utf-8") as f:
+            digest, content_type = f.read().split("\n", 1)
+        blob = _blob_path(digest)
+        with open(blob, "rb") as f:
+            content = f.read()
+        os.utime(blob)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logger.warning("IMAGE CACHE o'qib bo'lmadi: key=%s (%s)", key, e)
+        return None
+    return CachedImage(content, content_type, _etag(digest))
+
+
+def _disk_put(key: str, digest: str, entry: CachedImage):
+    if _DISK_LIMIT <= 0:
+        return
+    global _disk_written
+    written = 0
+    try:
+        blob = _blob_path(digest)
+        if not os.path.exists(blob):
+            _atomic_write(blob, entry.content)
+            written = len(entry.content)
+        _atomic_write(_key_path(key), f"{digest}\n{entry.content_type}".encode("utf-8"))
+    except OSError as e:
+        logger.warning("IMAGE CACHE yozib bo'lmadi: key=%s (%s)", key, e)
+        return
+    with _lock:
+        due = _disk_written is None or _disk_written + written >= _EVICT_EVERY
+        _disk_written = 0 if due else _disk_written + written
+    if due:
+        _evict_disk()
+
+
+def _blob_entries() -> list:
+    entries = []
+    try:
+        with os.scandir(_BLOBS_DIR) as shards:
+            for shard in shards:
+                if not shard.is_dir():
+                    continue
+                with os.scandir(shard.path) as it:
+                    for entry in it:
+                        if entry.is_file() and not entry.name.startswith(".tmp-"):
+                            st = entry.stat()
+                            entries.append((st.st_mtime, st.st_size, entry.path))
+    except FileNotFoundError:
+        pass
+    return entries
+
+
+def _evict_disk():
+    """Bloblar hajmi chegaradan oshsa eng eskilarini o'chirish.
+
+    Shundan keyin bloblari yo'q bo'lib qolgan kalit fayllari ham o'chiriladi.
+    """
+    entries = _blob_entries()
+    total = sum(size for _, size, _ in entries)
+    if total <= _DISK_LIMIT:
+        return
+    for _, size, path in sorted(entries):
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= size
+        if total <= _DISK_LIMIT:
+            break
+    _prune_keys()
+
+
+def _prune_keys():
+    """Blobi o'chirilgan kalit fayllarini tozalash."""
+    try:
+        with os.scandir(_KEYS_DIR) as it:
+            for entry in it:
+                if not entry.is_file() or entry.name.startswith(".tmp-"):
+                    continue
+                try:
+                    with open(entry.path, "r", encoding="utf-8") as f:
+                        digest = f.read().split("\n", 1)[0]
+                    if not os.path.exists(_blob_path(digest)):
+                        os.remove(entry.path)
+                except (OSError, ValueError):
+                    continue
+    except FileNotFoundError:
+        pass
+
+
+# ─────────────────────────── umumiy API ───────────────────────────
+
+def get(key: str) -> Optional[CachedImage]:
+    """Keshdan rasm (avval xotira, so'ng disk; diskdan topilsa xotiraga ko'tariladi)."""
+    entry = _memory_get(key)
+    if entry is not None:
+        return entry
+    entry = _disk_get(key)
+    if entry is not None:
+        _memory_put(key, entry)
+    return entry
+
+
+def put(key: str, content: bytes, content_type: str) -> CachedImage:
+    """Rasmni ikkala qatlamga yozish va ETag bilan qaytarish."""
+    digest = hashlib.sha256(content).hexdigest()
+    entry = CachedImage(content, content_type, _etag(digest))
+    _memory_put(key, entry)
+    _disk_put(key, digest, entry)
+    return entry
+
+
+def clear():
+    """Ikkala qatlamni tozalash (yuklama testi va qo'lda tozalash uchun)."""
+    global _memory_bytes, _disk_written
+    with _lock:
+        _memory.clear()
+        _memory_bytes = 0
+        _disk_written = None
+    shutil.rmtree(IMAGE_CACHE_DIR, ignore_errors=True)
+
+
+def usage() -> dict:
+    """Xotira va disk qatlamlari hajmi (diagnostika uchun)."""
+    blobs = _blob_entries()
+    with _lock:
+        memory_items, memory_bytes = len(_memory), _memory_bytes
+    return {
+        "memory_items": memory_items,
+        "memory_bytes": memory_bytes,
+        "disk_files": len(blobs),
+        "disk_bytes": sum(size for _, size, _ in blobs),
+    }
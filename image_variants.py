@@ -0,0 +1,97 @@
+"""Savol rasmlarining o'lchami kichraytirilgan va WebP/AVIF variantlari.
+
+Telegram'dan kelgan rasm (ko'pincha 1–3 MB JPEG) telefondagi WebApp'da
+ko'rsatilganda shuncha trafik kerak emas. Bu yerda Pillow orqali:
+
+- kenglik IMAGE_VARIANT_WIDTHS dagi eng yaqin (kattaroq yoki teng) qiymatga
+  keltiriladi (ixtiyoriy `w=` emas — keshdagi variantlar soni cheklangan);
+- format `Accept` sarlavhasidan tanlanadi: AVIF (Pillow qo'llasa) > WebP > JPEG.
+
+Natija asl rasmdan katta chiqsa (kichik rasmni qayta kodlash) asl baytlar
+qaytariladi. Variantlar API'da image_cache orqali keshlanadi.
+"""
+import io
+import logging
+from typing import Optional, Tuple
+
+from config import IMAGE_VARIANT_WIDTHS
+
+logger = logging.getLogger(__name__)
+
+# format -> (Pillow formati, Content-Type, saqlash parametrlari)
+_ENCODERS = {
+    "avif": ("AVIF", "image/avif", {"quality": 55, "speed": 8}),
+    "webp": ("WEBP", "image/webp", {"quality": 80, "method": 4}),
+    "jpeg": ("JPEG", "image/jpeg", {"quality": 82, "optimize": True, "progressive": True}),
+}
+
+_avif_supported: Optional[bool] = None
+
+
+def _has_avif() -> bool:
+    global _avif_supported
+    if _avif_supported is None:
+        try:
+            from PIL import features
+            _avif_supported = bool(features.check("avif"))
+        except Exception:
+            _avif_supported = False
+    return _avif_supported
+
+
+def choose_width(requested: Optional[int]) -> Optional[int]:
+    """So'ralgan kenglikni ruxsat etilgan variantga keltirish (None — asl o'lcham)."""
+    if not requested or requested <= 0 or not IMAGE_VARIANT_WIDTHS:
+        return None
+    for width in IMAGE_VARIANT_WIDTHS:
+        if width >= requested:
+            return width
+    return IMAGE_VARIANT_WIDTHS[-1]
+
+
+def choose_format(accept: Optional[str]) -> Optional[str]:
+    """`Accept` bo'yicha zamonaviy format (None — brauzer faqat JPEG/PNG biladi)."""
+    accept = (accept or "").lower()
+    if "image/avif" in accept and _has_avif():
+        return "avif"
+    if "image/webp" in accept:
+        return "webp"
+    return None
+
+
+def transcode(content: bytes, width: Optional[int], fmt: Optional[str]) -> Tuple[bytes, Optional[str]]:
+    """Rasmni `width` gacha kichraytirib `fmt` formatida kodlash.
+
+    Returns:
+        (baytlar, content_type) — content_type None bo'lsa asl rasm qaytgan.
+    """
+    if width is None and fmt is None:
+        return content, None
+
+    from PIL import Image, ImageOps
+
+    try:
+        with Image.open(io.BytesIO(content)) as img:
+            img = ImageOps.exif_transpose(img)
+            resized = width is not None and img.width > width
+            if resized:
+                height = max(1, round(img.height * width / img.width))
+                img = img.resize((width, height), Image.Resampling.LANCZOS)
+
+            encoder, content_type, params = _ENCODERS[fmt or "jpeg"]
+            if encoder == "JPEG" and img.mode != "RGB":
+                img = img.convert("RGB")
+            elif img.mode not in ("RGB", "RGBA"):
+                img = img.convert("RGBA" if "A" in img.getbands() else "RGB")
+
+            out = io.BytesIO()
+            img.save(out, encoder, **params)
+    except Exception as e:
+        # Buzilgan/noma'lum format — rasmni o'zgartirmasdan beramiz
+        logger.warning("IMAGE VARIANT yaratib bo'lmadi (w=%s, fmt=%s): %s", width, fmt, e)
+        return content, None
+
+    data = out.getvalue()
+    if not resized and len(data) >= len(content):
+        return content, None
+    return data, content_type
@@ -0,0 +1,314 @@
+"""Og'ir ishlar executori — statistika, Rash va eksport event loop'dan tashqarida.
+
+PTB handlerlari async: ular ichida sinxron Rash hisoblash yoki PDF/grafik
+yaratish butun botni to'xtatib qo'yadi (bir admin PDF olayotganda boshqalar
+javob olmaydi). Shu sababli bunday ishlar shu yerdagi ikki pool'ga beriladi:
+
+- thread pool — DB o'qish va LibreOffice kabi kutishga ketadigan ishlar;
+- process pool (spawn) — Rash, openpyxl va matplotlib (CPU, GIL'ni band qiladi).
+
+Process'ga faqat test_id (va oddiy argumentlar) uzatiladi — worker ma'lumotni
+bazadan o'zi o'qiydi. Bir xil (ish turi, test, argumentlar) bo'yicha parallel
+so'rovlar bitta ishni kutadi (de-dup). Foydalanuvchi so'ragan eksportlar navbat
+chuqurligi JOB_QUEUE_LIMIT dan oshsa rad etiladi (statistika va yakuniy natija
+xabarlari uchun Rash esa har doim bajariladi); navbat va ish vaqtlari admin
+uchun /jobs buyrug'ida ko'rinadi.
+"""
+import asyncio
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from typing import Callable, Dict, Optional
+
+from config import JOB_THREAD_WORKERS, JOB_PROCESS_WORKERS, JOB_QUEUE_LIMIT
+
+logger = logging.getLogger(__name__)
+
+
+class JobQueueFull(Exception):
+    """Navbat to'lgan — foydalanuvchiga keyinroq urinib ko'rishni aytish kerak."""
+
+
+@dataclass
+class JobStats:
+    """Bitta ish turi bo'yicha yig'ma ko'rsatkichlar."""
+    count: int = 0
+    errors: int = 0
+    deduped: int = 0
+    total_run: float = 0.0
+    total_wait: float = 0.0
+    max_run: float = 0.0
+    last_run: float = 0.0
+
+
+_thread_pool: Optional[ThreadPoolExecutor] = None
+_process_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+_inflight: Dict[tuple, asyncio.Future] = {}
+_pending = 0
+_running = 0
+_stats: Dict[str, JobStats] = {}
+
+
+# ─────────────────────────── worker tomoni ───────────────────────────
+# Quyidagi funksiyalar modul darajasida — spawn process'ga pickle qilinadi.
+
+def _timed_call(fn: Callable, *args):
+    """Worker ichida ishni bajarib, (natija, sof ish vaqti) qaytaradi."""
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def _load_test(test_id: int):
+    from database import Test
+    return Test.get_by_id(test_id)
+
+
+def _stats_for(test, include_submissions: bool) -> Dict:
+    """get_question_stats — yakunlangan test uchun result_cache orqali."""
+    import result_cache
+    from utils import get_question_stats
+    return result_cache.cached_object(
+        test, "stats" if include_submissions else "stats_light",
+        lambda: get_question_stats(test, include_submissions=include_submissions),
+    )
+
+
+def _question_stats_job(test_id: int, include_submissions: bool) -> Dict:
+    return _stats_for(_load_test(test_id), include_submissions)
+
+
+def _rasch_job(test_id: int) -> Dict:
+    import result_cache
+    import repository
+    from utils import calculate_rasch_scores
+    test = _load_test(test_id)
+
+    def compute():
+        return calculate_rasch_scores(test, repository.test_submissions(test))
+
+    return result_cache.cached_object(test, "rasch", compute)
+
+
+def _read_and_remove(filepath: Optional[str]) -> Optional[bytes]:
+    """Eksport faylini o'qib, vaqtinchalik faylni o'chiradi.
+
+    Natija bayt ko'rinishida qaytadi — de-dup qilingan so'rovlar bitta faylni
+    bir-biridan oldin o'chirib yubormasligi uchun.
+    """
+    if not filepath:
+        return None
+    try:
+        with open(filepath, "rb") as f:
+            return f.read()
+    finally:
+        if os.path.exists(filepath):
+            os.remove(filepath)
+
+
+def _export_job(test_id: int, fmt: str) -> Optional[bytes]:
+    """Excel yoki grafik — statistika va fayl bitta process'da."""
+    import result_cache
+    from export import export_to_excel, export_chart
+    test = _load_test(test_id)
+    if fmt == "chart":
+        return result_cache.cached_bytes(
+            test, "chart",
+            lambda: _read_and_remove(export_chart(_stats_for(test, False), test)),
+        )
+    return result_cache.cached_bytes(
+        test, "excel",
+        lambda: _read_and_remove(export_to_excel(_stats_for(test, True), test)),
+    )
+
+
+def _pdf_job(test_id: int, stats: Optional[Dict]) -> Optional[bytes]:
+    """PDF — asosiy vaqt LibreOffice'ni kutishga ketadi (thread pool).
+
+    `stats` None bo'lsa (keshdan olinadi deb kutilgan) — shu yerda hisoblanadi.
+    """
+    import result_cache
+    from export import export_to_pdf
+    test = _load_test(test_id)
+    return result_cache.cached_bytes(
+        test, "pdf",
+        lambda: _read_and_remove(export_to_pdf(stats or _stats_for(test, True), test)),
+    )
+
+
+# ─────────────────────────── event loop tomoni ───────────────────────────
+
+def _get_thread_pool() -> ThreadPoolExecutor:
+    global _thread_pool
+    with _pool_lock:
+        if _thread_pool is None:
+            _thread_pool = ThreadPoolExecutor(max_workers=JOB_THREAD_WORKERS, thread_name_prefix="job")
+        return _thread_pool
+
+
+def _get_process_pool() -> Optional[ProcessPoolExecutor]:
+    """Process pool (JOB_PROCESS_WORKERS=0 bo'lsa None — CPU ishlar thread'da)."""
+    global _process_pool
+    if JOB_PROCESS_WORKERS <= 0:
+        return None
+    with _pool_lock:
+        if _process_pool is None:
+            _process_pool = ProcessPoolExecutor(
+                max_workers=JOB_PROCESS_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _process_pool
+
+
+def _reset_process_pool():
+    """Worker qulab tushsa (BrokenProcessPool) pool keyingi ish uchun qayta yaratiladi."""
+    global _process_pool
+    with _pool_lock:
+        pool, _process_pool = _process_pool, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+async def _execute(kind: str, fn: Callable, args: tuple, cpu: bool, bounded: bool = False):
+    global _pending, _running
+    if bounded and _pending >= JOB_QUEUE_LIMIT:
+        raise JobQueueFull(kind)
+
+    loop = asyncio.get_running_loop()
+    stats = _stats.setdefault(kind, JobStats())
+    queued_at = time.perf_counter()
+    _pending += 1
+    try:
+        pool = _get_process_pool() if cpu else None
+        try:
+            if pool is not None:
+                future = loop.run_in_executor(pool, _timed_call, fn, *args)
+            else:
+                future = loop.run_in_executor(_get_thread_pool(), _timed_call, fn, *args)
+            _running += 1
+            try:
+                result, run_seconds = await future
+            finally:
+                _running -= 1
+        except BrokenProcessPool:
+            _reset_process_pool()
+            raise
+    except Exception:
+        stats.errors += 1
+        logger.exception("JOB xato: kind=%s test_id=%s", kind, args[0] if args else None)
+        raise
+    finally:
+        _pending -= 1
+
+    total = time.perf_counter() - queued_at
+    stats.count += 1
+    stats.total_run += run_seconds
+    stats.total_wait += max(0.0, total - run_seconds)
+    stats.max_run = max(stats.max_run, run_seconds)
+    stats.last_run = run_seconds
+    return result
+
+
+async def _has_cached(test_id: int, kind: str) -> bool:
+    """result_cache'da tayyor natija bormi (fayl o'qish — thread pool'da)."""
+    def check():
+        import result_cache
+        return result_cache.has(_load_test(test_id), kind)
+    return await asyncio.get_running_loop().run_in_executor(_get_thread_pool(), check)
+
+
+async def _deduplicated(kind: str, key: tuple, factory: Callable):
+    """Kalit bo'yicha bajarilayotgan ish bo'lsa — o'shani kutish, aks holda boshlash.
+
+    shield: kutayotgan handlerlardan biri bekor qilinsa, umumiy ish to'xtamaydi.
+    """
+    future = _inflight.get(key)
+    if future is not None:
+        _stats.setdefault(kind, JobStats()).deduped += 1
+        return await asyncio.shield(future)
+
+    future = asyncio.ensure_future(factory())
+    _inflight[key] = future
+    future.add_done_callback(lambda _: _inflight.pop(key, None))
+    return await asyncio.shield(future)
+
+
+async def submit(kind: str, test_id: int, fn: Callable, *args,
+                 cpu: bool = True, bounded: bool = False):
+    """`fn(test_id, *args)` ni pool'ga berib natijasini kutish.
+
+    Bir xil (kind, test_id, args) bo'yicha ish allaqachon bajarilayotgan
+    bo'lsa, yangisi yaratilmaydi — o'sha natija kutiladi.
+
+    Raises:
+        JobQueueFull: bounded=True va navbatda JOB_QUEUE_LIMIT dan ko'p ish bo'lsa
+    """
+    return await _deduplicated(
+        kind, (kind, test_id, args),
+        lambda: _execute(kind, fn, (test_id,) + args, cpu, bounded),
+    )
+
+
+async def question_stats(test_id: int, include_submissions: bool = True) -> Dict:
+    """utils.get_question_stats — to'liq variant process'da, yengili thread'da."""
+    return await submit(
+        "stats" if include_submissions else "stats_light",
+        test_id, _question_stats_job, include_submissions,
+        cpu=include_submissions,
+    )
+
+
+async def rasch_scores(test_id: int) -> Dict:
+    """utils.calculate_rasch_scores — testning barcha topshiriqlari bo'yicha."""
+    return await submit("rasch", test_id, _rasch_job)
+
+
+async def export_file(test_id: int, fmt: str) -> Optional[bytes]:
+    """Eksport fayli baytlari: fmt = 'excel' | 'pdf' | 'chart'.
+
+    Ma'lumot yetarli bo'lmasa (masalan, grafik uchun savol yo'q) None.
+
+    Raises:
+        JobQueueFull: navbat to'lgan bo'lsa
+    """
+    if fmt == "pdf":
+        async def pipeline():
+            if _pending >= JOB_QUEUE_LIMIT:
+                raise JobQueueFull("pdf")
+            # Keshda tayyor PDF bo'lsa statistikani process'da hisoblash shart emas
+            stats = None if await _has_cached(test_id, "pdf") else await question_stats(test_id)
+            return await _execute("pdf", _pdf_job, (test_id, stats), cpu=False)
+        return await _deduplicated("pdf", ("pdf", test_id, ()), pipeline)
+    return await submit(fmt, test_id, _export_job, fmt, bounded=True)
+
+
+def snapshot() -> Dict:
+    """Navbat holati va ish turlari bo'yicha ko'rsatkichlar (admin /jobs uchun)."""
+    return {
+        "pending": _pending,
+        "running": _running,
+        "inflight": len(_inflight),
+        "queue_limit": JOB_QUEUE_LIMIT,
+        "thread_workers": JOB_THREAD_WORKERS,
+        "process_workers": JOB_PROCESS_WORKERS,
+        "kinds": {kind: JobStats(**vars(s)) for kind, s in _stats.items()},
+    }
+
+
+def shutdown():
+    """Bot to'xtaganda pool'larni yopish."""
+    global _thread_pool, _process_pool
+    with _pool_lock:
+        thread_pool, _thread_pool = _thread_pool, None
+        process_pool, _process_pool = _process_pool, None
+    if process_pool is not None:
+        process_pool.shutdown(wait=False, cancel_futures=True)
+    if thread_pool is not None:
+        thread_pool.shutdown(wait=False, cancel_futures=True)
@@ -111,3 +111,15 @@ def back_to_test_keyboard(test_code: str):
         [InlineKeyboardButton("🔙 Orqaga", callback_data=f"test_{test_code}")]
     ]
     return InlineKeyboardMarkup(keyboard)
+
+
+def fanout_retry_keyboard(job_id: int):
+    """To'xtab qolgan yakuniy natijalar yuborilishini qayta boshlash"""
+    keyboard = [[InlineKeyboardButton("🔁 Qayta urinish", callback_data=f"fanout_retry_{job_id}")]]
+    return InlineKeyboardMarkup(keyboard)
+
+
+def broadcast_retry_keyboard(broadcast_id: int):
+    """To'xtab qolgan broadcast'ni saqlangan joyidan davom ettirish"""
+    keyboard = [[InlineKeyboardButton("🔁 Qayta urinish", callback_data=f"broadcast_retry_{broadcast_id}")]]
+    return InlineKeyboardMarkup(keyboard)
@@ -1,21 +1,143 @@
-"""Membership tekshirish decorator va yordamchi funksiyalar"""
+"""Membership tekshirish decorator va yordamchi funksiyalar
+
+Har `@membership_required` handler shu tekshiruvdan o'tadi, shuning uchun:
+
+- faol kanallar ro'yxati xotirada (CHANNEL_CACHE_TTL); admin kanal
+  qo'shganda/o'chirganda `invalidate_channels()` darhol yangilaydi;
+- kanallar `get_chat_member` bilan parallel tekshiriladi, jarayon bo'yicha
+  bir vaqtdagi so'rovlar MEMBERSHIP_CONCURRENCY bilan cheklangan;
+- natija keshi hajm bo'yicha cheklangan (LRU) va muddatli: "a'zo" natijasi
+  MEMBERSHIP_CACHE_TTL, "a'zo emas" — qisqa MEMBERSHIP_NEGATIVE_TTL (kanalga
+  qo'shilgan foydalanuvchi uzoq kutmaydi). Yozuv kanallar to'plamiga
+  bog'langan — to'plam o'zgarsa eski natija ishlatilmaydi;
+- bir foydalanuvchi uchun bir vaqtda bitta tekshiruv: ikki marta bosilganda
+  ikkinchisi birinchisining natijasini kutadi;
+- natija shared_cache'ga ham yoziladi — API worker'lari va restartdan keyingi
+  bot uni qayta so'ramaydi (xotiradagi kesh birinchi, so'ng umumiy kesh).
+"""
+import asyncio
 import logging
 import time
+from collections import OrderedDict
 from functools import wraps
+from typing import Dict, List, Optional, Tuple
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
 from telegram.error import TelegramError
 
+from config import (
+    CHANNEL_CACHE_TTL, MEMBERSHIP_CACHE_SIZE, MEMBERSHIP_CACHE_TTL,
+    MEMBERSHIP_CONCURRENCY, MEMBERSHIP_NEGATIVE_TTL,
+)
 from database import Channel
+import shared_cache
 
 logger = logging.getLogger(__name__)
 
-# Tasdiqlangan a'zolik keshi: {user_id: muddat_tugashi (epoch)}
-# Faqat "barcha kanallarga a'zo" holati keshlanadi — bu har bosishda Telegram
-# API'siga so'rov yuborishni kamaytiradi. A'zo bo'lmagan foydalanuvchi keshlanmaydi,
-# shuning uchun kanalga qo'shilgach darhol ("✅ Tekshirish" bilan) ochiladi.
-_membership_cache: dict[int, float] = {}
-_MEMBERSHIP_CACHE_TTL = 180  # 3 daqiqa
+_ALLOWED_STATUSES = {"member", "administrator", "creator"}
+
+# Faol kanallar: (ro'yxat, muddat_tugashi (monotonic))
+_channels: Optional[Tuple[List[Channel], float]] = None
+
+# {user_id: (muddat_tugashi, kanallar kaliti, a'zo bo'lmagan kanal id'lari)}
+_membership_cache: "OrderedDict[int, Tuple[float, tuple, tuple]]" = OrderedDict()
+_inflight: Dict[int, asyncio.Task] = {}
+_limit: Optional[asyncio.Semaphore] = None
+
+
+def _load_channels() -> List[Channel]:
+    return list(Channel.select().where(Channel.is_active == True))  # noqa: E712
+
+
+async def active_channels() -> List[Channel]:
+    """Faol majburiy kanallar (xotiradagi nusxa; yangilash — thread'da, loop to'xtamaydi)."""
+    global _channels
+    if _channels is None or _channels[1] <= time.monotonic():
+        channels = await asyncio.to_thread(_load_channels)
+        _channels = (channels, time.monotonic() + CHANNEL_CACHE_TTL)
+    return _channels[0]
+
+
+def invalidate_channels():
+    """Kanallar ro'yxati o'zgardi (admin qo'shdi/o'chirdi) — keyingi tekshiruv bazadan o'qiydi."""
+    global _channels
+    _channels = None
+
+
+def _channels_key(channels: List[Channel]) -> tuple:
+    return tuple(sorted(channel.channel_id for channel in channels))
+
+
+def _cached_verdict(user_id: int, key: tuple) -> Optional[tuple]:
+    entry = _membership_cache.get(user_id)
+    if entry is None:
+        return None
+    expires_at, channels_key, not_joined = entry
+    if expires_at <= time.monotonic() or channels_key != key:
+        del _membership_cache[user_id]
+        return None
+    _membership_cache.move_to_end(user_id)
+    return not_joined
+
+
+async def _shared_verdict(user_id: int, key: tuple) -> Optional[tuple]:
+    """Boshqa jarayon (API/avvalgi bot) tekshirgan natija (fayl o'qish — thread'da)."""
+    entry = await shared_cache.get_entry_async("membership", user_id)
+    if entry is None:
+        return None
+    (channels_key, not_joined), expires_at = entry
+    if tuple(channels_key) != key:
+        return None
+    not_joined = tuple(not_joined)
+    _remember_verdict(user_id, key, not_joined, ttl=expires_at - time.time())
+    return not_joined
+
+
+def _remember_verdict(user_id: int, key: tuple, not_joined: tuple, ttl: Optional[float] = None):
+    if ttl is None:
+        ttl = MEMBERSHIP_NEGATIVE_TTL if not_joined else MEMBERSHIP_CACHE_TTL
+    if ttl <= 0 or MEMBERSHIP_CACHE_SIZE <= 0:
+        _membership_cache.pop(user_id, None)
+        return
+    _membership_cache[user_id] = (time.monotonic() + ttl, key, not_joined)
+    _membership_cache.move_to_end(user_id)
+    while len(_membership_cache) > MEMBERSHIP_CACHE_SIZE:
+        _membership_cache.popitem(last=False)
+
+
+async def _is_member(bot, channel: Channel, user_id: int) -> bool:
+    global _limit
+    if _limit is None:
+        _limit = asyncio.Semaphore(MEMBERSHIP_CONCURRENCY)
+    try:
+        async with _limit:
+            member = await bot.get_chat_member(chat_id=channel.channel_id, user_id=user_id)
+    except TelegramError:
+        # Tekshiruv xatoligi bo'lsa xavfsiz yo'l:
+        # foydalanuvchini tekshirilmagan deb hisoblaymiz.
+        logger.exception(
+            "MEMBERSHIP CHECK ERROR: user_id=%s channel_id=%s",
+            user_id, channel.channel_id
+        )
+        return False
+    # Ruxsat etilgan holatlar tashqarisida bo'lsa - a'zo emas
+    if member.status not in _ALLOWED_STATUSES:
+        logger.info(
+            "MEMBERSHIP CHECK: user_id=%s channel_id=%s status=%s -> not joined",
+            user_id, channel.channel_id, member.status
+        )
+        return False
+    return True
+
+
+async def _check(bot, user_id: int, channels: List[Channel], key: tuple) -> tuple:
+    logger.info("MEMBERSHIP CHECK: user_id=%s active_channels=%s", user_id, len(channels))
+    joined = await asyncio.gather(*(_is_member(bot, channel, user_id) for channel in channels))
+    not_joined = tuple(channel.channel_id for channel, ok in zip(channels, joined) if not ok)
+    _remember_verdict(user_id, key, not_joined)
+    ttl = MEMBERSHIP_NEGATIVE_TTL if not_joined else MEMBERSHIP_CACHE_TTL
+    await asyncio.to_thread(shared_cache.put, "membership", user_id, [list(key), list(not_joined)], ttl)
+    return not_joined
 
 
 async def check_user_membership(bot, user_id: int, use_cache: bool = True) -> tuple[bool, list]:
@@ -23,56 +145,32 @@ async def check_user_membership(bot, user_id: int, use_cache: bool = True) -> tu
     Foydalanuvchi barcha kanallarga a'zo ekanligini tekshirish
 
     Args:
-        use_cache: True bo'lsa, yaqinda tasdiqlangan a'zolikni keshdan oladi.
+        use_cache: True bo'lsa, keshdagi (muddati o'tmagan) natijani ishlatadi.
 
     Returns:
         (all_joined: bool, not_joined_channels: list)
     """
-    if use_cache:
-        expires_at = _membership_cache.get(user_id)
-        if expires_at and expires_at > time.time():
-            return True, []
-
-    channels = list(Channel.select().where(Channel.is_active == True))
-    logger.info("MEMBERSHIP CHECK: user_id=%s active_channels=%s", user_id, len(channels))
-
+    channels = await active_channels()
     if not channels:
         return True, []
+    key = _channels_key(channels)
 
-    not_joined = []
-
-    allowed_statuses = {"member", "administrator", "creator"}
-
-    for channel in channels:
-        try:
-            member = await bot.get_chat_member(
-                chat_id=channel.channel_id,
-                user_id=user_id
-            )
-            # Ruxsat etilgan holatlar tashqarisida bo'lsa - a'zo emas
-            if member.status not in allowed_statuses:
-                not_joined.append(channel)
-                logger.info(
-                    "MEMBERSHIP CHECK: user_id=%s channel_id=%s status=%s -> not joined",
-                    user_id, channel.channel_id, member.status
-                )
-        except TelegramError:
-            # Tekshiruv xatoligi bo'lsa xavfsiz yo'l:
-            # foydalanuvchini tekshirilmagan deb hisoblaymiz.
-            not_joined.append(channel)
-            logger.exception(
-                "MEMBERSHIP CHECK ERROR: user_id=%s channel_id=%s",
-                user_id, channel.channel_id
-            )
-
-    all_joined = len(not_joined) == 0
-    if all_joined:
-        _membership_cache[user_id] = time.time() + _MEMBERSHIP_CACHE_TTL
-    else:
-        # A'zolik buzilgan bo'lsa eski keshni tozalaymiz
-        _membership_cache.pop(user_id, None)
-
-    return all_joined, not_joined
+    not_joined = None
+    if use_cache:
+        not_joined = _cached_verdict(user_id, key)
+        if not_joined is None:
+            not_joined = await _shared_verdict(user_id, key)
+    if not_joined is None:
+        task = _inflight.get(user_id)
+        if task is None:
+            task = asyncio.ensure_future(_check(bot, user_id, channels, key))
+            _inflight[user_id] = task
+            task.add_done_callback(lambda _: _inflight.pop(user_id, None))
+        # shield — kutayotganlardan biri bekor qilinsa ham tekshiruv boshqalar uchun davom etadi
+        not_joined = await asyncio.shield(task)
+
+    missing = set(not_joined)
+    return not missing, [channel for channel in channels if channel.channel_id in missing]
 
 
 def get_join_keyboard(channels: list) -> InlineKeyboardMarkup:
@@ -0,0 +1,307 @@
+"""Bildirishnomalar outbox'i dispatcher'i — `outbox_messages` dan Telegram'ga.
+
+O'quvchi topshirganda egasi va kuzatuvchi adminlarga xabarlar to'g'ridan-to'g'ri
+yuborilmaydi: ular jadvalga yoziladi (services.queue_result_notifications),
+o'quvchining so'rovi esa darhol tugaydi. Bot jarayonidagi shu dispatcher:
+
+- umumiy token bucket (OUTBOX_RATE_PER_SEC xabar/s) va har chat uchun minimal
+  oraliq (OUTBOX_CHAT_INTERVAL_MS) bilan yuboradi;
+- `RetryAfter` da hamma yuborishni aytilgan vaqtga to'xtatadi, xabarlar
+  keyinroq qayta olinadi; vaqtinchalik xatoda OUTBOX_MAX_ATTEMPTS gacha
+  kechiktirib qayta urinadi, chat yopiq/topilmasa xabarni tashlaydi;
+- bitta chatga bitta guruhdan (`result:<test_id>`) xabar yuborilgach,
+  OUTBOX_COALESCE_SECONDS ichida kelganlarini yig'ib bitta xulosa yuboradi
+  ("57-test: 12 ta yangi natija").
+
+API ham shu jadvalga yozadi — dispatcher uni OUTBOX_POLL_MS da bir tekshiradi;
+bot ichidagi handlerlar esa `wake()` bilan darhol uyg'otadi.
+"""
+import asyncio
+import json
+import logging
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from html import escape
+from typing import Dict, List, Optional, Tuple
+
+from telegram.error import BadRequest, Forbidden, RetryAfter, TelegramError
+
+from config import (
+    OUTBOX_CHAT_INTERVAL_MS, OUTBOX_COALESCE_SECONDS, OUTBOX_MAX_ATTEMPTS,
+    OUTBOX_POLL_MS, OUTBOX_RATE_PER_SEC,
+)
+from database import OutboxMessage, write_queue
+
+logger = logging.getLogger(__name__)
+
+# Bir aylanishda o'qiladigan xabarlar chegarasi
+_FETCH_LIMIT = 500
+# Xulosada ko'rsatiladigan natijalar soni
+_SUMMARY_LINES = 15
+
+_wake_event: Optional[asyncio.Event] = None
+_limiter: Optional["TokenBucket"] = None
+_counters = {"sent": 0, "coalesced": 0, "retried": 0, "dropped": 0, "retry_after": 0}
+
+
+def wake():
+    """Yangi xabar yozilganini dispatcher'ga bildirish (shu jarayon ichidan)."""
+    if _wake_event is not None:
+        _wake_event.set()
+
+
+def snapshot() -> Dict[str, int]:
+    """Yuborish hisoblagichlari (admin /jobs uchun)."""
+    return dict(_counters, pending=OutboxMessage.select().count())
+
+
+class TokenBucket:
+    """Umumiy tezlik cheklovi; RetryAfter'da butunlay to'xtatib turiladi.
+
+    `acquire(background=True)` (broadcast) token'ni faqat oddiy yuboruvchilar
+    (outbox, fanout) kutmayotganda oladi: bildirishnomalar bo'lmasa broadcast
+    to'liq tezlikda ketadi, paydo bo'lsa keyingi token ularga beriladi.
+    """
+
+    def __init__(self, rate: float):
+        self.rate = rate
+        self.capacity = rate
+        self.tokens = rate
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._waiting = 0  # token kutayotgan ustuvor (background=False) yuboruvchilar
+
+    def set_rate(self, rate: float):
+        self.rate = rate
+        self.capacity = rate
+        self.tokens = min(self.tokens, rate)
+
+    def pause(self, seconds: float):
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        self.tokens = 0.0
+
+    async def acquire(self, background: bool = False):
+        if not background:
+            self._waiting += 1
+        try:
+            while True:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    await asyncio.sleep(self.paused_until - now)
+                    continue
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1 and not (background and self._waiting):
+                    self.tokens -= 1
+                    return
+                # Token bor-u ustuvorlar kutmoqda — ular olguncha qisqa kutish
+                await asyncio.sleep((1 - self.tokens if self.tokens < 1 else 0.5) / self.rate)
+        finally:
+            if not background:
+                self._waiting -= 1
+
+
+def rate_limiter() -> TokenBucket:
+    """Bot jarayonidagi barcha ommaviy yuborishlar uchun umumiy token bucket.
+
+    Outbox dispatcher'i va fanout.py bitta chegarani bo'lishadi — Telegram'ning
+    umumiy limiti bot bo'yicha, yuboruvchi bo'yicha emas.
+    """
+    global _limiter
+    if _limiter is None:
+        _limiter = TokenBucket(OUTBOX_RATE_PER_SEC)
+    return _limiter
+
+
+def retry_after_seconds(exc: RetryAfter) -> float:
+    value = exc.retry_after
+    return value.total_seconds() if isinstance(value, timedelta) else float(value)
+
+
+def _summary_text(items: List[OutboxMessage]) -> str:
+    """Bir testning bir nechta yangi natijasi — bitta xabar."""
+    payloads = [json.loads(item.payload) for item in items]
+    first = payloads[0]
+    title = "🔔 <b>Kuzatuv: yangi natijalar</b>" if first.get("watch") else "📢 <b>Yangi natijalar</b>"
+    lines = [
+        title,
+        "",
+        f"📝 Test: <code>{first['test_id']}</code> — {len(payloads)} ta yangi natija",
+        "",
+    ]
+    for p in payloads[:_SUMMARY_LINES]:
+        lines.append(f"👤 {escape(p['who'])}: {p['correct']}/{p['total']} ({p['percentage']}%)")
+    if len(payloads) > _SUMMARY_LINES:
+        lines.append(f"… va yana {len(payloads) - _SUMMARY_LINES} ta")
+    return "\n".join(lines)
+
+
+# ─────────────────────────── DB amallari ───────────────────────────
+
+def _due_messages() -> List[OutboxMessage]:
+    return list(
+        OutboxMessage.select()
+        .where(OutboxMessage.available_at <= datetime.now())
+        .order_by(OutboxMessage.id)
+        .limit(_FETCH_LIMIT)
+    )
+
+
+def _apply(done: List[int], postpone: Dict[int, datetime], failed: Dict[int, datetime]):
+    """Yuborilganlarni o'chirish, kechiktirilganlar/xatolar vaqtini surish (write_queue'da)."""
+    if done:
+        OutboxMessage.delete().where(OutboxMessage.id.in_(done)).execute()
+    for until, ids in _by_time(postpone).items():
+        OutboxMessage.update(available_at=until).where(OutboxMessage.id.in_(ids)).execute()
+    for until, ids in _by_time(failed).items():
+        (OutboxMessage
+         .update(available_at=until, attempts=OutboxMessage.attempts + 1)
+         .where(OutboxMessage.id.in_(ids))
+         .execute())
+
+
+def _by_time(mapping: Dict[int, datetime]) -> Dict[datetime, List[int]]:
+    grouped: Dict[datetime, List[int]] = {}
+    for msg_id, until in mapping.items():
+        grouped.setdefault(until, []).append(msg_id)
+    return grouped
+
+
+# ─────────────────────────── dispatcher ───────────────────────────
+
+class Dispatcher:
+    """Outbox'ni o'qib, cheklovlar bilan yuboruvchi fon vazifasi."""
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.bucket = rate_limiter()
+        self.chat_interval = OUTBOX_CHAT_INTERVAL_MS / 1000
+        self.window = OUTBOX_COALESCE_SECONDS
+        # chat_id -> keyingi xabar mumkin bo'lgan vaqt (monotonic); oraliq doimiy,
+        # shuning uchun eng eskisi boshida — muddati o'tganlari boshidan o'chiriladi
+        self._chat_next: "OrderedDict[int, float]" = OrderedDict()
+        # (chat_id, group_key) -> oxirgi yuborilgan vaqt (monotonic)
+        self._group_sent: "OrderedDict[Tuple[int, str], float]" = OrderedDict()
+
+    async def run(self):
+        global _wake_event
+        _wake_event = asyncio.Event()
+        logger.info("Outbox dispatcher ishga tushdi (%s xabar/s)", OUTBOX_RATE_PER_SEC)
+        while True:
+            try:
+                delay = await self._cycle()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Outbox aylanishida xatolik")
+                delay = OUTBOX_POLL_MS / 1000
+            try:
+                await asyncio.wait_for(_wake_event.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+            _wake_event.clear()
+
+    async def _cycle(self) -> float:
+        """Bir aylanish: navbatdagilarni yuborish. Keyingi tekshiruvgacha kutish qaytadi."""
+        rows = _due_messages()
+        if not rows:
+            return OUTBOX_POLL_MS / 1000
+
+        groups: "OrderedDict[Tuple[int, str], List[OutboxMessage]]" = OrderedDict()
+        for row in rows:
+            key = (row.chat_id, row.group_key or f"#{row.id}")
+            groups.setdefault(key, []).append(row)
+
+        now_mono = time.monotonic()
+        now = datetime.now()
+        postpone: Dict[int, datetime] = {}
+        sends = []
+        busy_chats = set()
+        throttled = False
+        for (chat_id, group_key), items in groups.items():
+            if items[0].group_key and self.window:
+                sent_at = self._group_sent.get((chat_id, group_key))
+                if sent_at is not None and now_mono - sent_at < self.window:
+                    # Oynadagi natijalar yig'iladi — oyna tugaganda bitta xulosa
+                    remaining = self.window - (now_mono - sent_at) + 0.1
+                    until = now + timedelta(seconds=remaining)
+                    postpone.update((item.id, until) for item in items)
+                    continue
+            if chat_id in busy_chats or self._chat_next.get(chat_id, 0.0) > now_mono:
+                throttled = True  # shu chatga keyingi aylanishda
+                continue
+            busy_chats.add(chat_id)
+            sends.append(((chat_id, group_key), items))
+
+        done: List[int] = []
+        failed: Dict[int, datetime] = {}
+        for sent, later, retry in await asyncio.gather(
+            *(self._deliver(key, items) for key, items in sends)
+        ):
+            done.extend(sent)
+            postpone.update(later)
+            failed.update(retry)
+        if done or postpone or failed:
+            await write_queue.submit(_apply, done, postpone, failed)
+
+        if throttled:
+            return max(self.chat_interval, 0.05)
+        return 0.0 if len(rows) == _FETCH_LIMIT else OUTBOX_POLL_MS / 1000
+
+    async def _deliver(self, key: Tuple[int, str], items: List[OutboxMessage]):
+        """Bitta chatga bitta (yoki xulosa) xabar.
+
+        Returns:
+            (o'chiriladigan id'lar, {id: keyinroq}, {id: xatodan keyin qayta})
+        """
+        chat_id, group_key = key
+        ids = [item.id for item in items]
+        text = items[0].text if len(items) == 1 else _summary_text(items)
+
+        await self.bucket.acquire()
+        now_mono = time.monotonic()
+        self._chat_next[chat_id] = now_mono + self.chat_interval
+        self._chat_next.move_to_end(chat_id)
+        while self._chat_next and next(iter(self._chat_next.values())) <= now_mono:
+            self._chat_next.popitem(last=False)
+        try:
+            await self.bot.send_message(chat_id=chat_id, text=text, parse_mode="HTML")
+        except RetryAfter as exc:
+            # Telegram tezlikni kamaytirishni so'radi — urinish hisoblanmaydi
+            seconds = retry_after_seconds(exc)
+            _counters["retry_after"] += 1
+            logger.warning("Outbox: RetryAfter %.0fs (chat=%s)", seconds, chat_id)
+            self.bucket.pause(seconds)
+            until = datetime.now() + timedelta(seconds=seconds)
+            return [], {msg_id: until for msg_id in ids}, {}
+        except (Forbidden, BadRequest) as exc:
+            # Bot bloklangan / chat topilmadi — qayta urinish foydasiz
+            _counters["dropped"] += len(ids)
+            logger.info("Outbox: xabar tashlandi (chat=%s): %s", chat_id, exc)
+            return ids, {}, {}
+        except TelegramError as exc:
+            drop, retry = self._failed(items, exc)
+            return drop, {}, retry
+
+        _counters["sent"] += 1
+        _counters["coalesced"] += len(ids) - 1
+        if items[0].group_key:
+            self._group_sent[key] = time.monotonic()
+            self._group_sent.move_to_end(key)
+            while len(self._group_sent) > 10000:
+                self._group_sent.popitem(last=False)
+        return ids, {}, {}
+
+    def _failed(self, items: List[OutboxMessage], exc: Exception):
+        drop, retry = [], {}
+        for item in items:
+            if item.attempts + 1 >= OUTBOX_MAX_ATTEMPTS:
+                drop.append(item.id)
+            else:
+                retry[item.id] = datetime.now() + timedelta(seconds=2 ** (item.attempts + 1))
+        _counters["retried"] += len(retry)
+        _counters["dropped"] += len(drop)
+        logger.warning("Outbox: yuborilmadi (chat=%s, %s): %s", items[0].chat_id,
+                       "qayta urinadi" if retry else "tashlandi", exc)
+        return drop, retry
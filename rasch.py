@@ -0,0 +1,288 @@
+"""Rash (1PL) modeli uchun NumPy dvigatellari.
+
+`utils._fit_rasch_jmle` — sof Python'dagi etalon (reference) implementatsiya.
+Bu yerdagi dvigatel xuddi shu algoritmni bajaradi (avval barcha theta, keyin
+barcha beta Nyuton qadami, ±1 qadam cheki, ±6 chegarasi, har iteratsiyada
+beta o'rtachasini 0 ga markazlash, max_change < tol da to'xtash), lekin har
+yarim-qadam matritsa amali bilan bajariladi. Bir xil xom balli ishtirokchilar
+bitta guruhga yig'iladi, shuning uchun iteratsiya narxi ishtirokchilar soniga
+emas, itemlar soniga bog'liq.
+
+`fit_cmle` — muqobil shartli ML (CMLE) dvigateli: qiyinliklar xom ball
+bo'yicha shartli ehtimollikdan baholanadi va item standart xatolari ham
+qaytariladi.
+"""
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+_BOUND = 6.0       # logit chegarasi (±6)
+_MAX_STEP = 1.0    # bitta Nyuton qadamining cheki
+_MIN_INFO = 1e-9   # axborot shundan kichik bo'lsa qadam qo'yilmaydi
+
+
+def _sigmoid(x: np.ndarray) -> np.ndarray:
+    """Vektorlashgan sigmoid (qiymatlar ±12 oralig'ida — overflow yo'q)."""
+    return 1.0 / (1.0 + np.exp(-x))
+
+
+def score_groups(x: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Ishtirokchilarni xom ball bo'yicha guruhlash.
+
+    Dichotomous Rash modelida xom ball — qobiliyat uchun yetarli statistika:
+    bir xil ballli ishtirokchilar bir xil theta oladi. Guruhlar soni ko'pi
+    bilan items + 1 ta.
+
+    Returns:
+        (scores, counts, inverse) — har guruh bali, undagi ishtirokchilar soni
+        va har bir ishtirokchining guruh indeksi.
+    """
+    person_raw = x.sum(axis=1)
+    scores, inverse, counts = np.unique(person_raw, return_inverse=True, return_counts=True)
+    return scores.astype(np.float64), counts.astype(np.float64), inverse
+
+
+def fit_jmle_grouped(
+    scores: np.ndarray,
+    counts: np.ndarray,
+    item_raw: np.ndarray,
+    max_iter: int = 250,
+    tol: float = 1e-4,
+) -> Tuple[np.ndarray, np.ndarray, bool]:
+    """
+    Ball guruhlari ustida JMLE: person qadami O(guruhlar × items) — ishtirokchilar
+    soniga bog'liq emas.
+
+    Args:
+        scores: har guruhning xom bali
+        counts: har guruhdagi ishtirokchilar soni
+        item_raw: har item bo'yicha to'g'ri javoblar soni (barcha ishtirokchilar)
+
+    Returns:
+        (group_thetas, item_difficulties, converged)
+    """
+    num_items = len(item_raw)
+    num_persons = float(counts.sum())
+
+    # Boshlang'ich nuqta: 0/100 holatlarda cheksizlikdan qochish uchun 0.5 correction
+    p = (scores + 0.5) / (num_items + 1.0)
+    thetas = np.log(p / (1.0 - p))
+    p = (item_raw + 0.5) / (num_persons + 1.0)
+    betas = -np.log(p / (1.0 - p))
+
+    converged = False
+
+    for _ in range(max_iter):
+        # Person ability (theta) update — betalar o'zgarmaydi, barcha guruhlar mustaqil
+        probs = _sigmoid(thetas[:, None] - betas[None, :])
+        score = scores - probs.sum(axis=1)
+        info = (probs * (1.0 - probs)).sum(axis=1)
+        active = info >= _MIN_INFO
+        delta = np.clip(np.divide(score, info, out=np.zeros_like(score), where=active),
+                        -_MAX_STEP, _MAX_STEP)
+        updated = np.clip(thetas + delta, -_BOUND, _BOUND)
+        updated = np.where(active, updated, thetas)
+        max_change = float(np.abs(updated - thetas).max())
+        thetas = updated
+
+        # Item difficulty (beta) update — guruh hajmlari bilan tortilgan yig'indilar
+        probs = _sigmoid(thetas[:, None] - betas[None, :])
+        score = item_raw - counts @ probs
+        info = counts @ (probs * (1.0 - probs))
+        active = info >= _MIN_INFO
+        delta = np.clip(np.divide(score, info, out=np.zeros_like(score), where=active),
+                        -_MAX_STEP, _MAX_STEP)
+        # beta uchun yo'nalish teskari: dL/dbeta = -(x - p)
+        updated = np.clip(betas - delta, -_BOUND, _BOUND)
+        updated = np.where(active, updated, betas)
+        max_change = max(max_change, float(np.abs(updated - betas).max()))
+        betas = updated
+
+        # Identifiability: item qiyinliklar o'rtachasi 0 bo'lsin (±6 chegarada qolib)
+        center = float(betas.mean())
+        if abs(center) > 1e-12:
+            betas = np.clip(betas - center, -_BOUND, _BOUND)
+            thetas = np.clip(thetas - center, -_BOUND, _BOUND)
+
+        if max_change < tol:
+            converged = True
+            break
+
+    return thetas, betas, converged
+
+
+def fit_jmle(
+    response_matrix: Sequence[Sequence[int]],
+    max_iter: int = 250,
+    tol: float = 1e-4,
+) -> Tuple[List[float], List[float], bool]:
+    """
+    Dichotomous Rasch (1PL) uchun JMLE — NumPy varianti.
+
+    Ishtirokchilar xom ball guruhlariga yig'iladi, model guruhlar ustida
+    baholanadi va thetalar har bir ishtirokchiga qaytariladi. Natija
+    `utils._fit_rasch_jmle` bilan bir xil (float xatoligi doirasida).
+
+    Returns:
+        (person_thetas, item_difficulties, converged)
+    """
+    x = np.asarray(response_matrix, dtype=np.float64)
+    if x.ndim != 2 or x.shape[0] == 0 or x.shape[1] == 0:
+        return [], [], False
+
+    scores, counts, inverse = score_groups(x)
+    group_thetas, betas, converged = fit_jmle_grouped(
+        scores, counts, x.sum(axis=0), max_iter=max_iter, tol=tol
+    )
+    return group_thetas[inverse].tolist(), betas.tolist(), converged
+
+
+def item_standard_errors(
+    person_thetas: Sequence[float],
+    item_difficulties: Sequence[float],
+) -> List[Optional[float]]:
+    """JMLE item qiyinliklari uchun standart xatolar: SE_j = 1 / sqrt(I_j).
+
+    Axborot I_j = Σ p(1 - p) faqat har xil theta qiymatlari ustida (guruh
+    hajmi bilan tortilib) hisoblanadi. Axborot yo'q itemda None qaytadi.
+    """
+    if not person_thetas or not item_difficulties:
+        return []
+    thetas, counts = np.unique(np.asarray(person_thetas, dtype=np.float64), return_counts=True)
+    betas = np.asarray(item_difficulties, dtype=np.float64)
+    probs = _sigmoid(thetas[:, None] - betas[None, :])
+    info = counts.astype(np.float64) @ (probs * (1.0 - probs))
+    return [float(1.0 / np.sqrt(v)) if v >= _MIN_INFO else None for v in info]
+
+
+# ─────────────────────────── CMLE (shartli ML) ───────────────────────────
+
+def _log_esf(log_eps: np.ndarray) -> np.ndarray:
+    """Elementar simmetrik funksiyalar logarifmi: log γ_0 .. log γ_L.
+
+    γ_r — r ta itemni to'g'ri yechish kombinatsiyalari bo'yicha Π ε yig'indisi.
+    Log sohada hisoblanadi — uzun testlarda ham overflow bo'lmaydi.
+    """
+    num_items = len(log_eps)
+    lg = np.full(num_items + 1, -np.inf)
+    lg[0] = 0.0
+    for k, le in enumerate(log_eps):
+        lg[1:k + 2] = np.logaddexp(lg[1:k + 2], lg[:k + 1] + le)
+    return lg
+
+
+def _log_esf_without_each(log_eps: np.ndarray) -> np.ndarray:
+    """Har bir i-itemsiz ESF'lar: qator i = log γ^(i)_0 .. log γ^(i)_{L-1}."""
+    num_items = len(log_eps)
+    lg = np.full((num_items, num_items), -np.inf)
+    lg[:, 0] = 0.0
+    rows = np.arange(num_items)
+    for k, le in enumerate(log_eps):
+        keep = rows != k
+        lg[keep, 1:] = np.logaddexp(lg[keep, 1:], lg[keep, :-1] + le)
+    return lg
+
+
+def _conditional_probs(betas: np.ndarray, scores: np.ndarray) -> np.ndarray:
+    """P(x_i = 1 | xom ball r) — har bir (ball guruhi, item) uchun, 0 < r < L."""
+    log_eps = -betas
+    lg = _log_esf(log_eps)
+    lg_wo = _log_esf_without_each(log_eps)
+    r = scores.astype(np.int64)
+    return np.exp(log_eps[None, :] + lg_wo[:, r - 1].T - lg[r][:, None])
+
+
+def _thetas_for_scores(
+    scores: np.ndarray,
+    betas: np.ndarray,
+    max_iter: int = 250,
+    tol: float = 1e-4,
+) -> np.ndarray:
+    """Berilgan item qiyinliklarida har bir xom ball uchun ML theta.
+
+    JMLE'dagi kabi ±1 qadam va ±6 chegarasi — 0 va maksimal ballar chegaraga boradi.
+    """
+    num_items = len(betas)
+    p = (scores + 0.5) / (num_items + 1.0)
+    thetas = np.log(p / (1.0 - p))
+    for _ in range(max_iter):
+        probs = _sigmoid(thetas[:, None] - betas[None, :])
+        score = scores - probs.sum(axis=1)
+        info = (probs * (1.0 - probs)).sum(axis=1)
+        active = info >= _MIN_INFO
+        delta = np.clip(np.divide(score, info, out=np.zeros_like(score), where=active),
+                        -_MAX_STEP, _MAX_STEP)
+        updated = np.where(active, np.clip(thetas + delta, -_BOUND, _BOUND), thetas)
+        change = float(np.abs(updated - thetas).max())
+        thetas = updated
+        if change < tol:
+            break
+    return thetas
+
+
+def fit_cmle(
+    response_matrix: Sequence[Sequence[int]],
+    max_iter: int = 250,
+    tol: float = 1e-4,
+) -> Tuple[List[float], List[float], bool, List[Optional[float]]]:
+    """
+    Dichotomous Rasch (1PL) uchun shartli maksimal o'xshashlik (CMLE).
+
+    Item qiyinliklari xom ball bo'yicha shartli ehtimollikdan (elementar
+    simmetrik funksiyalar orqali) baholanadi — thetalar tenglamadan chiqib
+    ketadi, shuning uchun qisqa testlardagi JMLE siljishi (bias) bo'lmaydi.
+    Narx ishtirokchilar soniga emas, itemlar soni va ball taqsimotiga bog'liq.
+    0 va maksimal ballar qiyinlik baholashda axborot bermaydi (chiqarib
+    tashlanadi). Thetalar yakuniy qiyinliklar bo'yicha har bir ball uchun ML.
+
+    Returns:
+        (person_thetas, item_difficulties, converged, item_standard_errors)
+    """
+    x = np.asarray(response_matrix, dtype=np.float64)
+    if x.ndim != 2 or x.shape[0] == 0 or x.shape[1] == 0:
+        return [], [], False, []
+
+    num_items = x.shape[1]
+    scores, counts, inverse = score_groups(x)
+    informative = (scores > 0) & (scores < num_items)
+    if not informative.any():
+        # Hamma 0 yoki hamma maksimal — shartli model aniqlanmaydi
+        thetas, betas, converged = fit_jmle(x)
+        return thetas, betas, converged, item_standard_errors(thetas, betas)
+
+    inf_scores = scores[informative]
+    inf_counts = counts[informative]
+    mask = informative[inverse]
+    item_raw = x[mask].sum(axis=0)
+    num_persons = float(inf_counts.sum())
+
+    p = (item_raw + 0.5) / (num_persons + 1.0)
+    betas = -np.log(p / (1.0 - p))
+    betas = np.clip(betas - betas.mean(), -_BOUND, _BOUND)
+
+    converged = False
+    info = np.zeros(num_items)
+    for _ in range(max_iter):
+        probs = _conditional_probs(betas, inf_scores)
+        expected = inf_counts @ probs
+        info = inf_counts @ (probs * (1.0 - probs))
+        active = info >= _MIN_INFO
+        # Kutilgan to'g'ri javoblar kuzatilgandan ko'p bo'lsa — item qiyinroq
+        delta = np.clip(np.divide(expected - item_raw, info, out=np.zeros_like(info), where=active),
+                        -_MAX_STEP, _MAX_STEP)
+        updated = np.where(active, np.clip(betas + delta, -_BOUND, _BOUND), betas)
+        center = float(updated.mean())
+        if abs(center) > 1e-12:
+            updated = np.clip(updated - center, -_BOUND, _BOUND)
+        max_change = float(np.abs(updated - betas).max())
+        betas = updated
+        if max_change < tol:
+            converged = True
+            break
+
+    probs = _conditional_probs(betas, inf_scores)
+    info = inf_counts @ (probs * (1.0 - probs))
+    item_se = [float(1.0 / np.sqrt(v)) if v >= _MIN_INFO else None for v in info]
+
+    group_thetas = _thetas_for_scores(scores, betas, max_iter=max_iter, tol=tol)
+    return group_thetas[inverse].tolist(), betas.tolist(), converged, item_se
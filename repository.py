@@ -0,0 +1,64 @@
+"""Bog'langan qatorlari bilan birga o'qiladigan so'rovlar (N+1 siz).
+
+Peewee'da `sub.user` yoki `test.creator` ga murojaat qilinganda, bog'langan
+qator oldindan o'qilmagan bo'lsa, har qator uchun alohida SELECT ketadi. Bu
+yerdagi yordamchilar bog'langan jadvalni JOIN orqali shu so'rovning o'zida
+oladi — qatorlar soni qancha bo'lmasin, so'rovlar soni o'zgarmaydi.
+
+Tekshiruv: scripts/check_query_counts.py
+"""
+from typing import List
+
+from database import AdminTestWatch, Test, TestSubmission, User
+
+
+def test_submissions(test) -> List[TestSubmission]:
+    """Testning topshiriqlari, har biri `.user` bilan."""
+    return list(
+        TestSubmission.select(TestSubmission, User)
+        .join(User)
+        .where(TestSubmission.test == test)
+    )
+
+
+def user_submissions(user) -> List[TestSubmission]:
+    """Foydalanuvchi topshiriqlari (yangisi birinchi), har biri `.test` bilan."""
+    return list(
+        TestSubmission.select(TestSubmission, Test)
+        .join(Test)
+        .where(TestSubmission.user == user)
+        .order_by(TestSubmission.submitted_at.desc())
+    )
+
+
+def test_watchers(test) -> List[AdminTestWatch]:
+    """Testni kuzatayotgan adminlar, har biri `.admin` bilan."""
+    return list(
+        AdminTestWatch.select(AdminTestWatch, User)
+        .join(User)
+        .where(AdminTestWatch.test == test)
+    )
+
+
+def active_tests_with_creator() -> List[Test]:
+    """Faol testlar (yangisi birinchi), har biri `.creator` bilan."""
+    return list(
+        Test.select(Test, User)
+        .join(User)
+        .where(Test.is_active == True)  # noqa: E712
+        .order_by(Test.created_at.desc())
+    )
+
+
+def test_submissions_after(test, after_id: int, limit: int) -> List[TestSubmission]:
+    """Testning `after_id` dan keyingi topshiriqlari (id tartibida), `.user` bilan.
+
+    Keyset sahifalash — fanout.py shu bilan bo'laklab yuradi.
+    """
+    return list(
+        TestSubmission.select(TestSubmission, User)
+        .join(User)
+        .where((TestSubmission.test == test) & (TestSubmission.id > after_id))
+        .order_by(TestSubmission.id)
+        .limit(limit)
+    )
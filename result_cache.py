@@ -0,0 +1,167 @@
+"""Yakunlangan testlar natijalari uchun disk keshi.
+
+Test yakunlangach (`is_active=False`, `ended_at` bor) uning natijalari boshqa
+o'zgarmaydi, shuning uchun statistika, Rash natijasi, Excel/PDF/grafik fayllari
+va Telegram qaytargan file_id'lar bir marta hisoblanib, shu yerda saqlanadi.
+
+Kalit — (test_id, ended_at, tur) dan olingan xesh: test qayta ochilib yana
+yakunlansa, ended_at o'zgaradi va eski yozuvlar o'z-o'zidan ishlatilmaydi.
+Rash'ga bog'liq yozuvlar kalitiga RASCH_ENGINE ham qo'shiladi.
+
+Fayllar atomik yoziladi (vaqtinchalik fayl + os.replace), shuning uchun kesh
+bot, jobs process'lari va API o'rtasida xavfsiz bo'lishadi. Umumiy hajm
+RESULT_CACHE_MAX_MB dan oshsa, eng uzoq vaqt o'qilmagan fayllar (mtime
+bo'yicha LRU) o'chiriladi.
+"""
+import hashlib
+import logging
+import os
+import pickle
+import tempfile
+from typing import Any, Callable, Optional, Tuple
+
+from config import RASCH_ENGINE, RESULT_CACHE_DIR, RESULT_CACHE_MAX_MB
+
+logger = logging.getLogger(__name__)
+
+# Saqlanadigan ma'lumot formati o'zgarsa oshiriladi — eski yozuvlar o'qilmaydi
+_VERSION = 1
+# Natijasi Rash dvigateliga bog'liq turlar
+_ENGINE_KINDS = {"stats", "rasch", "excel", "pdf"}
+
+
+def is_cacheable(test) -> bool:
+    """Faqat yakunlangan testlar keshlanadi (faol test natijasi hali o'zgaradi)."""
+    return RESULT_CACHE_MAX_MB > 0 and not test.is_active and test.ended_at is not None
+
+
+def _path(test, kind: str) -> str:
+    base_kind = kind.split(":", 1)[-1]
+    engine = RASCH_ENGINE if base_kind in _ENGINE_KINDS else ""
+    raw = f"{_VERSION}|{test.id}|{test.ended_at}|{kind}|{engine}"
+    digest = hashlib.blake2b(raw.encode("utf-8"), digest_size=16).hexdigest()
+    return os.path.join(RESULT_CACHE_DIR, f"{test.id}-{digest}")
+
+
+def has(test, kind: str) -> bool:
+    """Keshda yozuv bormi (faylni o'qimasdan)."""
+    return is_cacheable(test) and os.path.exists(_path(test, kind))
+
+
+def get_bytes(test, kind: str) -> Optional[bytes]:
+    """Keshdagi baytlar (yo'q bo'lsa None). O'qilgan fayl LRU uchun 'yangilanadi'."""
+    if not is_cacheable(test):
+        return None
+    path = _path(test, kind)
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+        os.utime(path)
+        return data
+    except FileNotFoundError:
+        return None
+    except OSError as e:
+        logger.warning("RESULT CACHE o'qib bo'lmadi: %s (%s)", path, e)
+        return None
+
+
+def put_bytes(test, kind: str, data: bytes):
+    """Baytlarni keshga atomik yozish (so'ng hajm chegarasini tekshirish)."""
+    if not is_cacheable(test) or data is None:
+        return
+    try:
+        os.makedirs(RESULT_CACHE_DIR, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=RESULT_CACHE_DIR, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, _path(test, kind))
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+    except OSError as e:
+        logger.warning("RESULT CACHE yozib bo'lmadi: test_id=%s kind=%s (%s)", test.id, kind, e)
+        return
+    _evict()
+
+
+def cached_bytes(test, kind: str, compute: Callable[[], Optional[bytes]]) -> Optional[bytes]:
+    """Keshdan olish, bo'lmasa `compute()` natijasini keshlab qaytarish."""
+    data = get_bytes(test, kind)
+    if data is not None:
+        return data
+    data = compute()
+    if data is not None:
+        put_bytes(test, kind, data)
+    return data
+
+
+def cached_object(test, kind: str, compute: Callable[[], Any]) -> Any:
+    """`cached_bytes` ning Python obyektlari (stats/Rash dict) uchun varianti."""
+    data = get_bytes(test, kind)
+    if data is not None:
+        try:
+            return pickle.loads(data)
+        except Exception:
+            logger.warning("RESULT CACHE buzilgan yozuv: test_id=%s kind=%s", test.id, kind)
+    value = compute()
+    put_bytes(test, kind, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+    return value
+
+
+def get_file_id(test, fmt: str) -> Optional[str]:
+    """Avval yuborilgan eksport faylining Telegram file_id'si."""
+    data = get_bytes(test, f"file_id:{fmt}")
+    return data.decode("utf-8") if data else None
+
+
+def set_file_id(test, fmt: str, file_id: Optional[str]):
+    if file_id:
+        put_bytes(test, f"file_id:{fmt}", file_id.encode("utf-8"))
+
+
+def forget_file_id(test, fmt: str):
+    """Telegram file_id'ni qabul qilmasa (eskirgan) — o'chirib, qayta yuklashga o'tish."""
+    if not is_cacheable(test):
+        return
+    try:
+        os.remove(_path(test, f"file_id:{fmt}"))
+    except OSError:
+        pass
+
+
+def _entries() -> list:
+    entries = []
+    try:
+        with os.scandir(RESULT_CACHE_DIR) as it:
+            for entry in it:
+                if entry.is_file() and not entry.name.startswith(".tmp-"):
+                    st = entry.stat()
+                    entries.append((st.st_mtime, st.st_size, entry.path))
+    except FileNotFoundError:
+        pass
+    return entries
+
+
+def usage() -> Tuple[int, int]:
+    """(fayllar soni, umumiy hajm baytda)."""
+    entries = _entries()
+    return len(entries), sum(size for _, size, _ in entries)
+
+
+def _evict():
+    """Umumiy hajm chegaradan oshsa, eng eski (mtime) fayllarni o'chirish."""
+    limit = RESULT_CACHE_MAX_MB * 1024 * 1024
+    entries = _entries()
+    total = sum(size for _, size, _ in entries)
+    if total <= limit:
+        return
+    for _, size, path in sorted(entries):
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= size
+        if total <= limit:
+            break
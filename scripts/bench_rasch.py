@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""Rash dvigatellari uchun benchmark (botga ulanmagan).
+
+Sof Python etalon (`utils._fit_rasch_jmle`), NumPy JMLE (`rasch.fit_jmle`) va
+CMLE (`rasch.fit_cmle`) sintetik javoblar matritsasida o'lchanadi. JMLE uchun
+etalondan farq, CMLE uchun esa generatsiyadagi haqiqiy qiyinliklardan eng
+katta og'ish (JMLE bilan yonma-yon) chop etiladi.
+
+Ishlatish:
+    python scripts/bench_rasch.py
+    python scripts/bench_rasch.py --persons 100 1000 --items 55
+    python scripts/bench_rasch.py --reference-limit 0   # etalonni o'tkazib yuborish
+
+Katta to'plamlarda etalon daqiqalab ishlaydi, shuning uchun u faqat
+--reference-limit dan oshmagan ishtirokchilar soni uchun ishga tushiriladi.
+"""
+import argparse
+import math
+import os
+import random
+import sys
+import time
+
+# Loyiha ildizini import yo'liga qo'shish (skript scripts/ ichida)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import rasch  # noqa: E402
+from utils import _fit_rasch_jmle  # noqa: E402
+
+
+def _synthetic_matrix(num_persons: int, num_items: int, seed: int) -> tuple:
+    """Rash modelidan generatsiya qilingan 0/1 javoblar matritsasi va qiyinliklar."""
+    rng = random.Random(seed)
+    betas = [rng.gauss(0.0, 1.2) for _ in range(num_items)]
+    mean = sum(betas) / num_items
+    betas = [b - mean for b in betas]
+    matrix = []
+    for _ in range(num_persons):
+        theta = rng.gauss(0.0, 1.0)
+        matrix.append([
+            1 if rng.random() < 1.0 / (1.0 + math.exp(-(theta - b))) else 0
+            for b in betas
+        ])
+    return matrix, betas
+
+
+def _max_error(estimates: list, truth: list) -> float:
+    return max(abs(a - b) for a, b in zip(estimates, truth))
+
+
+def _timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Rash dvigatellari benchmark")
+    parser.add_argument("--persons", type=int, nargs="+", default=[100, 1000, 10000, 50000])
+    parser.add_argument("--items", type=int, default=55)
+    parser.add_argument("--seed", type=int, default=20260330)
+    parser.add_argument("--reference-limit", type=int, default=10000,
+                        help="Etalon shu sondan ko'p ishtirokchida ishga tushirilmaydi")
+    args = parser.parse_args()
+
+    print(f"📐 Rash benchmark — {args.items} ta item\n")
+    print(f"{'persons':>8} | {'python, s':>10} | {'numpy, s':>9} | {'tezlanish':>9} | {'max farq':>8} "
+          f"| {'cmle, s':>8} | xato jmle/cmle")
+    print("-" * 92)
+
+    for n in args.persons:
+        matrix, true_betas = _synthetic_matrix(n, args.items, args.seed + n)
+        (np_thetas, np_betas, _), np_time = _timed(rasch.fit_jmle, matrix)
+        (_, cm_betas, _, _), cm_time = _timed(rasch.fit_cmle, matrix)
+        errors = f"{_max_error(np_betas, true_betas):.3f}/{_max_error(cm_betas, true_betas):.3f}"
+
+        if n <= args.reference_limit:
+            (py_thetas, py_betas, _), py_time = _timed(_fit_rasch_jmle, matrix)
+            diff = max(abs(a - b) for a, b in zip(np_thetas + np_betas, py_thetas + py_betas))
+            print(f"{n:>8} | {py_time:>10.3f} | {np_time:>9.3f} | {py_time / np_time:>8.1f}x | {diff:>8.1e} "
+                  f"| {cm_time:>8.3f} | {errors}")
+        else:
+            print(f"{n:>8} | {'—':>10} | {np_time:>9.3f} | {'—':>9} | {'—':>8} | {cm_time:>8.3f} | {errors}")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
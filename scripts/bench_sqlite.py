@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""SQLite PRAGMA profillarini sintetik imtihon yuklamasida solishtirish.
+
+Har profil alohida process'da (config env'dan o'qiladi) vaqtinchalik bazada
+ishga tushadi. Imtihon boshlangandagi kabi yuklama takrorlanadi: --students ta
+talaba bir vaqtda, --concurrency ta parallel, testni ochadi (takroriy topshiriq
+tekshiruvi), javobni topshiradi (services.record_submission — bot va API'dagi
+kabi database.write_queue orqali) va natijalarni o'qiydi. Har topshiriq
+kechikishi (navbat + commit) va umumiy o'tkazuvchanlik chop etiladi.
+
+Ishchi baza ishlatilmaydi. Natija diskka bog'liq — o'z serveringizda ishga
+tushiring va mos profilni .env'ga yozing.
+
+Ishlatish:
+    python scripts/bench_sqlite.py
+    python scripts/bench_sqlite.py --students 2000 --concurrency 200 --items 55
+    python scripts/bench_sqlite.py --profiles baseline default
+    python scripts/bench_sqlite.py --custom SQLITE_SYNCHRONOUS=full SQLITE_MMAP_SIZE_MB=0
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+# Profil — config.py'dagi SQLITE_* o'zgaruvchilari (berilmaganlari default)
+PROFILES = {
+    # Oldingi holat: faqat WAL + busy_timeout (SQLite default'lari)
+    "baseline": {
+        "SQLITE_SYNCHRONOUS": "full",
+        "SQLITE_CACHE_SIZE_KB": "2000",
+        "SQLITE_MMAP_SIZE_MB": "0",
+        "SQLITE_TEMP_STORE": "default",
+        "SQLITE_WAL_AUTOCHECKPOINT": "1000",
+    },
+    "default": {},
+    # Xotirasi ko'p server uchun
+    "large": {
+        "SQLITE_CACHE_SIZE_KB": "65536",
+        "SQLITE_MMAP_SIZE_MB": "512",
+        "SQLITE_WAL_AUTOCHECKPOINT": "4000",
+    },
+}
+
+
+def _percentile(values: list, pct: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct))]
+
+
+async def _burst(args) -> dict:
+    from database import Test, TestSubmission, User, db, init_db, optimize_db, write_queue
+    import services
+    from utils import check_answers
+
+    init_db()
+    rnd = random.Random(args.seed)
+    key = "".join(rnd.choice("abcd") for _ in range(args.items))
+    with db.atomic():
+        owner = User.create(telegram_id=1, full_name="Owner")
+        test = Test.create(correct_answers=key, creator=owner)
+        students = [User.create(telegram_id=1000 + i, full_name=f"Student {i}")
+                    for i in range(args.students)]
+
+    semaphore = asyncio.Semaphore(args.concurrency)
+    latencies, reads = [], []
+    loop = asyncio.get_running_loop()
+
+    def open_test(student):
+        # Test ochilganda: takroriy topshiriq tekshiruvi va test ma'lumoti
+        Test.get_by_id(test.id)
+        return TestSubmission.select().where(
+            (TestSubmission.test == test) & (TestSubmission.user == student)
+        ).exists()
+
+    async def one(student):
+        async with semaphore:
+            started = time.perf_counter()
+            await loop.run_in_executor(None, open_test, student)
+            reads.append(time.perf_counter() - started)
+
+            answers = "".join(c if rnd.random() < 0.7 else "e" for c in key)
+            correct, total, results = check_answers(test.correct_answers, answers, test.id)
+            started = time.perf_counter()
+            await write_queue.submit(
+                services.record_submission, test, student, answers, correct, total, results
+            )
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(student) for student in students))
+    elapsed = time.perf_counter() - started
+
+    await write_queue.submit(optimize_db)
+    stats = write_queue.snapshot()["stats"]
+    await write_queue.close()
+    pragmas = {
+        name: db.execute_sql(f"PRAGMA {name}").fetchone()[0]
+        for name in ("synchronous", "cache_size", "mmap_size", "temp_store", "wal_autocheckpoint")
+    }
+    return {
+        "submissions": len(latencies),
+        "elapsed": elapsed,
+        "throughput": len(latencies) / elapsed if elapsed else 0.0,
+        "submit_p50": statistics.median(latencies),
+        "submit_p95": _percentile(latencies, 0.95),
+        "submit_p99": _percentile(latencies, 0.99),
+        "read_p95": _percentile(reads, 0.95),
+        "batches": stats.batches,
+        "pragmas": pragmas,
+    }
+
+
+def _worker(args) -> int:
+    """Bitta profil (env allaqachon o'rnatilgan) — natija JSON bo'lib stdout'ga."""
+    with tempfile.TemporaryDirectory(dir=args.dir) as tmp:
+        os.chdir(tmp)  # DATABASE_PATH nisbiy — vaqtinchalik baza shu yerda
+        result = asyncio.run(_burst(args))
+    print("RESULT " + json.dumps(result))
+    return 0
+
+
+def _run_profile(name: str, env_overrides: dict, args) -> dict:
+    env = dict(os.environ, **env_overrides)
+    cmd = [
+        sys.executable, os.path.abspath(__file__), "--worker",
+        "--students", str(args.students), "--concurrency", str(args.concurrency),
+        "--items", str(args.items), "--seed", str(args.seed),
+    ]
+    if args.dir:
+        cmd += ["--dir", args.dir]
+    proc = subprocess.run(cmd, env=env, capture_output=True, text=True)
+    for line in proc.stdout.splitlines():
+        if line.startswith("RESULT "):
+            return json.loads(line[len("RESULT "):])
+    raise RuntimeError(f"{name} profili ishlamadi:\n{proc.stderr[-2000:]}")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="SQLite PRAGMA profillari benchmark")
+    parser.add_argument("--profiles", nargs="+", default=list(PROFILES), choices=list(PROFILES))
+    parser.add_argument("--custom", nargs="+", metavar="KEY=VALUE", default=None,
+                        help="Qo'shimcha 'custom' profil (SQLITE_* o'zgaruvchilari)")
+    parser.add_argument("--students", type=int, default=1000, help="Topshiruvchilar soni")
+    parser.add_argument("--concurrency", type=int, default=100, help="Bir vaqtdagi talabalar")
+    parser.add_argument("--items", type=int, default=45, help="Testdagi savollar soni")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--dir", default=None,
+                        help="Vaqtinchalik baza papkasi (ishchi baza turgan disk bo'lgani ma'qul)")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        return _worker(args)
+
+    profiles = {name: PROFILES[name] for name in args.profiles}
+    if args.custom:
+        profiles["custom"] = dict(item.split("=", 1) for item in args.custom)
+
+    print(f"{args.students} talaba, {args.concurrency} parallel, {args.items} savol\n")
+    print("{:<10}{:>9}{:>10}{:>10}{:>10}{:>10}{:>9}   pragmalar".format(
+        "profil", "top/s", "p50 ms", "p95 ms", "p99 ms", "o'qish95", "batch"))
+    for name, overrides in profiles.items():
+        r = _run_profile(name, overrides, args)
+        p = r["pragmas"]
+        print(
+            f"{name:<10}{r['throughput']:>9.0f}{r['submit_p50'] * 1000:>10.1f}"
+            f"{r['submit_p95'] * 1000:>10.1f}{r['submit_p99'] * 1000:>10.1f}"
+            f"{r['read_p95'] * 1000:>10.1f}{r['batches']:>9}   "
+            f"sync={p['synchronous']} cache={p['cache_size']} mmap={p['mmap_size'] // 1048576}M "
+            f"temp={p['temp_store']} ckpt={p['wal_autocheckpoint']}"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
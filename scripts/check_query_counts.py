@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""Issiq yo'llar uchun SQL so'rovlar sonini qatorlar soniga qarab tekshirish.
+
+Har stsenariy vaqtinchalik bazada ikki xil hajm bilan (kichik va katta) ishga
+tushiriladi va `db.execute_sql` chaqiruvlari sanaladi. So'rovlar soni qatorlar
+soni bilan birga o'ssa — N+1 (har qator uchun alohida SELECT) bor, exit 1.
+Ishchi baza ishlatilmaydi.
+
+Ishlatish:
+    python scripts/check_query_counts.py
+    python scripts/check_query_counts.py --small 5 --large 60 -v
+"""
+import argparse
+import contextlib
+import os
+import random
+import sys
+import tempfile
+
+# Loyiha ildizini import yo'liga qo'shish (skript scripts/ ichida)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+ANSWERS = "abcdabcdab"
+
+
+@contextlib.contextmanager
+def _count_queries(statements: list):
+    """Blok ichida bajarilgan SQL so'rovlarini `statements` ga yig'ish."""
+    from database import db
+
+    original = db.execute_sql
+
+    def counting(sql, params=None, *args, **kwargs):
+        statements.append(sql)
+        return original(sql, params, *args, **kwargs)
+
+    db.execute_sql = counting
+    try:
+        yield
+    finally:
+        db.execute_sql = original
+
+
+def _seed(size: int, seed: int) -> dict:
+    """`size` ta ishtirokchi, kuzatuvchi admin va faol test bilan to'plam."""
+    from database import db, AdminTestWatch, Test, User
+    import services
+    from utils import check_answers
+
+    rnd = random.Random(seed)
+    base = seed * 100_000
+    with db.atomic():
+        owner = User.create(telegram_id=base + 1, full_name="Owner")
+        admins = [User.create(telegram_id=base + 2 + i, full_name=f"Admin {i}", is_admin=True)
+                  for i in range(size)]
+        tests = {}
+        for mode in ("simple", "rasch"):
+            test = Test.create(correct_answers=ANSWERS, creator=admins[0], scoring_mode=mode)
+            tests[mode] = test
+            for admin in admins:
+                AdminTestWatch.create(admin=admin, test=test)
+        student = None
+        for i in range(size):
+            student = User.create(telegram_id=base + 50_000 + i, full_name=f"Student {i}")
+            for test in tests.values():
+                answers = "".join(c if rnd.random() < 0.3 + 0.6 * (i / size) else "e" for c in ANSWERS)
+                correct, total, results = check_answers(test.correct_answers, answers, test.id)
+                services.record_submission(test, student, answers, correct, total, results)
+            # Har bir talaba boshqa muallifning testini ham yechgan
+            extra = Test.create(correct_answers=ANSWERS, creator=owner, is_active=i % 2 == 0)
+            correct, total, results = check_answers(extra.correct_answers, ANSWERS, extra.id)
+            services.record_submission(extra, student, ANSWERS, correct, total, results)
+    return {"owner": owner, "student": student, "tests": tests}
+
+
+def _scenarios():
+    """(nom, fn(ctx)) — fn issiq yo'ldagi kabi bog'langan maydonlarga murojaat qiladi."""
+    import fanout
+    import repository
+    import services
+    from utils import calculate_rasch_scores, get_answer_key, get_question_stats
+
+    def question_stats(ctx):
+        stats = get_question_stats(ctx["tests"]["simple"])
+        return len(stats["submissions"])
+
+    def rasch_stats(ctx):
+        test = ctx["tests"]["rasch"]
+        return len(calculate_rasch_scores(test, repository.test_submissions(test))["user_scores"])
+
+    def final_results(ctx):
+        # fanout._run: bir bo'lak topshiriqlar va ularning xabar matnlari
+        test = ctx["tests"]["simple"]
+        chunk = repository.test_submissions_after(test, 0, 10_000)
+        return fanout.render_final_results(test, get_answer_key(test.correct_answers, test.id), chunk, {})
+
+    def mystats(ctx):
+        subs = repository.user_submissions(ctx["student"])
+        return [(s.test.id, s.test.is_active) for s in subs]
+
+    def result_notifications(ctx):
+        test = ctx["tests"]["simple"]
+        return services.result_notifications(test, ctx["owner"], 1, 10, 10.0)
+
+    def active_tests(ctx):
+        return [t.creator.full_name or t.creator.username for t in repository.active_tests_with_creator()]
+
+    return [
+        ("get_question_stats (oddiy)", question_stats),
+        ("calculate_rasch_scores", rasch_stats),
+        ("yakuniy natijalar xabari", final_results),
+        ("mystats", mystats),
+        ("result_notifications", result_notifications),
+        ("admin: faol testlar", active_tests),
+    ]
+
+
+def _measure(size: int, seed: int) -> dict:
+    from database import Test
+
+    ctx = _seed(size, seed)
+    # Bog'langan qatorlar keshdan emas, bazadan o'qilsin
+    ctx["tests"] = {mode: Test.get_by_id(t.id) for mode, t in ctx["tests"].items()}
+    counts = {}
+    for name, fn in _scenarios():
+        statements = []
+        with _count_queries(statements):
+            fn(ctx)
+        counts[name] = statements
+    return counts
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="N+1 so'rovlarni aniqlash")
+    parser.add_argument("--small", type=int, default=4, help="Kichik to'plam hajmi")
+    parser.add_argument("--large", type=int, default=40, help="Katta to'plam hajmi")
+    parser.add_argument("-v", "--verbose", action="store_true", help="So'rovlarni chiqarish")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)  # DATABASE_PATH nisbiy — vaqtinchalik baza shu yerda
+        from database import db, init_db
+
+        init_db()
+        small = _measure(args.small, seed=1)
+        large = _measure(args.large, seed=2)
+        db.close()
+
+    print(f"{'stsenariy':<32}{args.small:>8}{args.large:>8}")
+    failed = 0
+    for name, statements in small.items():
+        grew = len(large[name]) > len(statements)
+        failed += grew
+        print(f"{'❌' if grew else '✅'} {name:<30}{len(statements):>8}{len(large[name]):>8}")
+        if args.verbose or grew:
+            for sql in large[name][:8]:
+                print(f"      {sql[:110]}")
+    if failed:
+        print(f"{failed} ta stsenariyda so'rovlar soni qatorlar bilan o'smoqda (N+1)")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
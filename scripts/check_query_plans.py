@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""Issiq so'rovlar indeks ishlatayotganini EXPLAIN QUERY PLAN orqali tekshirish.
+
+Vaqtinchalik bazada init_db (barcha migratsiyalar) bajariladi, biroz sun'iy
+ma'lumot yoziladi va har bir so'rov rejasi tekshiriladi: jadval to'liq
+ko'rilmasligi (SCAN) va ORDER BY uchun vaqtinchalik B-tree qurilmasligi kerak.
+Ishchi baza ishlatilmaydi.
+
+Ishlatish:
+    python scripts/check_query_plans.py        # muammo bo'lsa exit 1
+    python scripts/check_query_plans.py -v     # har so'rov rejasini chiqarish
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+# Loyiha ildizini import yo'liga qo'shish (skript scripts/ ichida)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def _seed():
+    """Rejalar bo'sh jadvaldagidan farq qilmasligi uchun ozgina ma'lumot."""
+    from database import db, AdminTestWatch, Question, Test, TestSubmission, User
+
+    with db.atomic():
+        users = [User.create(telegram_id=1000 + i, full_name=f"User {i}") for i in range(50)]
+        for t in range(40):
+            test = Test.create(correct_answers="abcd", creator=users[t % 5], is_active=t % 3 != 0)
+            for num in range(1, 5):
+                Question.create(test=test, num=num, type="closed", answer="a", has_image=num % 2 == 0)
+            AdminTestWatch.create(admin=users[0], test=test)
+            for user in users[10:30]:
+                TestSubmission.create(test=test, user=user, answers="abcd",
+                                      correct_count=2, total_count=4)
+    db.execute_sql("ANALYZE")
+
+
+def _queries():
+    """(nom, peewee so'rovi, ORDER BY indeksdan olinishi kerakmi)."""
+    from database import AdminTestWatch, Question, Test, TestSubmission
+
+    return [
+        ("mystats: foydalanuvchi topshiriqlari",
+         TestSubmission.select().where(TestSubmission.user == 11)
+         .order_by(TestSubmission.submitted_at.desc()), True),
+        ("takroriy topshiriq tekshiruvi",
+         TestSubmission.select().where((TestSubmission.test == 3) & (TestSubmission.user == 11)), False),
+        ("mytests: muallif testlari",
+         Test.select().where(Test.creator == 2).order_by(Test.created_at.desc()), True),
+        ("admin: faol testlar",
+         Test.select().where(Test.is_active == True).order_by(Test.created_at.desc()), True),  # noqa: E712
+        ("WebApp: rasmli savollar",
+         Question.select().where((Question.test == 3) & (Question.has_image == True)), False),  # noqa: E712
+        ("natija xabarnomasi: kuzatuvchi adminlar",
+         AdminTestWatch.select().where(AdminTestWatch.test == 3), False),
+    ]
+
+
+def _problems(plan: list, ordered: bool) -> list:
+    problems = []
+    for detail in plan:
+        if detail.startswith("SCAN ") and "USING" not in detail:
+            problems.append(f"to'liq skan: {detail}")
+        if ordered and "TEMP B-TREE" in detail:
+            problems.append(f"ORDER BY indeksdan emas: {detail}")
+    if not any("USING" in detail for detail in plan):
+        problems.append("indeks ishlatilmagan")
+    return problems
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Issiq so'rovlar rejasini tekshirish")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Rejalarni chiqarish")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)  # DATABASE_PATH nisbiy — vaqtinchalik baza shu yerda
+        from database import db, init_db, schema_version
+
+        init_db()
+        _seed()
+        print(f"Sxema versiyasi: {schema_version()}")
+
+        failed = 0
+        for name, query, ordered in _queries():
+            sql, params = query.sql()
+            plan = [row[-1] for row in db.execute_sql("EXPLAIN QUERY PLAN " + sql, params).fetchall()]
+            problems = _problems(plan, ordered)
+            print(f"{'❌' if problems else '✅'} {name}")
+            if args.verbose or problems:
+                for detail in plan:
+                    print(f"      {detail}")
+            for problem in problems:
+                print(f"   → {problem}")
+            failed += bool(problems)
+        db.close()
+
+    if failed:
+        print(f"{failed} ta so'rov indeks ishlatmayapti")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""Savol rasmi endpoint'i (`/api/test/{id}/image/{num}`) uchun yuklama testi.
+
+Haqiqiy Telegram o'rniga lokal soxta server ishga tushiriladi (`getFile` va
+fayl yuklash, sun'iy kechikish bilan) va API unga TELEGRAM_API_BASE orqali
+ulanadi. Baza vaqtinchalik papkada yaratiladi — ishchi baza ishlatilmaydi.
+
+Bosqichlar:
+    cold   — bitta rasmni bir vaqtda --concurrency ta o'quvchi ochadi
+             (kutilgan: 1 ta getFile, 1 ta yuklash);
+    repeat — rasm keshi tozalangach yana shu burst (getFile keshdan: 0 ta);
+    mixed  — --images ta turli rasm aralash so'raladi.
+
+Ishlatish:
+    python scripts/load_image_endpoint.py
+    python scripts/load_image_endpoint.py --concurrency 50 --images 10 --latency-ms 200
+
+Birlashtirish ishlamasa (cold bosqichida bittadan ko'p Telegram so'rovi) exit 1.
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+TOKEN = "123456:LOADTEST"
+IMAGE_BYTES = b"\xff\xd8\xff\xe0" + os.urandom(48 * 1024)
+
+
+class _FakeTelegram(BaseHTTPRequestHandler):
+    """`getFile` va `/file/bot<token>/<path>` ga javob beruvchi soxta Telegram."""
+
+    protocol_version = "HTTP/1.1"  # keep-alive — ulanishlar qayta ishlatilishini ko'rish uchun
+    latency = 0.05
+    lock = threading.Lock()
+    counters = {"get_file": 0, "download": 0, "connections": 0}
+
+    def setup(self):
+        super().setup()
+        with self.lock:
+            self.counters["connections"] += 1
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status: int, body: bytes, ctype: str):
+        self.send_response(status)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        time.sleep(self.latency)
+        if url.path == f"/bot{TOKEN}/getFile":
+            with self.lock:
+                self.counters["get_file"] += 1
+            file_id = parse_qs(url.query).get("file_id", [""])[0]
+            body = json.dumps({"ok": True, "result": {
+                "file_id": file_id, "file_path": f"photos/{file_id}.jpg",
+            }}).encode()
+            self._send(200, body, "application/json")
+        elif url.path.startswith(f"/file/bot{TOKEN}/photos/"):
+            with self.lock:
+                self.counters["download"] += 1
+            self._send(200, IMAGE_BYTES, "image/jpeg")
+        else:
+            self._send(404, b'{"ok":false}', "application/json")
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _seed(num_images: int) -> int:
+    """Rasmli savollardan iborat faol test yaratish (test_id qaytaradi)."""
+    from database import Question, Test, User
+    user = User.create(telegram_id=1, full_name="Load Test")
+    test = Test.create(correct_answers="a" * num_images, creator=user, source="manual")
+    for num in range(1, num_images + 1):
+        Question.create(
+            test=test, num=num, type="closed", text=f"Savol {num}", answer="a",
+            image_file_id=f"loadtest-file-{num}", has_image=True,
+        )
+    return test.id
+
+
+def _summary(name: str, latencies: list, before: dict, after: dict, statuses: set) -> str:
+    latencies = sorted(latencies)
+    p95 = latencies[max(0, int(len(latencies) * 0.95) - 1)]
+    return (
+        f"{name:<8}{len(latencies):>7}{statistics.median(latencies) * 1000:>9.1f}"
+        f"{p95 * 1000:>9.1f}{after['get_file'] - before['get_file']:>9}"
+        f"{after['download'] - before['download']:>9}"
+        f"{after['connections'] - before['connections']:>9}   {sorted(statuses)}"
+    )
+
+
+async def _run(args) -> int:
+    import httpx
+    import api
+    import image_cache
+    import telegram_files
+
+    test_id = _seed(args.images)
+    counters = _FakeTelegram.counters
+    transport = httpx.ASGITransport(app=api.app)
+    failed = False
+
+    async def burst(client, nums):
+        async def one(num):
+            started = time.perf_counter()
+            resp = await client.get(f"/api/test/{test_id}/image/{num}")
+            return time.perf_counter() - started, resp.status_code
+        results = await asyncio.gather(*(one(num) for num in nums))
+        return [r[0] for r in results], {r[1] for r in results}
+
+    print("{:<8}{:>7}{:>9}{:>9}{:>9}{:>9}{:>9}   status".format(
+        "bosqich", "so'rov", "p50 ms", "p95 ms", "getFile", "yuklash", "ulanish"))
+    async with httpx.AsyncClient(transport=transport, base_url="http://api") as client:
+        phases = [
+            ("cold", [1] * args.concurrency),
+            ("repeat", [1] * args.concurrency),
+            ("mixed", [(i % args.images) + 1 for i in range(args.concurrency * 2)]),
+        ]
+        for name, nums in phases:
+            # Rasm keshini tozalash — har bosqichda Telegram yo'li o'lchanadi
+            image_cache.clear()
+            before = dict(counters)
+            latencies, statuses = await burst(client, nums)
+            after = dict(counters)
+            print(_summary(name, latencies, before, after, statuses))
+            if statuses != {200}:
+                failed = True
+            if name == "cold" and (after["get_file"] - before["get_file"] != 1
+                                   or after["download"] - before["download"] != 1):
+                failed = True
+            if name == "repeat" and after["get_file"] != before["get_file"]:
+                failed = True
+
+    print(f"telegram_files: {telegram_files.snapshot()}")
+    await telegram_files.close()
+    return 1 if failed else 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Savol rasmi endpoint'i yuklama testi")
+    parser.add_argument("--concurrency", type=int, default=20, help="Bir vaqtdagi so'rovlar")
+    parser.add_argument("--images", type=int, default=5, help="mixed bosqichidagi turli rasmlar")
+    parser.add_argument("--latency-ms", type=float, default=50, help="Soxta Telegram kechikishi")
+    args = parser.parse_args()
+
+    _FakeTelegram.latency = args.latency_ms / 1000
+    port = _free_port()
+    server = ThreadingHTTPServer(("127.0.0.1", port), _FakeTelegram)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    # config import qilinishidan oldin — soxta server va vaqtinchalik baza
+    os.environ["BOT_TOKEN"] = TOKEN
+    os.environ["BOT_USERNAME"] = "loadtest_bot"
+    os.environ["TELEGRAM_API_BASE"] = f"http://127.0.0.1:{port}"
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)  # DATABASE_PATH nisbiy — baza shu yerda yaratiladi
+        try:
+            return asyncio.run(_run(args))
+        finally:
+            server.shutdown()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
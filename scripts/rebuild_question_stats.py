@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""`question_stats` hisoblagichlarini tekshirish va qayta qurish.
+
+Hisoblagichlar har bir topshiriq bilan bitta tranzaksiyada yangilanadi, lekin
+baza qo'lda tahrirlangan yoki eski nusxadan tiklangan bo'lsa, ular topshiriqlar
+bilan mos kelmay qolishi mumkin. Skript ularni bitmap'lardan qayta hisoblaydi.
+
+Ishlatish:
+    python scripts/rebuild_question_stats.py               # barcha testlar
+    python scripts/rebuild_question_stats.py --test-id 42  # bitta test
+    python scripts/rebuild_question_stats.py --check       # faqat tekshirish
+"""
+import argparse
+import os
+import sys
+
+# Loyiha ildizini import yo'liga qo'shish (skript scripts/ ichida)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import init_db, Test  # noqa: E402
+import services  # noqa: E402
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="question_stats ni tekshirish/qayta qurish")
+    parser.add_argument("--test-id", type=int, default=None, help="Faqat shu test")
+    parser.add_argument("--check", action="store_true",
+                        help="Faqat tekshirish (o'zgartirmaydi); nomuvofiqlik bo'lsa exit 1")
+    args = parser.parse_args()
+
+    init_db()
+
+    query = Test.select().order_by(Test.id)
+    if args.test_id is not None:
+        query = query.where(Test.id == args.test_id)
+
+    broken = []
+    for test in query:
+        mismatches = services.verify_question_stats(test)
+        if mismatches:
+            broken.append(test.id)
+            sample = ", ".join(
+                f"#{item}: {stored}≠{actual}" for item, (stored, actual) in sorted(mismatches.items())[:5]
+            )
+            print(f"❌ Test {test.id}: {len(mismatches)} ta item mos emas ({sample})")
+
+    if not broken:
+        print("✅ Barcha hisoblagichlar topshiriqlar bilan mos")
+        return 0
+    if args.check:
+        return 1
+
+    for test_id in broken:
+        services.rebuild_question_stats(test_id)
+    print(f"🔧 {len(broken)} ta test uchun hisoblagichlar qayta qurildi")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
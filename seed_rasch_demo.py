@@ -18,7 +18,8 @@ import random
 from datetime import datetime
 
 from config import ADMIN_ID
-from database import init_db, User, Test, TestSubmission
+from database import init_db, User, Test, TestSubmission, QuestionStat
+from services import record_submission
 from utils import check_answers, calculate_rasch_scores
 
 
@@ -175,6 +176,7 @@ def ensure_demo_test(owner: User, questions_json: str) -> Test:
         existing.save()
 
         TestSubmission.delete().where(TestSubmission.test == existing).execute()
+        QuestionStat.delete().where(QuestionStat.test == existing).execute()
         return existing
 
     return Test.create(
@@ -208,15 +210,9 @@ def seed_demo_submissions(test: Test, questions: list[dict], difficulties: list[
             user.save()
 
         answers_json = build_submission_answers(questions, difficulties, theta, rng)
-        correct_count, total_count, _ = check_answers(test.correct_answers, answers_json)
-
-        TestSubmission.create(
-            test=test,
-            user=user,
-            answers=answers_json,
-            correct_count=correct_count,
-            total_count=total_count,
-        )
+        correct_count, total_count, results = check_answers(test.correct_answers, answers_json, test.id)
+
+        record_submission(test, user, answers_json, correct_count, total_count, results)
         inserted += 1
 
     return inserted
@@ -1,14 +1,22 @@
-"""Boy test yaratish — AI va qo'lda oqimlar uchun yagona DB mantig'i.
+"""Boy test yaratish va topshiriqni yozish — handlerlar uchun yagona DB mantig'i.
 
 Asosiy invariant: `Test.correct_answers` (num/type/answer massivi) baholash uchun
 manba bo'lib qoladi; `Question` qatorlari ko'rsatish/rasm qatlami. Ikkalasini
 shu yerda bitta tranzaksiyada yaratamiz — count har doim mos keladi.
+
+Xuddi shunday, `TestSubmission` va `QuestionStat` hisoblagichlari ham bitta
+tranzaksiyada yoziladi (record_submission).
 """
 import json
 import logging
-from typing import List
+from datetime import datetime
+from html import escape
+from typing import Dict, List, Optional, Tuple
+
+from peewee import EXCLUDED
 
-from database import db, Test, Question
+from database import db, OutboxMessage, Test, TestSubmission, Question, QuestionStat
+import repository
 
 logger = logging.getLogger(__name__)
 
@@ -84,6 +92,38 @@ def create_rich_test(db_user, questions: List[dict], scoring_mode: str = "simple
     return test
 
 
+def bump_structure_version(test_id: int):
+    """Test tuzilmasi o'zgardi — API'dagi keshlangan JSON nusxasi eskiradi.
+
+    Oshirish bitta UPDATE bilan (bot va API alohida process'lar).
+    """
+    Test.update(structure_version=Test.structure_version + 1).where(Test.id == test_id).execute()
+
+
+def set_question_image(test: Test, num: int, file_id: str) -> bool:
+    """Savolga rasm biriktirish (tuzilma versiyasi bilan birga). Savol yo'q bo'lsa False."""
+    with db.atomic():
+        updated = (
+            Question.update(image_file_id=file_id, has_image=True)
+            .where((Question.test == test) & (Question.num == num))
+            .execute()
+        )
+        if updated:
+            bump_structure_version(test.id)
+    return bool(updated)
+
+
+def end_test(test: Test):
+    """Testni yakunlash: is_active=False, ended_at va tuzilma versiyasi bitta UPDATE'da."""
+    now = datetime.now()
+    Test.update(
+        is_active=False, ended_at=now, structure_version=Test.structure_version + 1,
+    ).where(Test.id == test.id).execute()
+    test.is_active = False
+    test.ended_at = now
+    test.structure_version += 1
+
+
 def questions_needing_images(test: Test) -> List[Question]:
     """Rasm kerak bo'lgan, lekin hali rasm biriktirilmagan savollar."""
     return list(
@@ -105,3 +145,195 @@ def image_question_nums(test: Test) -> List[int]:
         .where((Question.test == test) & (Question.has_image == True))  # noqa: E712
         .order_by(Question.num)
     ]
+
+
+def record_submission(test: Test, db_user, answers: str, correct_count: int,
+                      total_count: int, results: List[bool]) -> TestSubmission:
+    """Topshiriqni va item hisoblagichlarini bitta tranzaksiyada yozadi.
+
+    Args:
+        results: check_answers qaytargan expanded item natijalari
+
+    Raises:
+        IntegrityError: foydalanuvchi bu testni allaqachon topshirgan bo'lsa
+            (hisoblagichlar ham o'zgarmaydi)
+    """
+    from utils import pack_results
+
+    with db.atomic():
+        submission = TestSubmission.create(
+            test=test,
+            user=db_user,
+            answers=answers,
+            correct_count=correct_count,
+            total_count=total_count,
+            result_bits=pack_results(results),
+        )
+        if results:
+            (QuestionStat
+             .insert_many(
+                 [(test.id, i, 1 if ok else 0) for i, ok in enumerate(results)],
+                 fields=[QuestionStat.test, QuestionStat.item, QuestionStat.correct_count],
+             )
+             .on_conflict(
+                 conflict_target=[QuestionStat.test, QuestionStat.item],
+                 update={QuestionStat.correct_count: QuestionStat.correct_count + EXCLUDED.correct_count},
+             )
+             .execute())
+    return submission
+
+
+def result_notifications(test: Test, db_user, correct_count: int, total: int,
+                         percentage) -> List[Tuple[int, str, bool]]:
+    """Yangi natija haqida xabarlar: test egasiga va kuzatuvchi adminlarga.
+
+    Returns: [(chat_id, HTML matn, kuzatuvchimi), ...]
+    """
+    who = escape(db_user.full_name or db_user.username or "")
+    messages = []
+    if test.creator.telegram_id != db_user.telegram_id:
+        messages.append((
+            test.creator.telegram_id,
+            f"📢 <b>Yangi natija!</b>\n\n"
+            f"📝 Test: <code>{test.id}</code>\n"
+            f"👤 Foydalanuvchi: {who}\n"
+            f"✅ Natija: {correct_count}/{total} ({percentage}%)",
+            False,
+        ))
+
+    skip_ids = {db_user.telegram_id, test.creator.telegram_id}
+    for watch in repository.test_watchers(test):
+        watcher_tg_id = watch.admin.telegram_id
+        if watcher_tg_id in skip_ids:
+            continue
+        messages.append((
+            watcher_tg_id,
+            f"🔔 <b>Kuzatuv: Yangi natija!</b>\n\n"
+            f"📝 Test: <code>{test.id}</code>\n"
+            f"👤 Foydalanuvchi: {who}\n"
+            f"✅ Natija: {correct_count}/{total} ({percentage}%)",
+            True,
+        ))
+    return messages
+
+
+def queue_result_notifications(test: Test, db_user, correct_count: int, total: int,
+                               percentage, confirm_chat_id: Optional[int] = None) -> int:
+    """Natija xabarlarini outbox'ga yozish (yuborish — outbox.py dispatcher'i).
+
+    Bot handlerlari ham, API ham uni record_submission_with_notices orqali chaqiradi.
+    Egasi/kuzatuvchilar xabarlari `result:<test_id>` guruhida — bir chatga
+    ko'p natija kelsa dispatcher ularni bitta xulosa qilib yuboradi.
+    `confirm_chat_id` berilsa o'quvchiga "qabul qilindi" tasdig'i ham yoziladi.
+
+    Returns:
+        Yozilgan xabarlar soni
+    """
+    now = datetime.now()
+    rows = []
+    if confirm_chat_id is not None:
+        rows.append({
+            "chat_id": confirm_chat_id,
+            "text": "✅ <b>Javobingiz qabul qilindi.</b>\n\n"
+                    "📌 Natija test yakunlangach yuboriladi.",
+            "group_key": None,
+            "payload": None,
+            "available_at": now,
+        })
+    who = db_user.full_name or db_user.username or ""
+    for chat_id, text, watch in result_notifications(test, db_user, correct_count, total, percentage):
+        rows.append({
+            "chat_id": chat_id,
+            "text": text,
+            "group_key": f"result:{test.id}",
+            "payload": json.dumps({
+                "test_id": test.id, "who": who, "correct": correct_count, "total": total,
+                "percentage": percentage, "watch": watch,
+            }, ensure_ascii=False),
+            "available_at": now,
+        })
+    if rows:
+        OutboxMessage.insert_many(rows).execute()
+    return len(rows)
+
+
+def record_submission_with_notices(test: Test, db_user, answers: str, correct_count: int,
+                                   total_count: int, results: List[bool],
+                                   confirm_chat_id: Optional[int] = None) -> TestSubmission:
+    """Topshiriq va uning natija xabarlarini (outbox) bitta tranzaksiyada yozadi.
+
+    Ikkalasi bitta yozuv navbati ishida: topshiriq saqlanib, bildirishnoma
+    yo'qolib qoladigan (yoki aksincha) oraliq holat bo'lmaydi.
+
+    Raises:
+        IntegrityError: foydalanuvchi bu testni allaqachon topshirgan bo'lsa
+            (xabarlar ham yozilmaydi)
+    """
+    with db.atomic():
+        submission = record_submission(test, db_user, answers, correct_count, total_count, results)
+        queue_result_notifications(test, db_user, correct_count, total_count,
+                                   submission.percentage, confirm_chat_id=confirm_chat_id)
+    return submission
+
+
+def _counts_from_submissions(test: Test) -> List[int]:
+    """Item hisoblagichlarini topshiriqlar bitmap'idan qaytadan hisoblash.
+
+    Topshiriq bo'lmasa bo'sh ro'yxat — bunday test uchun qator saqlanmaydi.
+    """
+    from utils import get_answer_key, result_matrix
+
+    key = get_answer_key(test.correct_answers, test.id)
+    if key.total == 0:
+        return []
+    submissions = list(TestSubmission.select().where(TestSubmission.test == test))
+    if not submissions:
+        return []
+    return result_matrix(key, submissions).sum(axis=0).tolist()
+
+
+def verify_question_stats(test: Test) -> Dict[int, tuple]:
+    """Hisoblagichlarni topshiriqlar bilan solishtirish.
+
+    Returns:
+        {item: (saqlangan, haqiqiy)} — faqat mos kelmagan itemlar
+    """
+    expected = _counts_from_submissions(test)
+    stored = {
+        item: count
+        for item, count in QuestionStat.select(QuestionStat.item, QuestionStat.correct_count)
+        .where(QuestionStat.test == test)
+        .tuples()
+    }
+    mismatches = {}
+    for item in set(stored) | set(range(len(expected))):
+        actual = expected[item] if item < len(expected) else None
+        if stored.get(item) != actual:
+            mismatches[item] = (stored.get(item), actual)
+    return mismatches
+
+
+def rebuild_question_stats(test_id: Optional[int] = None) -> int:
+    """`question_stats` ni topshiriqlardan qayta qurish (bitta yoki barcha testlar).
+
+    Returns:
+        Qayta qurilgan testlar soni
+    """
+    query = Test.select()
+    if test_id is not None:
+        query = query.where(Test.id == test_id)
+
+    rebuilt = 0
+    for test in query:
+        counts = _counts_from_submissions(test)
+        with db.atomic():
+            QuestionStat.delete().where(QuestionStat.test == test).execute()
+            if counts:
+                QuestionStat.insert_many(
+                    [(test.id, i, c) for i, c in enumerate(counts)],
+                    fields=[QuestionStat.test, QuestionStat.item, QuestionStat.correct_count],
+                ).execute()
+        rebuilt += 1
+
+    logger.info("QUESTION STATS qayta qurildi: testlar=%s", rebuilt)
+    return rebuilt
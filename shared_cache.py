@@ -0,0 +1,211 @@
+"""Bot va API jarayonlari o'rtasidagi umumiy kesh (SQLite yon fayli, TTL bilan).
+
+Bot va uvicorn worker'lari alohida jarayonlar: birining xotiradagi keshi
+boshqasiga ko'rinmaydi, restartda esa hammasi yo'qoladi. Bu yerda kichik
+kalit–qiymat jadvali alohida SQLite faylida (SHARED_CACHE_PATH) turadi:
+
+- `membership` — kanal a'zoligi natijasi (membership.py);
+- `admin` — admin bayrog'i (handlers/admin.is_admin va api._is_admin_uid);
+- `user` — telegram_id -> User.id (o'zgarmas);
+- `bot` — aniqlangan bot username.
+
+Asosiy bazadan ajratilgani ataylab: yozuv navbati va zaxiraga ta'sir qilmaydi,
+fayl o'chirilsa hech narsa yo'qolmaydi — kesh qaytadan to'ladi. Har qanday
+SQLite xatosi yoki buzilgan qiymat "keshda yo'q" deb qabul qilinadi, so'rovni
+yiqitmaydi. Baza zaxiradan tiklanganda kesh butunlay tozalanadi (backup.py).
+Qiymatlar JSON; muddat devor soatida (jarayonlar o'rtasida bir xil).
+
+Fayl oldida jarayon ichidagi kichik LRU turadi (_MEMORY_TTL soniyadan uzoq
+emas — boshqa jarayondagi o'zgarish shu vaqtda ko'rinadi). SQLite murojaati
+busy timeout'da kutishi mumkin, shuning uchun event loop'da `peek_entry`
+(faqat xotira) yoki `get_entry_async`/`cached_async` (fayl — thread'da) ishlatiladi.
+"""
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Optional
+
+from config import SHARED_CACHE_PATH
+
+logger = logging.getLogger(__name__)
+
+# O'zgarmas qiymatlar (User.id, bot username) uchun muddat
+LONG_TTL = 24 * 3600
+
+_local = threading.local()
+
+# Jarayon ichidagi nusxa: "namespace:key" -> (qiymat, muddat_tugashi epoch)
+_MEMORY_SIZE = 10000
+_MEMORY_TTL = 30.0
+_memory: "OrderedDict[str, tuple]" = OrderedDict()
+_memory_lock = threading.Lock()
+
+
+def _remember(full_key: str, value, expires_at: float):
+    if not SHARED_CACHE_PATH:
+        return
+    with _memory_lock:
+        _memory[full_key] = (value, min(expires_at, time.time() + _MEMORY_TTL))
+        _memory.move_to_end(full_key)
+        while len(_memory) > _MEMORY_SIZE:
+            _memory.popitem(last=False)
+
+
+def peek_entry(namespace: str, key) -> Optional[tuple]:
+    """Faqat xotiradagi nusxa: (qiymat, muddat_tugashi) yoki None — I/O yo'q."""
+    full_key = f"{namespace}:{key}"
+    with _memory_lock:
+        entry = _memory.get(full_key)
+        if entry is None:
+            return None
+        if entry[1] <= time.time():
+            del _memory[full_key]
+            return None
+        _memory.move_to_end(full_key)
+        return entry
+
+
+def _connection() -> Optional[sqlite3.Connection]:
+    """Har thread uchun alohida ulanish (SHARED_CACHE_PATH bo'sh bo'lsa kesh o'chiq)."""
+    if not SHARED_CACHE_PATH:
+        return None
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = sqlite3.connect(SHARED_CACHE_PATH, timeout=1.0, isolation_level=None)
+        conn.execute("PRAGMA journal_mode = wal")
+        # Kesh — elektr uzilsa oxirgi yozuvlar yo'qolishi mumkin, bu muammo emas
+        conn.execute("PRAGMA synchronous = off")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache ("
+            " key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL"
+            ") WITHOUT ROWID"
+        )
+        _local.conn = conn
+    return conn
+
+
+def get_entry(namespace: str, key) -> Optional[tuple]:
+    """(qiymat, muddat_tugashi epoch) yoki None (yo'q/muddati o'tgan/xato)."""
+    entry = peek_entry(namespace, key)
+    if entry is not None:
+        return entry
+    try:
+        conn = _connection()
+        if conn is None:
+            return None
+        row = conn.execute(
+            "SELECT value, expires_at FROM cache WHERE key = ? AND expires_at > ?",
+            (f"{namespace}:{key}", time.time()),
+        ).fetchone()
+        if row is None:
+            return None
+        value = json.loads(row[0])
+    except (sqlite3.Error, ValueError) as e:
+        # ValueError — buzilgan/yarim yozilgan JSON qiymat
+        logger.debug("SHARED CACHE o'qib bo'lmadi: %s:%s (%s)", namespace, key, e)
+        return None
+    _remember(f"{namespace}:{key}", value, row[1])
+    return value, row[1]
+
+
+async def get_entry_async(namespace: str, key,
+                          run: Callable[..., Awaitable] = asyncio.to_thread) -> Optional[tuple]:
+    """`get_entry` event loop uchun: xotirada bo'lsa darrov, bo'lmasa fayl `run` (thread) orqali.
+
+    API'da `run=run_in_threadpool` beriladi.
+    """
+    entry = peek_entry(namespace, key)
+    if entry is not None:
+        return entry
+    return await run(get_entry, namespace, key)
+
+
+def get(namespace: str, key, default=None) -> Any:
+    entry = get_entry(namespace, key)
+    return default if entry is None else entry[0]
+
+
+def put(namespace: str, key, value, ttl: float):
+    """Qiymatni `ttl` soniyaga yozish (ttl <= 0 — yozilmaydi)."""
+    if ttl <= 0:
+        return
+    _remember(f"{namespace}:{key}", value, time.time() + ttl)
+    try:
+        conn = _connection()
+        if conn is None:
+            return
+        conn.execute(
+            "INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)",
+            (f"{namespace}:{key}", json.dumps(value), time.time() + ttl),
+        )
+    except sqlite3.Error as e:
+        logger.debug("SHARED CACHE yozib bo'lmadi: %s:%s (%s)", namespace, key, e)
+
+
+def delete(namespace: str, key):
+    with _memory_lock:
+        _memory.pop(f"{namespace}:{key}", None)
+    try:
+        conn = _connection()
+        if conn is not None:
+            conn.execute("DELETE FROM cache WHERE key = ?", (f"{namespace}:{key}",))
+    except sqlite3.Error as e:
+        logger.debug("SHARED CACHE o'chirib bo'lmadi: %s:%s (%s)", namespace, key, e)
+
+
+def cached(namespace: str, key, ttl: float, loader: Callable[[], Any]) -> Any:
+    """Keshdan, bo'lmasa `loader()` natijasini yozib qaytarish (None keshlanmaydi)."""
+    entry = get_entry(namespace, key)
+    if entry is not None:
+        return entry[0]
+    value = loader()
+    if value is not None:
+        put(namespace, key, value, ttl)
+    return value
+
+
+async def cached_async(namespace: str, key, ttl: float, loader: Callable[[], Any],
+                       run: Callable[..., Awaitable] = asyncio.to_thread) -> Any:
+    """`cached` event loop uchun: xotirada bo'lsa darrov, aks holda fayl va `loader` thread'da."""
+    entry = peek_entry(namespace, key)
+    if entry is not None:
+        return entry[0]
+    return await run(cached, namespace, key, ttl, loader)
+
+
+def clear(namespace: Optional[str] = None) -> int:
+    """Butun keshni (yoki bitta namespace'ni) o'chirish — masalan, baza tiklangandan keyin."""
+    with _memory_lock:
+        if namespace is None:
+            _memory.clear()
+        else:
+            for full_key in [k for k in _memory if k.startswith(f"{namespace}:")]:
+                del _memory[full_key]
+    try:
+        conn = _connection()
+        if conn is None:
+            return 0
+        if namespace is None:
+            return conn.execute("DELETE FROM cache").rowcount
+        return conn.execute(
+            "DELETE FROM cache WHERE substr(key, 1, ?) = ?", (len(namespace) + 1, f"{namespace}:")
+        ).rowcount
+    except sqlite3.Error as e:
+        logger.warning("SHARED CACHE tozalanmadi: %s", e)
+        return 0
+
+
+def purge_expired() -> int:
+    """Muddati o'tgan yozuvlarni o'chirish (bot vaqti-vaqti bilan chaqiradi)."""
+    try:
+        conn = _connection()
+        if conn is None:
+            return 0
+        return conn.execute("DELETE FROM cache WHERE expires_at <= ?", (time.time(),)).rowcount
+    except sqlite3.Error as e:
+        logger.warning("SHARED CACHE tozalanmadi: %s", e)
+        return 0
@@ -0,0 +1,288 @@
+"""LibreOffice konvertatsiyasi — doimiy ishlaydigan headless worker'lar pool'i.
+
+Har bir `soffice --convert-to` chaqiruvi yangi profil bilan noldan ishga
+tushadi (3–8 s sovuq start). Bu yerda SOFFICE_POOL_SIZE ta headless soffice
+bir marta ishga tushiriladi va UNO orqali (lokal named pipe) konvertatsiya
+ishlarini oladi. Pool export.py (HTML→PDF) va ai_extract.py (DOCX→PDF) uchun
+umumiy:
+
+- bir vaqtda ko'pi bilan SOFFICE_POOL_SIZE ta konvertatsiya (qolganlari bo'sh
+  worker'ni kutadi);
+- ishdan oldin sog'lik tekshiruvi — process o'lgan yoki UNO ko'prigi uzilgan
+  bo'lsa worker qayta ishga tushiriladi;
+- har bir ish uchun timeout — oshsa soffice o'ldiriladi va qayta tug'iladi.
+
+`uno` moduli (python3-uno, pip'da yo'q) topilmasa yoki SOFFICE_POOL_SIZE=0
+bo'lsa, avvalgidek har bir fayl uchun alohida `soffice --convert-to` ishlatiladi.
+Pool ishi kutilmaganda yiqilsa ham bir martalik yo'lga tushiladi.
+"""
+import atexit
+import logging
+import os
+import queue
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from typing import Optional
+
+from config import SOFFICE_POOL_SIZE
+
+logger = logging.getLogger(__name__)
+
+# Worker ishga tushib UNO ulanishini qabul qilguncha kutish
+_START_TIMEOUT = 30.0
+
+
+class ConversionError(Exception):
+    """LibreOffice konvertatsiyasi bajarilmadi."""
+
+
+class ConversionTimeout(ConversionError):
+    """Konvertatsiya belgilangan vaqtda tugamadi."""
+
+
+def find_soffice() -> Optional[str]:
+    """LibreOffice (soffice) binarini topish."""
+    env_path = os.getenv("SOFFICE_PATH")
+    if env_path and os.path.exists(env_path):
+        return env_path
+    for name in ("soffice", "libreoffice"):
+        found = shutil.which(name)
+        if found:
+            return found
+    mac_path = "/Applications/LibreOffice.app/Contents/MacOS/soffice"
+    return mac_path if os.path.exists(mac_path) else None
+
+
+def _export_filter(in_path: str) -> str:
+    """Kirish turiga mos PDF eksport filtri (HTML Writer/Web'da ochiladi)."""
+    if in_path.lower().endswith((".html", ".htm")):
+        return "writer_web_pdf_Export"
+    return "writer_pdf_Export"
+
+
+def _convert_once(soffice: str, in_path: str, out_path: str, timeout: float):
+    """Bir martalik `soffice --convert-to pdf` (alohida profil bilan)."""
+    with tempfile.TemporaryDirectory() as tmp:
+        # Har konversiya uchun alohida profil — bir vaqtdagi ishlovlarda lock bo'lmaydi
+        profile = os.path.join(tmp, "profile")
+        try:
+            result = subprocess.run(
+                [
+                    soffice, "--headless", "--norestore", "--nolockcheck",
+                    f"-env:UserInstallation=file://{profile}",
+                    "--convert-to", "pdf", "--outdir", tmp, in_path,
+                ],
+                capture_output=True, timeout=timeout,
+            )
+        except subprocess.TimeoutExpired as exc:
+            raise ConversionTimeout(f"soffice {timeout:.0f}s ichida tugamadi") from exc
+        except OSError as exc:
+            raise ConversionError(f"soffice ishga tushmadi: {exc}") from exc
+
+        stem = os.path.splitext(os.path.basename(in_path))[0]
+        produced = os.path.join(tmp, f"{stem}.pdf")
+        if not os.path.exists(produced):
+            err = (result.stderr or b"").decode("utf-8", "ignore")[:200]
+            raise ConversionError(f"PDF yaratilmadi: {err}")
+        shutil.copy(produced, out_path)
+
+
+class _Worker:
+    """Bitta doimiy headless soffice va unga UNO ulanishi."""
+
+    def __init__(self, soffice: str, index: int):
+        self.soffice = soffice
+        self.index = index
+        self.pipe_name = f"testbot_soffice_{os.getpid()}_{index}"
+        self.profile = tempfile.mkdtemp(prefix=f"soffice-pool-{index}-")
+        self.proc: Optional[subprocess.Popen] = None
+        self.desktop = None
+
+    def start(self):
+        import uno  # noqa: F401 — python3-uno bo'lmasa ImportError
+
+        self.stop()
+        self.proc = subprocess.Popen(
+            [
+                self.soffice, "--headless", "--invisible", "--nologo", "--norestore",
+                "--nolockcheck", "--nodefault",
+                f"-env:UserInstallation=file://{self.profile}",
+                f"--accept=pipe,name={self.pipe_name};urp;StarOffice.ComponentContext",
+            ],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        deadline = time.monotonic() + _START_TIMEOUT
+        while True:
+            try:
+                self.desktop = self._connect()
+                logger.info("SOFFICE worker #%s tayyor (pid=%s)", self.index, self.proc.pid)
+                return
+            except Exception:
+                if self.proc.poll() is not None or time.monotonic() > deadline:
+                    self.stop()
+                    raise ConversionError(f"soffice worker #{self.index} ishga tushmadi")
+                time.sleep(0.25)
+
+    def _connect(self):
+        import uno
+        local = uno.getComponentContext()
+        resolver = local.ServiceManager.createInstanceWithContext(
+            "com.sun.star.bridge.UnoUrlResolver", local
+        )
+        ctx = resolver.resolve(f"uno:pipe,name={self.pipe_name};urp;StarOffice.ComponentContext")
+        return ctx.ServiceManager.createInstanceWithContext("com.sun.star.frame.Desktop", ctx)
+
+    def healthy(self) -> bool:
+        """Process tirikmi va UNO ko'prigi javob beryaptimi."""
+        if self.proc is None or self.proc.poll() is not None or self.desktop is None:
+            return False
+        try:
+            self.desktop.getComponents()
+            return True
+        except Exception:
+            return False
+
+    def convert(self, in_path: str, out_path: str, timeout: float):
+        """Konvertatsiya alohida thread'da — timeout bo'lsa soffice o'ldiriladi."""
+        outcome = {}
+
+        def run():
+            try:
+                self._convert(in_path, out_path)
+            except Exception as exc:  # UNO istisnolari ham shu yerga tushadi
+                outcome["error"] = exc
+
+        thread = threading.Thread(target=run, name=f"soffice-{self.index}", daemon=True)
+        thread.start()
+        thread.join(timeout)
+        if thread.is_alive():
+            self.stop()
+            raise ConversionTimeout(f"soffice worker #{self.index} {timeout:.0f}s ichida tugamadi")
+        if "error" in outcome:
+            self.stop()
+            raise ConversionError(f"soffice worker #{self.index}: {outcome['error']}")
+
+    def _convert(self, in_path: str, out_path: str):
+        import uno
+        from com.sun.star.beans import PropertyValue
+
+        def props(**kwargs):
+            values = []
+            for name, value in kwargs.items():
+                prop = PropertyValue()
+                prop.Name, prop.Value = name, value
+                values.append(prop)
+            return tuple(values)
+
+        doc = self.desktop.loadComponentFromURL(
+            uno.systemPathToFileUrl(os.path.abspath(in_path)), "_blank", 0, props(Hidden=True)
+        )
+        if doc is None:
+            raise ConversionError("hujjat ochilmadi")
+        try:
+            doc.storeToURL(
+                uno.systemPathToFileUrl(os.path.abspath(out_path)),
+                props(FilterName=_export_filter(in_path)),
+            )
+        finally:
+            doc.close(True)
+
+    def stop(self):
+        self.desktop = None
+        if self.proc is not None and self.proc.poll() is None:
+            self.proc.kill()
+            try:
+                self.proc.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                pass
+        self.proc = None
+
+
+class _Pool:
+    def __init__(self, soffice: str, size: int):
+        self.workers = [_Worker(soffice, i) for i in range(size)]
+        # LIFO — oxirgi ishlagan (issiq) worker birinchi olinadi
+        self.idle: "queue.LifoQueue[_Worker]" = queue.LifoQueue()
+        for worker in self.workers:
+            self.idle.put(worker)
+
+    def convert(self, in_path: str, out_path: str, timeout: float):
+        # Bo'sh worker'ni kutish ham timeout'ga kiradi (bir vaqtdagi ishlar cheklovi)
+        started = time.monotonic()
+        try:
+            worker = self.idle.get(timeout=timeout)
+        except queue.Empty:
+            raise ConversionTimeout("bo'sh soffice worker kutilmadi")
+        try:
+            if not worker.healthy():
+                worker.start()
+            remaining = max(1.0, timeout - (time.monotonic() - started))
+            worker.convert(in_path, out_path, remaining)
+        finally:
+            self.idle.put(worker)
+
+    def shutdown(self):
+        for worker in self.workers:
+            worker.stop()
+            shutil.rmtree(worker.profile, ignore_errors=True)
+
+
+_pool: Optional[_Pool] = None
+_pool_lock = threading.Lock()
+_pool_disabled = False
+
+
+def _get_pool(soffice: str) -> Optional[_Pool]:
+    """Pool'ni birinchi chaqiruvda yaratish (uno yo'q bo'lsa None)."""
+    global _pool, _pool_disabled
+    if SOFFICE_POOL_SIZE <= 0 or _pool_disabled:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            try:
+                import uno  # noqa: F401
+            except ImportError:
+                logger.info("python3-uno topilmadi — soffice pool o'rniga bir martalik konvertatsiya")
+                _pool_disabled = True
+                return None
+            _pool = _Pool(soffice, SOFFICE_POOL_SIZE)
+            atexit.register(_pool.shutdown)
+        return _pool
+
+
+def convert_to_pdf(in_path: str, out_path: str, timeout: float = 90) -> None:
+    """Faylni (HTML/DOCX) PDF'ga aylantirish.
+
+    Raises:
+        ConversionError: LibreOffice topilmasa yoki konvertatsiya bajarilmasa
+        ConversionTimeout: `timeout` soniyada tugamasa
+    """
+    soffice = find_soffice()
+    if not soffice:
+        raise ConversionError("LibreOffice (soffice) topilmadi")
+
+    pool = _get_pool(soffice)
+    if pool is not None:
+        try:
+            pool.convert(in_path, out_path, timeout)
+            if os.path.exists(out_path):
+                return
+            logger.warning("SOFFICE pool PDF yaratmadi — bir martalik konvertatsiya")
+        except ConversionTimeout:
+            raise
+        except ConversionError as exc:
+            logger.warning("SOFFICE pool xatosi (%s) — bir martalik konvertatsiya", exc)
+
+    _convert_once(soffice, in_path, out_path, timeout)
+
+
+def shutdown():
+    """Worker'larni to'xtatish (bot to'xtaganda)."""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown()
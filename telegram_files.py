@@ -0,0 +1,149 @@
+"""Telegram'dagi fayllarni (savol rasmlari) async yuklab olish.
+
+API'dagi rasm endpoint'i har kesh o'tkazib yuborilishida Telegram'ga ikki marta
+chiqadi: `getFile` (file_id → file_path) va faylning o'zini yuklash. Bu yerda:
+
+- bitta umumiy `httpx.AsyncClient` — keep-alive ulanishlar pool'i, har so'rovda
+  yangi TCP/TLS ulanish ochilmaydi;
+- file_id bo'yicha birlashtirish — bir rasmni bir vaqtda so'ragan o'nta
+  o'quvchi uchun Telegram'ga bitta so'rov ketadi, qolganlari natijani kutadi;
+- `file_path` keshi (TELEGRAM_FILE_PATH_TTL soniya) — Telegram yuklash havolasini
+  kamida 1 soat yaroqli deb kafolatlaydi, shu vaqt ichida `getFile` takrorlanmaydi.
+  Havola baribir eskirgan bo'lsa (404), `getFile` bir marta qayta so'raladi.
+
+TELEGRAM_API_BASE orqali lokal Bot API server (yoki yuklama testi uchun
+soxta server) ishlatish mumkin.
+"""
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+import httpx
+
+from config import BOT_TOKEN, TELEGRAM_API_BASE, TELEGRAM_FILE_PATH_TTL
+
+logger = logging.getLogger(__name__)
+
+# file_path keshidagi yozuvlar chegarasi (file_id -> (file_path, amal qilish muddati))
+_FILE_PATH_MAX = 1024
+
+_client: Optional[httpx.AsyncClient] = None
+_file_paths: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+_inflight: Dict[str, asyncio.Future] = {}
+_counters = {"get_file": 0, "download": 0, "coalesced": 0, "errors": 0}
+
+
+class TelegramFileError(Exception):
+    """Faylni Telegram'dan olib bo'lmadi."""
+
+
+def _get_client() -> httpx.AsyncClient:
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            timeout=httpx.Timeout(15.0, connect=5.0),
+            limits=httpx.Limits(max_connections=20, max_keepalive_connections=10),
+        )
+    return _client
+
+
+def _cached_file_path(file_id: str) -> Optional[str]:
+    entry = _file_paths.get(file_id)
+    if entry is None:
+        return None
+    file_path, expires_at = entry
+    if time.monotonic() >= expires_at:
+        _file_paths.pop(file_id, None)
+        return None
+    _file_paths.move_to_end(file_id)
+    return file_path
+
+
+async def _file_path(file_id: str) -> str:
+    """file_id → file_path (keshdan yoki `getFile` orqali)."""
+    file_path = _cached_file_path(file_id)
+    if file_path is not None:
+        return file_path
+
+    _counters["get_file"] += 1
+    resp = await _get_client().get(
+        f"{TELEGRAM_API_BASE}/bot{BOT_TOKEN}/getFile", params={"file_id": file_id}
+    )
+    try:
+        payload = resp.json()
+    except ValueError as exc:
+        raise TelegramFileError(f"getFile javobi JSON emas (HTTP {resp.status_code})") from exc
+    if not payload.get("ok"):
+        raise TelegramFileError(f"getFile ok=false: {payload.get('description', '')}")
+    file_path = (payload.get("result") or {}).get("file_path")
+    if not file_path:
+        # Masalan, 20 MB dan katta fayl — Bot API yuklab olish havolasini bermaydi
+        raise TelegramFileError("getFile javobida file_path yo'q")
+
+    _file_paths[file_id] = (file_path, time.monotonic() + TELEGRAM_FILE_PATH_TTL)
+    _file_paths.move_to_end(file_id)
+    while len(_file_paths) > _FILE_PATH_MAX:
+        _file_paths.popitem(last=False)
+    return file_path
+
+
+async def _download(file_id: str) -> Tuple[bytes, str]:
+    client = _get_client()
+    for attempt in range(2):
+        file_path = await _file_path(file_id)
+        _counters["download"] += 1
+        resp = await client.get(f"{TELEGRAM_API_BASE}/file/bot{BOT_TOKEN}/{file_path}")
+        if resp.status_code == 404 and attempt == 0:
+            # Keshdagi havola eskirgan — getFile'ni qayta so'rash
+            _file_paths.pop(file_id, None)
+            continue
+        if resp.status_code != 200:
+            raise TelegramFileError(f"fayl yuklanmadi (HTTP {resp.status_code})")
+        return resp.content, resp.headers.get("Content-Type", "image/jpeg")
+    raise TelegramFileError("fayl topilmadi")
+
+
+async def fetch(file_id: str) -> Tuple[bytes, str]:
+    """Faylni (content, content_type) ko'rinishida olish.
+
+    Shu file_id bo'yicha yuklash allaqachon ketayotgan bo'lsa, yangi so'rov
+    yuborilmaydi — o'sha natija kutiladi.
+
+    Raises:
+        TelegramFileError: Telegram xato qaytarsa yoki ulanib bo'lmasa
+    """
+    future = _inflight.get(file_id)
+    if future is not None:
+        _counters["coalesced"] += 1
+        return await asyncio.shield(future)
+
+    async def run():
+        try:
+            return await _download(file_id)
+        except TelegramFileError:
+            _counters["errors"] += 1
+            raise
+        except httpx.HTTPError as exc:
+            _counters["errors"] += 1
+            raise TelegramFileError(f"Telegram'ga ulanib bo'lmadi: {exc}") from exc
+
+    future = asyncio.ensure_future(run())
+    _inflight[file_id] = future
+    future.add_done_callback(lambda _: _inflight.pop(file_id, None))
+    # shield: so'rovchi uzilib qolsa ham umumiy yuklash boshqalar uchun davom etadi
+    return await asyncio.shield(future)
+
+
+def snapshot() -> Dict[str, int]:
+    """Telegram'ga chiqishlar hisoblagichlari (yuklama testi va diagnostika uchun)."""
+    return dict(_counters, inflight=len(_inflight), file_paths=len(_file_paths))
+
+
+async def close():
+    """Umumiy HTTP klientni yopish (API to'xtaganda)."""
+    global _client
+    client, _client = _client, None
+    if client is not None:
+        await client.aclose()
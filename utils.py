@@ -4,9 +4,18 @@ import re
 import string
 import math
 import json
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
 from html import escape
 from typing import Optional, Tuple, List, Dict
-from database import Test, TestSubmission
+from config import RASCH_ENGINE, RASCH_VERIFY
+from database import Test, TestSubmission, QuestionStat
+import repository
+
+logger = logging.getLogger(__name__)
 
 
 _SUP_FROM = "0123456789+-=()n"
@@ -244,59 +253,129 @@ def _split_open2_token(value: str) -> tuple[str, str]:
     return normalized, ""
 
 
-def _extract_question_types(correct: str) -> List[str]:
-    """Savol turlarini olish"""
+def _parse_key_items(correct: str) -> Tuple[List[str], List[str]]:
+    """Javob kalitini bir marta o'qib, (turlar, normalizatsiyalangan javoblar) qaytaradi."""
     if _is_mixed_answers(correct):
         try:
             data = json.loads(correct)
-            if not isinstance(data, list):
-                return []
-            types = []
-            for item in data:
-                if isinstance(item, dict):
-                    q_type = str(item.get("type", "closed")).strip().lower()
-                    types.append(q_type or "closed")
-                else:
-                    types.append("closed")
-            return types
         except (TypeError, ValueError, json.JSONDecodeError):
-            return []
+            return [], []
+        if not isinstance(data, list):
+            return [], []
+
+        types: List[str] = []
+        answers: List[str] = []
+        for item in data:
+            if not isinstance(item, dict):
+                types.append("closed")
+                answers.append(_normalize_answer(item))
+                continue
+
+            q_type = str(item.get("type", "closed")).strip().lower()
+            types.append(q_type or "closed")
+            raw_answer = item.get("answer", "")
+            if raw_answer == "" and q_type == "open2":
+                raw_answer = {
+                    "a": item.get("answer_a", item.get("a", "")),
+                    "b": item.get("answer_b", item.get("b", "")),
+                }
+
+            if q_type == "open2":
+                answers.append(_normalize_open2(raw_answer))
+            else:
+                answers.append(_normalize_answer(raw_answer))
+        return types, answers
 
     clean = _normalize_answer(correct)
-    return ["closed"] * len(clean)
+    return ["closed"] * len(clean), list(clean)
 
 
-def _extract_correct_answers(correct: str) -> List[str]:
-    """Testdagi to'g'ri javoblarni yagona ro'yxat ko'rinishiga o'tkazish"""
-    if _is_mixed_answers(correct):
-        try:
-            data = json.loads(correct)
-            if not isinstance(data, list):
-                return []
-            answers = []
-            for item in data:
-                if not isinstance(item, dict):
-                    answers.append(_normalize_answer(item))
-                    continue
-
-                q_type = str(item.get("type", "closed")).strip().lower()
-                raw_answer = item.get("answer", "")
-                if raw_answer == "" and q_type == "open2":
-                    raw_answer = {
-                        "a": item.get("answer_a", item.get("a", "")),
-                        "b": item.get("answer_b", item.get("b", "")),
-                    }
-
-                if q_type == "open2":
-                    answers.append(_normalize_open2(raw_answer))
-                else:
-                    answers.append(_normalize_answer(raw_answer))
-            return answers
-        except (TypeError, ValueError, json.JSONDecodeError):
-            return []
+@dataclass(frozen=True)
+class AnswerKey:
+    """Test javob kalitining kompilyatsiya qilingan, o'zgarmas ko'rinishi.
 
-    clean = _normalize_answer(correct)
-    return list(clean)
+    `Test.correct_answers` JSON'i bir marta o'qiladi; baholash, tahlil, Rash va
+    kalitni formatlash shu obyektdan foydalanadi. "Expanded" maydonlarda open2
+    savol ikkita alohida item (a va b) bo'lib keladi.
+    """
+    is_mixed: bool
+    question_types: Tuple[str, ...]     # har bir savol turi (open2 — bitta)
+    correct_answers: Tuple[str, ...]    # normalizatsiyalangan javoblar (open2: "a||b")
+    item_types: Tuple[str, ...]         # expanded: open2 -> open2_a, open2_b
+    item_labels: Tuple[str, ...]        # expanded: "1", "36-A", "36-B", ...
+    item_answers: Tuple[str, ...]       # expanded to'g'ri javoblar
+
+    @property
+    def total(self) -> int:
+        """Savollar soni (open2 bitta savol)."""
+        return len(self.correct_answers)
+
+    @property
+    def item_count(self) -> int:
+        """Baholanadigan itemlar soni (open2 ikkita item)."""
+        return len(self.item_answers)
+
+
+def _compile_answer_key(correct: str) -> AnswerKey:
+    """Kalit matnidan AnswerKey yasash (open2 a/b itemlarga ajratiladi)."""
+    types, answers = _parse_key_items(correct)
+    item_types: List[str] = []
+    item_labels: List[str] = []
+    item_answers: List[str] = []
+    for i, answer in enumerate(answers):
+        num = i + 1
+        if types[i] == "open2":
+            a, b = _split_open2_token(answer)
+            item_types += ["open2_a", "open2_b"]
+            item_labels += [f"{num}-A", f"{num}-B"]
+            item_answers += [a, b]
+        else:
+            item_types.append(types[i])
+            item_labels.append(str(num))
+            item_answers.append(answer)
+    return AnswerKey(
+        is_mixed=_is_mixed_answers(correct),
+        question_types=tuple(types),
+        correct_answers=tuple(answers),
+        item_types=tuple(item_types),
+        item_labels=tuple(item_labels),
+        item_answers=tuple(item_answers),
+    )
+
+
+# Kompilyatsiya qilingan kalitlar LRU keshi: (test_id, kontent xeshi) -> AnswerKey.
+# Xesh kalit matnidan olinadi — test tahrirlansa eski yozuv o'z-o'zidan ishlatilmaydi.
+_ANSWER_KEY_CACHE: "OrderedDict[tuple, AnswerKey]" = OrderedDict()
+_ANSWER_KEY_CACHE_MAX = 256
+_ANSWER_KEY_LOCK = threading.Lock()
+
+
+def answer_counts(correct: str) -> Tuple[int, int]:
+    """(savollar soni, expanded itemlar soni) — Test.question_count/item_count uchun."""
+    key = _compile_answer_key(correct or "")
+    return key.total, key.item_count
+
+
+def get_answer_key(correct: str, test_id: int = 0) -> AnswerKey:
+    """Javob kalitini keshdan olish (yo'q bo'lsa kompilyatsiya qilib keshlash)."""
+    correct = correct or ""
+    digest = hashlib.blake2b(correct.encode("utf-8"), digest_size=16).digest()
+    cache_key = (test_id or 0, digest)
+
+    with _ANSWER_KEY_LOCK:
+        key = _ANSWER_KEY_CACHE.get(cache_key)
+        if key is not None:
+            _ANSWER_KEY_CACHE.move_to_end(cache_key)
+            return key
+
+    key = _compile_answer_key(correct)
+
+    with _ANSWER_KEY_LOCK:
+        _ANSWER_KEY_CACHE[cache_key] = key
+        _ANSWER_KEY_CACHE.move_to_end(cache_key)
+        while len(_ANSWER_KEY_CACHE) > _ANSWER_KEY_CACHE_MAX:
+            _ANSWER_KEY_CACHE.popitem(last=False)
+    return key
 
 
 def _extract_submitted_answers(
@@ -350,66 +429,98 @@ def _extract_submitted_answers(
     return answers
 
 
-def _expand_open2(correct_answers, submitted_answers, question_types):
-    """Open2 savollarni a va b qismlariga ajratib, har birini alohida item qiladi.
-
-    Natijada correct, submitted, types ro'yxatlari uzayadi — open2 o'rniga
-    ikkita alohida element qo'yiladi. Boshqa turlar o'zgarmaydi.
-    """
-    exp_correct = []
-    exp_submitted = []
-    exp_types = []
-    for i in range(len(correct_answers)):
-        q_type = question_types[i] if i < len(question_types) else "closed"
+def _expand_submitted(key: AnswerKey, submitted_answers: List[str]) -> List[str]:
+    """Yuborilgan javoblarni kalitdagi expanded itemlar tartibiga keltirish."""
+    expanded = []
+    for i, q_type in enumerate(key.question_types):
         if q_type == "open2":
-            ca, cb = _split_open2_token(correct_answers[i])
-            sa, sb = _split_open2_token(submitted_answers[i])
-            exp_correct.append(ca)
-            exp_correct.append(cb)
-            exp_submitted.append(sa)
-            exp_submitted.append(sb)
-            exp_types.append("open2_a")
-            exp_types.append("open2_b")
+            expanded.extend(_split_open2_token(submitted_answers[i]))
         else:
-            exp_correct.append(correct_answers[i])
-            exp_submitted.append(submitted_answers[i])
-            exp_types.append(q_type)
-    return exp_correct, exp_submitted, exp_types
+            expanded.append(submitted_answers[i])
+    return expanded
 
 
-def check_answers(correct: str, submitted: str) -> Tuple[int, int, List[bool]]:
+def _grade_items(key: AnswerKey, submitted: str) -> List[bool]:
+    """Har bir expanded item uchun to'g'ri/noto'g'ri natijasi."""
+    submitted_answers = _extract_submitted_answers(
+        submitted, key.total, key.is_mixed, list(key.question_types)
+    )
+    exp_submitted = _expand_submitted(key, submitted_answers)
+    return [
+        bool(answer) and answer == exp_submitted[i]
+        for i, answer in enumerate(key.item_answers)
+    ]
+
+
+def check_answers(correct: str, submitted: str, test_id: int = 0) -> Tuple[int, int, List[bool]]:
     """
     Javoblarni tekshirish
 
     Open2 savollar a va b qismlariga ajratiladi — har biri alohida ball beradi.
+    `test_id` berilsa, kompilyatsiya qilingan kalit shu test uchun keshlanadi.
 
     Returns:
         (to'g'ri_soni, umumiy_soni, har_bir_savol_natijasi)
     """
-    is_mixed = _is_mixed_answers(correct)
-    question_types = _extract_question_types(correct)
-    correct_answers = _extract_correct_answers(correct)
-    total = len(correct_answers)
-
-    if total == 0:
+    key = get_answer_key(correct, test_id)
+    if key.total == 0:
         return 0, 0, []
 
-    submitted_answers = _extract_submitted_answers(submitted, total, is_mixed, question_types)
+    results = _grade_items(key, submitted)
+    return sum(results), key.item_count, results
 
-    exp_correct, exp_submitted, _ = _expand_open2(correct_answers, submitted_answers, question_types)
 
-    results = []
-    correct_count = 0
-    for i in range(len(exp_correct)):
-        is_correct = bool(exp_correct[i]) and exp_correct[i] == exp_submitted[i]
-        if is_correct:
-            correct_count += 1
-        results.append(is_correct)
+def pack_results(results: List[bool]) -> bytes:
+    """Item natijalarini ixcham bitmap'ga joylash (i-item = i-bit, little-endian)."""
+    value = 0
+    for i, ok in enumerate(results):
+        if ok:
+            value |= 1 << i
+    return value.to_bytes((len(results) + 7) // 8, "little")
+
+
+def unpack_results(bits: bytes, count: int) -> List[bool]:
+    """`pack_results` teskarisi: bitmap'dan `count` ta item natijasi."""
+    value = int.from_bytes(bits, "little")
+    return [bool(value >> i & 1) for i in range(count)]
 
-    return correct_count, len(exp_correct), results
 
+def _stored_bits(key: AnswerKey, sub) -> Optional[bytes]:
+    """Topshiriqdagi saqlangan bitmap (yo'q yoki uzunligi kalitga mos kelmasa None)."""
+    bits = getattr(sub, "result_bits", None)
+    if bits is None:
+        return None
+    bits = bytes(bits)
+    return bits if len(bits) == (key.item_count + 7) // 8 else None
 
-def get_answer_review(correct: str, submitted: str) -> List[Dict]:
+
+def submission_results(key: AnswerKey, sub) -> List[bool]:
+    """Topshiriqning item natijalari — bitmap'dan, u bo'lmasa qayta baholab."""
+    bits = _stored_bits(key, sub)
+    if bits is None:
+        return _grade_items(key, sub.answers)
+    return unpack_results(bits, key.item_count)
+
+
+def result_matrix(key: AnswerKey, submissions: list):
+    """Topshiriqlar × itemlar 0/1 matritsasi (numpy uint8) bitmap'lardan.
+
+    Bitmap'i yo'q (migratsiyadan o'tmagan) yozuvlargina qayta baholanadi.
+    """
+    import numpy as np
+
+    width = (key.item_count + 7) // 8
+    buf = bytearray()
+    for sub in submissions:
+        bits = _stored_bits(key, sub)
+        if bits is None:
+            bits = pack_results(_grade_items(key, sub.answers))
+        buf += bits
+    packed = np.frombuffer(bytes(buf), dtype=np.uint8).reshape(len(submissions), width)
+    return np.unpackbits(packed, axis=1, count=key.item_count, bitorder="little")
+
+
+def get_answer_review(correct: str, submitted: str, test_id: int = 0) -> List[Dict]:
     """
     Har bir savol bo'yicha tekshiruv natijasini qaytaradi.
 
@@ -426,58 +537,58 @@ def get_answer_review(correct: str, submitted: str) -> List[Dict]:
             }
         ]
     """
-    is_mixed = _is_mixed_answers(correct)
-    question_types = _extract_question_types(correct)
-    correct_answers = _extract_correct_answers(correct)
-    total = len(correct_answers)
-
-    if total == 0:
+    key = get_answer_key(correct, test_id)
+    if key.total == 0:
         return []
 
-    submitted_answers = _extract_submitted_answers(submitted, total, is_mixed, question_types)
-
-    def to_display(q_type: str, value: str) -> str:
-        if not value:
-            return "—"
-        if q_type in {"closed", "closed4", "closed6"}:
-            return value.upper()
-        return latex_to_text(value)
+    submitted_answers = _extract_submitted_answers(
+        submitted, key.total, key.is_mixed, list(key.question_types)
+    )
+    exp_submitted = _expand_submitted(key, submitted_answers)
 
     review = []
-    question_num = 0
-    for i in range(total):
-        q_type = question_types[i] if i < len(question_types) else "closed"
-        question_num += 1
-
-        if q_type == "open2":
-            ca, cb = _split_open2_token(correct_answers[i])
-            sa, sb = _split_open2_token(submitted_answers[i])
-            review.append({
-                "index": f"{question_num}-A",
-                "type": "open2_a",
-                "is_correct": bool(ca) and ca == sa,
-                "submitted_display": to_display("open", sa),
-                "correct_display": to_display("open", ca),
-            })
-            review.append({
-                "index": f"{question_num}-B",
-                "type": "open2_b",
-                "is_correct": bool(cb) and cb == sb,
-                "submitted_display": to_display("open", sb),
-                "correct_display": to_display("open", cb),
-            })
-        else:
-            review.append({
-                "index": str(question_num),
-                "type": q_type,
-                "is_correct": bool(correct_answers[i]) and correct_answers[i] == submitted_answers[i],
-                "submitted_display": to_display(q_type, submitted_answers[i]),
-                "correct_display": to_display(q_type, correct_answers[i]),
-            })
+    for i, answer in enumerate(key.item_answers):
+        item_type = key.item_types[i]
+        review.append({
+            "index": key.item_labels[i],
+            "type": item_type,
+            "is_correct": bool(answer) and answer == exp_submitted[i],
+            "submitted_display": _answer_display(item_type, exp_submitted[i]),
+            "correct_display": _answer_display(item_type, answer),
+        })
 
     return review
 
 
+def _answer_display(item_type: str, value: str) -> str:
+    """Javobni foydalanuvchiga ko'rsatish ko'rinishi (open2 qismlari — open kabi)."""
+    if not value:
+        return "—"
+    if item_type in {"closed", "closed4", "closed6"}:
+        return value.upper()
+    return latex_to_text(value)
+
+
+def answer_items_display(key: AnswerKey, submitted: str, items) -> List[Tuple[str, str, str]]:
+    """Tanlangan expanded itemlar uchun (label, yuborilgan, to'g'ri) — qayta baholamasdan.
+
+    To'g'ri/noto'g'ri allaqachon bitmap'dan ma'lum bo'lganda (masalan, faqat
+    xato itemlar) ishlatiladi: javob satri bir marta o'qiladi, xolos.
+    """
+    submitted_answers = _extract_submitted_answers(
+        submitted, key.total, key.is_mixed, list(key.question_types)
+    )
+    exp_submitted = _expand_submitted(key, submitted_answers)
+    return [
+        (
+            key.item_labels[i],
+            _answer_display(key.item_types[i], exp_submitted[i]),
+            _answer_display(key.item_types[i], key.item_answers[i]),
+        )
+        for i in items
+    ]
+
+
 # ============ RASCH MODEL ============
 
 
@@ -577,7 +688,46 @@ def _fit_rasch_jmle(
 
     return thetas, betas, converged
 
-def calculate_rasch_scores(test: Test, submissions: list) -> Dict:
+
+def _fit_rasch(
+    response_matrix: List[List[int]],
+) -> tuple[List[float], List[float], bool, List[Optional[float]]]:
+    """Sozlamadagi dvigatel (RASCH_ENGINE) bilan Rash modelini baholash.
+
+    Returns:
+        (person_thetas, item_difficulties, converged, item_standard_errors)
+
+    RASCH_VERIFY yoqilgan bo'lsa, NumPy JMLE natijasi etalon `_fit_rasch_jmle`
+    bilan solishtiriladi va eng katta farq log'ga yoziladi.
+    """
+    import rasch
+
+    if RASCH_ENGINE == "cmle":
+        return rasch.fit_cmle(response_matrix)
+
+    # Etalon sof Python — numpy matritsa oddiy ro'yxatga o'tkaziladi
+    rows = response_matrix.tolist() if hasattr(response_matrix, "tolist") else response_matrix
+
+    if RASCH_ENGINE == "jmle_py":
+        thetas, betas, converged = _fit_rasch_jmle(rows)
+        return thetas, betas, converged, rasch.item_standard_errors(thetas, betas)
+
+    thetas, betas, converged = rasch.fit_jmle(response_matrix)
+
+    if RASCH_VERIFY:
+        ref_thetas, ref_betas, ref_converged = _fit_rasch_jmle(rows)
+        diff = max(
+            (abs(a - b) for a, b in zip(thetas + betas, ref_thetas + ref_betas)),
+            default=0.0,
+        )
+        logger.info(
+            "RASCH VERIFY: persons=%s items=%s max_diff=%.2e converged=%s/%s",
+            len(thetas), len(betas), diff, converged, ref_converged,
+        )
+    return thetas, betas, converged, rasch.item_standard_errors(thetas, betas)
+
+
+def calculate_rasch_scores(test: Test, submissions: list, response_matrix=None) -> Dict:
     """
     Rash modeli bo'yicha ball hisoblash
 
@@ -586,10 +736,13 @@ def calculate_rasch_scores(test: Test, submissions: list) -> Dict:
     - Oson savolni to'g'ri yechish = kam ball
     - Bir xil to'g'ri javob soni bo'lsa ham, qiyin savollarni yechgan yuqori turadi
 
+    `response_matrix` (0/1 numpy matritsa) berilmasa, topshiriqlar bitmap'idan quriladi.
+
     Returns:
         {
             'question_difficulties': [float],  # Har bir savolning qiyinligi (logit)
             'question_weights': [float],  # Har bir savol uchun ball og'irligi
+            'question_se': [float|None],  # Qiyinlik standart xatosi (logit)
             'user_scores': [{'user': str, 'rasch_score': float, ...}],
             'rasch_available': bool
         }
@@ -597,50 +750,48 @@ def calculate_rasch_scores(test: Test, submissions: list) -> Dict:
     if len(submissions) < 3:
         return {'rasch_available': False, 'question_difficulties': [], 'question_weights': [], 'user_scores': []}
 
-    correct_answers = _extract_correct_answers(test.correct_answers)
-    question_types = _extract_question_types(test.correct_answers)
-    raw_total = len(correct_answers)
-    is_mixed = _is_mixed_answers(test.correct_answers)
-
-    if raw_total == 0:
+    key = get_answer_key(test.correct_answers, test.id)
+    if key.total == 0:
         return {'rasch_available': False, 'question_difficulties': [], 'question_weights': [], 'user_scores': []}
 
-    # Javoblar matritsasini tuzish (1 = to'g'ri, 0 = noto'g'ri)
+    # Javoblar matritsasi (1 = to'g'ri, 0 = noto'g'ri) saqlangan bitmap'lardan.
     # Open2 savollar a/b ga ajratiladi — har biri alohida item
-    response_matrix = []
-    for sub in submissions:
-        submitted_answers = _extract_submitted_answers(sub.answers, raw_total, is_mixed, question_types)
-        exp_correct, exp_submitted, _ = _expand_open2(correct_answers, submitted_answers, question_types)
-        row = [
-            1 if exp_correct[i] and exp_correct[i] == exp_submitted[i] else 0
-            for i in range(len(exp_correct))
-        ]
-        response_matrix.append(row)
+    if response_matrix is None:
+        response_matrix = result_matrix(key, submissions)
 
-    total_questions = len(response_matrix[0]) if response_matrix else 0
+    total_questions = response_matrix.shape[1]
     if total_questions == 0:
         return {'rasch_available': False, 'question_difficulties': [], 'question_weights': [], 'user_scores': []}
 
-    person_thetas, item_difficulties, converged = _fit_rasch_jmle(response_matrix)
+    person_thetas, item_difficulties, converged, item_se = _fit_rasch(response_matrix)
     if not person_thetas or not item_difficulties:
         return {'rasch_available': False, 'question_difficulties': [], 'question_weights': [], 'user_scores': []}
 
     question_difficulties = [round(beta, 2) for beta in item_difficulties]
+    question_se = [round(se, 2) if se is not None else None for se in item_se]
     # Katta qiymat = qiyinroq savol
     question_weights = [round(_sigmoid(beta), 2) for beta in item_difficulties]
 
     user_scores = []
+    # Bir xil xom balli ishtirokchilar bir xil theta oladi — kutilgan ball
+    # har bir theta uchun bir marta hisoblanadi (ko'pi bilan items + 1 marta).
+    expected_by_theta: Dict[float, float] = {}
+
+    correct_counts = response_matrix.sum(axis=1).tolist()
 
     for s, sub in enumerate(submissions):
-        correct_count = sum(response_matrix[s])
+        correct_count = correct_counts[s]
         percentage = round((correct_count / total_questions) * 100, 1) if total_questions > 0 else 0
         theta = person_thetas[s]
 
         # Testdagi item qiyinliklarini hisobga olgan holda kutilgan ball (0..100)
-        expected_pct = (
-            sum(_sigmoid(theta - beta) for beta in item_difficulties) / total_questions * 100.0
-            if total_questions > 0 else 0.0
-        )
+        expected_pct = expected_by_theta.get(theta)
+        if expected_pct is None:
+            expected_pct = (
+                sum(_sigmoid(theta - beta) for beta in item_difficulties) / total_questions * 100.0
+                if total_questions > 0 else 0.0
+            )
+            expected_by_theta[theta] = expected_pct
         rasch_normalized = round(expected_pct, 1)
 
         user_scores.append({
@@ -660,6 +811,8 @@ def calculate_rasch_scores(test: Test, submissions: list) -> Dict:
         'rasch_available': True,
         'question_difficulties': question_difficulties,
         'question_weights': question_weights,
+        'question_se': question_se,
+        'rasch_engine': RASCH_ENGINE,
         'rasch_converged': converged,
         'user_scores': user_scores
     }
@@ -679,13 +832,38 @@ def get_difficulty_label(difficulty: float) -> str:
         return "⛔ Juda qiyin"
 
 
-def get_question_stats(test: Test) -> Dict:
+def _stored_question_counts(test: Test, item_count: int) -> Optional[List[int]]:
+    """`question_stats` hisoblagichlari (har bir item uchun qator bo'lmasa None)."""
+    counts = [0] * item_count
+    seen = 0
+    rows = (
+        QuestionStat.select(QuestionStat.item, QuestionStat.correct_count)
+        .where(QuestionStat.test == test)
+        .tuples()
+    )
+    for item, count in rows:
+        if 0 <= item < item_count:
+            counts[item] = count
+            seen += 1
+    return counts if seen == item_count else None
+
+
+def get_question_stats(test: Test, include_submissions: bool = True) -> Dict:
     """
     Test statistikasini hisoblash (Rash modeli bilan)
+
+    `include_submissions=False` bo'lsa, faqat savollar statistikasi (oson/qiyin,
+    grafik ma'lumoti) `question_stats` hisoblagichlaridan O(items) da olinadi —
+    topshiriqlar o'qilmaydi, 'submissions' bo'sh va Rash hisoblanmaydi.
     """
-    submissions = list(TestSubmission.select().where(TestSubmission.test == test))
+    if include_submissions:
+        submissions = repository.test_submissions(test)
+        total_subs = len(submissions)
+    else:
+        submissions = None
+        total_subs = TestSubmission.select().where(TestSubmission.test == test).count()
 
-    if not submissions:
+    if not total_subs:
         return {
             'total_submissions': 0,
             'question_stats': [],
@@ -695,14 +873,11 @@ def get_question_stats(test: Test) -> Dict:
             'rasch': {'rasch_available': False}
         }
 
-    correct_answers = _extract_correct_answers(test.correct_answers)
-    question_types = _extract_question_types(test.correct_answers)
-    raw_total = len(correct_answers)
-    is_mixed = _is_mixed_answers(test.correct_answers)
+    key = get_answer_key(test.correct_answers, test.id)
 
-    if raw_total == 0:
+    if key.total == 0:
         return {
-            'total_submissions': len(submissions),
+            'total_submissions': total_subs,
             'question_stats': [],
             'easiest': None,
             'hardest': None,
@@ -711,30 +886,22 @@ def get_question_stats(test: Test) -> Dict:
         }
 
     # Expanded labels: open2 -> "36-A","36-B"; boshqalar -> "1","2",...
-    exp_labels = []
-    qnum = 0
-    for i in range(raw_total):
-        qnum += 1
-        q_type = question_types[i] if i < len(question_types) else "closed"
-        if q_type == "open2":
-            exp_labels.append(f"{qnum}-A")
-            exp_labels.append(f"{qnum}-B")
-        else:
-            exp_labels.append(str(qnum))
-
-    total_questions = len(exp_labels)
-
-    # Har bir savol uchun to'g'ri javoblar soni (expanded)
-    question_correct = [0] * total_questions
-
-    for sub in submissions:
-        submitted_answers = _extract_submitted_answers(sub.answers, raw_total, is_mixed, question_types)
-        exp_correct, exp_submitted, _ = _expand_open2(correct_answers, submitted_answers, question_types)
-        for i in range(total_questions):
-            if exp_correct[i] and exp_correct[i] == exp_submitted[i]:
-                question_correct[i] += 1
-
-    total_subs = len(submissions)
+    exp_labels = key.item_labels
+    total_questions = key.item_count
+
+    # Har bir savol uchun to'g'ri javoblar soni (expanded): topshiriqlar
+    # o'qilgan bo'lsa bitmap'lardan, aks holda saqlangan hisoblagichlardan
+    response_matrix = None
+    question_correct = None
+    if submissions is None:
+        question_correct = _stored_question_counts(test, total_questions)
+        if question_correct is None:
+            logger.warning("question_stats to'liq emas (test_id=%s) — topshiriqlardan hisoblanadi", test.id)
+            submissions = repository.test_submissions(test)
+            total_subs = len(submissions)
+    if question_correct is None:
+        response_matrix = result_matrix(key, submissions)
+        question_correct = response_matrix.sum(axis=0).tolist()
 
     # Savol statistikasi
     question_stats = []
@@ -755,13 +922,15 @@ def get_question_stats(test: Test) -> Dict:
     # Rash modeli — faqat test Rash rejimida bo'lsa hisoblanadi.
     # Oddiy testda ishtirokchilar Rash bali bo'yicha emas, to'g'ri javoblar
     # soni bo'yicha tartiblanishi kerak (export/statistika shu ro'yxatni oladi).
-    if test.scoring_mode == "rasch":
-        rasch = calculate_rasch_scores(test, submissions)
+    if test.scoring_mode == "rasch" and include_submissions:
+        rasch = calculate_rasch_scores(test, submissions, response_matrix)
     else:
         rasch = {'rasch_available': False, 'question_difficulties': [], 'question_weights': [], 'user_scores': []}
 
     # Foydalanuvchilar ro'yxati
-    if rasch['rasch_available']:
+    if not include_submissions:
+        user_results = []
+    elif rasch['rasch_available']:
         user_results = rasch['user_scores']
     else:
         user_results = []
@@ -842,15 +1011,16 @@ def format_stats(stats: Dict, test: Test) -> str:
     return text
 
 
-def format_answer_key(correct: str, max_chars: int = 2500) -> str:
+def format_answer_key(correct: str, max_chars: int = 2500, test_id: int = 0) -> str:
     """To'g'ri javoblar kalitini HTML ko'rinishda formatlash (admin uchun).
 
     Yopiq savollar zich, bir qatorda 10 tadan (1.A 2.B ...), ochiq savollar
     alohida qatorda chiqadi. Kalit max_chars dan oshsa qisqartiriladi —
     Telegram xabari 4096 belgidan oshib ketmasligi uchun.
     """
-    question_types = _extract_question_types(correct)
-    correct_answers = _extract_correct_answers(correct)
+    key = get_answer_key(correct, test_id)
+    question_types = key.question_types
+    correct_answers = key.correct_answers
     if not correct_answers:
         return ""
 